@@ -1,31 +1,43 @@
 import json
-from llm import get_agent_action
-from config import (
-    AGENT_CONFIGS,
-    ENERGY_LOSS_PER_TURN,
-    AGENT_MEMORY_SIZE,
-    USE_MULTIMODAL
-)
-from pygame_visualization import render_grid_for_agent, surface_to_base64
+import random
+from collections import deque
+from llm import get_agent_action, get_agent_plan, new_session, VALID_ACTIONS, LOG_FILE
+from environment import DIRECTIONS
+from simulation_config import SimulationConfig
+from profiler import phase
 
 class Agent:
-    def __init__(self, name, start_pos=(4, 4)):
+    def __init__(self, name, start_pos=(4, 4), sim_config=None, side_files=True):
         self.name = name
         self.position = start_pos
-        # Initialize inventory & energy from config
-        from config import INITIAL_INVENTORY, INITIAL_ENERGY
-        self.inventory = INITIAL_INVENTORY.copy()
-        self.energy = INITIAL_ENERGY
+        # All settings come from the run's SimulationConfig (a snapshot of config by default)
+        self.sim_config = sim_config if sim_config is not None else SimulationConfig.from_config()
+        self.inventory = dict(self.sim_config.initial_inventory)
+        self.energy = self.sim_config.initial_energy
         self.alive = True
 
-        # Load this agent's consumption rates from AGENT_CONFIGS
-        self.consumption_rates = AGENT_CONFIGS.get(self.name, {'red': 0, 'green': 0})
+        # This agent's consumption rates at the run's consumption rate
+        self.consumption_rates = self.sim_config.agent_rates(self.name)
 
         # Histories & counters
         self.actions_taken = []
         self.memory = []
+        self.memory_records = []  # Structured twin of memory for the compact prompt
         self.movement_history = []
         self.step_count = 0
+        self.llm_session = None  # Conversation with the LLM backend (session mode)
+        self.llm_calls = 0
+        # Where this agent's decisions go: the run's recorder and, with side_files,
+        # the shared LLM log and a movement history file (None turns them off)
+        self.decision_recorder = None
+        self.llm_log_file = LOG_FILE if side_files else None
+        self.history_file = f"movement_history_{self.name}.txt" if side_files else None
+
+        # Plan mode: remaining planned actions and the situation they were planned for
+        self.plan = deque()
+        self.plan_energy = None
+        self.plan_position = None
+        self.plan_failure = None  # Why the last plan broke down, told to the LLM when replanning
 
     @property
     def type(self):
@@ -48,9 +60,12 @@ class Agent:
             f"Inventory: {self.inventory}"
         )
         self.memory.append(entry)
+        self.memory_records.append({'step': self.step_count, 'action': action, 'outcome': outcome})
         # keep only last N
-        if len(self.memory) > AGENT_MEMORY_SIZE:
-            self.memory = self.memory[-AGENT_MEMORY_SIZE:]
+        size = self.sim_config.memory_size
+        if len(self.memory) > size:
+            self.memory = self.memory[-size:]
+            self.memory_records = self.memory_records[-size:]
 
     def update_movement_history(self, cell_content, action_taken):
         entry = {
@@ -63,31 +78,192 @@ class Agent:
         if len(self.movement_history) > 3:
             self.movement_history.pop(0)
         # save to file
-        with open(f"movement_history_{self.name}.txt", "w", encoding="utf-8") as f:
-            json.dump(self.movement_history, f, indent=2)
+        if self.history_file:
+            with open(self.history_file, "w", encoding="utf-8") as f:
+                json.dump(self.movement_history, f, indent=2)
 
     def get_current_observation(self, environment, all_agents):
         x, y = self.position
         cell = environment.get_cell_content(x, y) or "empty"
 
-        nearby = {'red': 0, 'green': 0, 'agents': 0}
-        for dx in (-1, 0, 1):
-            for dy in (-1, 0, 1):
-                nx, ny = x + dx, y + dy
-                if 0 <= nx < environment.size and 0 <= ny < environment.size:
-                    c = environment.get_cell_content(nx, ny)
-                    if c in nearby:
-                        nearby[c] += 1
-        for other in all_agents:
-            if other.alive and other is not self:
-                ox, oy = other.position
-                if abs(ox - x) <= 1 and abs(oy - y) <= 1:
-                    nearby['agents'] += 1
+        # Counts come from the environment's shared per-step feature maps
+        nearby = environment.neighbourhood_counts(x, y, self.sim_config.view_radius, agents=all_agents)
+        nearby['agents'] = max(0, nearby['agents'] - 1)  # don't count ourselves
 
         return (f"at {self.position}, cell has {cell}, "
                 f"nearby {nearby['red']}R {nearby['green']}G {nearby['agents']}A, "
                 f"energy {self.energy}")
 
+    def conversation(self):
+        """This agent's LLM session in session mode, created on first use; None otherwise"""
+        if not self.sim_config.session_mode:
+            return None
+        if self.llm_session is None:
+            self.llm_session = new_session(self.name, self.consumption_rates, self.sim_config)
+        return self.llm_session
+
+    def preferred_foods(self):
+        """Food types that give this agent energy, highest consumption rate first"""
+        rates = self.consumption_rates
+        return [food for food in sorted(rates, key=rates.get, reverse=True) if rates[food] > 0]
+
+    def nearest_preferred_food(self, environment):
+        """(food, distance, first move) to the closest food worth eating, or None"""
+        x, y = self.position
+        best = None
+        for food in self.preferred_foods():
+            distance, direction = environment.nearest_food(x, y, food)
+            if distance is not None and (best is None or distance < best[1]):
+                best = (food, distance, direction)
+        return best
+
+    def food_hint(self, environment):
+        """Prompt line describing where the nearest preferred food is"""
+        nearest = self.nearest_preferred_food(environment)
+        if nearest is None:
+            return "no food you can eat on the grid"
+        food, distance, direction = nearest
+        if distance == 0:
+            return f"{food}, in your current cell"
+        return f"{food}, {distance} step{'s' if distance > 1 else ''} {direction}"
+
+    def rule_based_action(self, environment, occupied):
+        """Heuristic policy driven by the environment's nearest-food distance fields"""
+        x, y = self.position
+        edible = self.preferred_foods()
+        in_stock = [food for food in edible if self.inventory.get(food, 0) > 0]
+        if in_stock and self.energy <= self.sim_config.low_energy_threshold:
+            return f"eat {in_stock[0]}"
+        if environment.get_cell_content(x, y) in edible:
+            return "collect"
+
+        nearest = self.nearest_preferred_food(environment)
+        if nearest and nearest[2] and random.random() >= self.sim_config.exploration_probability:
+            dx, dy = DIRECTIONS[nearest[2]]
+            if (x + dx, y + dy) not in occupied:
+                return f"move {nearest[2]}"
+
+        moves = [
+            name for name, (dx, dy) in DIRECTIONS.items()
+            if 0 <= x + dx < environment.size and 0 <= y + dy < environment.size
+            and (x + dx, y + dy) not in occupied
+        ]
+        if moves:
+            return f"move {random.choice(moves)}"
+        return "do nothing"
+
+    def is_legal(self, action, environment, occupied):
+        """Whether `action` can succeed in the current state"""
+        x, y = self.position
+        if action.startswith("move "):
+            dx, dy = DIRECTIONS[action.split()[1]]
+            nx, ny = x + dx, y + dy
+            return (0 <= nx < environment.size and 0 <= ny < environment.size
+                    and (nx, ny) not in occupied)
+        if action == "collect":
+            return environment.get_cell_content(x, y) in self.inventory
+        if action.startswith("eat "):
+            return self.inventory.get(action.split()[1], 0) > 0
+        return action == "do nothing"
+
+    def legal_actions(self, environment, occupied):
+        """Actions that can succeed right now, in VALID_ACTIONS order"""
+        return [action for action in VALID_ACTIONS if self.is_legal(action, environment, occupied)]
+
+    def planned_action(self, environment, occupied):
+        """Next action of the current plan if it still fits the situation, else None (replan).
+
+        The plan is dropped when its next action is no longer legal, when energy
+        has fallen to the low threshold since planning, or when the agent stands
+        on food it can eat (on a new cell) and the plan doesn't collect it.
+        """
+        if not self.plan:
+            return None
+        action = self.plan[0]
+        x, y = self.position
+        cell = environment.get_cell_content(x, y)
+        low = self.sim_config.low_energy_threshold
+        if not self.is_legal(action, environment, occupied):
+            self.plan_failure = f"planned '{action}' was no longer possible"
+        elif self.energy <= low < self.plan_energy:
+            self.plan_failure = None
+        elif (cell in self.preferred_foods() and action != "collect"
+              and self.position != self.plan_position):
+            self.plan_failure = None
+        else:
+            return self.plan.popleft()
+        self.plan.clear()
+        return None
+
+    def make_plan(self, environment, occupied, cell, grid_b64, legal):
+        """Ask the LLM for a new plan whose first action is one of `legal`, and return that action"""
+        self.llm_calls += 1
+        plan = get_agent_plan(
+            agent_name=self.name,
+            position=self.position,
+            inventory=self.inventory,
+            cell_content=cell,
+            energy=self.energy,
+            consumption_rate=self.consumption_rates,
+            memory=self.memory,
+            grid_image_base64=grid_b64,
+            retry_message=self.plan_failure,
+            food_hint=self.food_hint(environment),
+            memory_records=self.memory_records,
+            sim_config=self.sim_config,
+            legal_actions=legal,
+            recorder=self.decision_recorder,
+            log_file=self.llm_log_file
+        )
+        self.plan = deque(plan)
+        self.plan_energy = self.energy
+        self.plan_position = self.position
+        self.plan_failure = None
+        return self.plan.popleft()
+
+    def apply_action(self, action, environment, occupied):
+        """Carry out `action` and return a short description of the outcome"""
+        self.actions_taken.append(action)
+        x, y = self.position
+
+        if action.startswith("move"):
+            direction = action.split()[1]
+            new_pos = {
+                'up':    (max(0, x-1), y),
+                'down':  (min(environment.size-1, x+1), y),
+                'left':  (x, max(0, y-1)),
+                'right': (x, min(environment.size-1, y+1))
+            }[direction]
+            if new_pos not in occupied and new_pos != self.position:
+                self.position = new_pos
+                return f"moved {direction} (energy: {self.energy})"
+            return "move blocked"
+
+        if action == "collect":
+            item = environment.get_cell_content(x, y)
+            if item and item in self.inventory:
+                self.inventory[item] += 1
+                environment.clear_cell(x, y)
+                return f"collected {item}"
+            return "nothing to collect"
+
+        if action == "eat red" and self.inventory['red'] > 0:
+            self.inventory['red'] -= 1
+            gain = self.consumption_rates['red']
+            self.energy += gain
+            return f"ate red (+{gain})"
+
+        if action == "eat green" and self.inventory['green'] > 0:
+            self.inventory['green'] -= 1
+            gain = self.consumption_rates['green']
+            self.energy += gain
+            return f"ate green (+{gain})"
+
+        if action == "do nothing":
+            return "did nothing"
+
+        return "failed to act"
+
     def decide_and_act(self, environment, trade_manager=None, all_agents=[]):
         if not self.alive:
             return "inactive"
@@ -95,97 +271,85 @@ class Agent:
         self.step_count += 1
 
         # Lose energy each turn
-        self.energy -= ENERGY_LOSS_PER_TURN
+        self.energy -= self.sim_config.energy_loss_per_turn
         if self.energy <= 0:
             self.alive = False
             return "ran out of energy"
 
-        obs = self.get_current_observation(environment, all_agents)
-        x, y = self.position
-        cell = environment.get_cell_content(x, y)
-        occupied = {a.position for a in all_agents if a.alive and a is not self}
+        with phase("observation"):
+            obs = self.get_current_observation(environment, all_agents)
+            x, y = self.position
+            cell = environment.get_cell_content(x, y)
+        with phase("occupancy"):
+            occupied = {a.position for a in all_agents if a.alive and a is not self}
+
+        # A still-valid plan supplies the action without asking the LLM
+        planned = None
+        if self.sim_config.plan_mode and not self.sim_config.use_rule_based_policy:
+            planned = self.planned_action(environment, occupied)
 
         # Prepare visual if multimodal
         grid_b64 = None
-        if USE_MULTIMODAL:
-            try:
-                import pygame
-                pygame.init()
-                surf = render_grid_for_agent(environment, self, all_agents)
-                grid_b64 = surface_to_base64(surf)
-            except Exception:
-                grid_b64 = None
-
-        retry = None
-        for _ in range(2):
-            action = get_agent_action(
-                agent_name=self.name,
-                position=self.position,
-                inventory=self.inventory,
-                cell_content=cell,
-                energy=self.energy,
-                consumption_rate=self.consumption_rates,
-                memory=self.memory,
-                grid_image_base64=grid_b64,
-                retry_message=retry
-            ) or "do nothing"
-
-            self.actions_taken.append(action)
-            result = None
-
-            if action.startswith("move"):
-                direction = action.split()[1]
-                new_pos = {
-                    'up':    (max(0, x-1), y),
-                    'down':  (min(environment.size-1, x+1), y),
-                    'left':  (x, max(0, y-1)),
-                    'right': (x, min(environment.size-1, y+1))
-                }[direction]
-                if new_pos not in occupied and new_pos != self.position:
-                    self.position = new_pos
-                    result = f"moved {direction} (energy: {self.energy})"
-                else:
-                    retry = f"move {direction} blocked"
-                    result = "move blocked"
-
-            elif action == "collect":
-                item = environment.get_cell_content(x, y)
-                if item and item in self.inventory:
-                    self.inventory[item] += 1
-                    environment.clear_cell(x, y)
-                    result = f"collected {item}"
-                else:
-                    result = "nothing to collect"
-
-            elif action == "eat red" and self.inventory['red'] > 0:
-                self.inventory['red'] -= 1
-                gain = self.consumption_rates['red']
-                self.energy += gain
-                result = f"ate red (+{gain})"
-
-            elif action == "eat green" and self.inventory['green'] > 0:
-                self.inventory['green'] -= 1
-                gain = self.consumption_rates['green']
-                self.energy += gain
-                result = f"ate green (+{gain})"
-
-            elif action == "do nothing":
-                result = "did nothing"
+        if self.sim_config.use_multimodal and planned is None:
+            with phase("render"):
+                try:
+                    # pygame is only needed for the multimodal view, so load it lazily
+                    import pygame
+                    from pygame_visualization import render_grid_for_agent, surface_to_base64
+                    pygame.init()
+                    surf = render_grid_for_agent(environment, self, all_agents)
+                    grid_b64 = surface_to_base64(surf)
+                except Exception:
+                    grid_b64 = None
 
+        with phase("decision"):
+            if self.sim_config.use_rule_based_policy:
+                action = self.rule_based_action(environment, occupied)
+            elif planned is not None:
+                action = planned
             else:
-                retry = f"action '{action}' invalid"
-                result = "failed to act"
+                legal = self.legal_actions(environment, occupied)
+                if len(legal) == 1:
+                    # Nothing to decide, so the LLM isn't asked (in plan mode either)
+                    action = legal[0]
+                elif self.sim_config.plan_mode:
+                    action = self.make_plan(environment, occupied, cell, grid_b64, legal)
+                else:
+                    self.llm_calls += 1
+                    action = get_agent_action(
+                        agent_name=self.name,
+                        position=self.position,
+                        inventory=self.inventory,
+                        cell_content=cell,
+                        energy=self.energy,
+                        consumption_rate=self.consumption_rates,
+                        memory=self.memory,
+                        grid_image_base64=grid_b64,
+                        food_hint=self.food_hint(environment),
+                        memory_records=self.memory_records,
+                        session=self.conversation(),
+                        step=self.step_count,
+                        sim_config=self.sim_config,
+                        legal_actions=legal,
+                        recorder=self.decision_recorder,
+                        log_file=self.llm_log_file
+                    ) or "do nothing"
+
+        with phase("apply"):
+            result = self.apply_action(action, environment, occupied)
+            # Only a new plan's first action can still fail; the plan is then redone
+            if self.sim_config.plan_mode and result in ("move blocked", "failed to act"):
+                # The rest of the plan assumed this step would work
+                self.plan.clear()
+                self.plan_failure = (f"{action} blocked" if result == "move blocked"
+                                     else f"action '{action}' invalid")
 
-            # record memory & movement
+        # record memory & movement
+        with phase("history"):
             self.add_memory(obs, action, result)
             self.update_movement_history(cell, result)
 
-            return result
-
-        # if both attempts failed
-        self.add_memory(obs, "no valid action", "failed both retries")
-        self.update_movement_history(cell, "failed to act")
-        return "failed to act"
+        return result
 
     def status(self):
         print(f"{self.name} ({self.type}) @ {self.position} | "
@@ -200,5 +364,6 @@ class Agent:
             'energy': self.energy,
             'alive': self.alive,
             'recent_actions': self.actions_taken[-5:],
-            'recent_memory': self.memory[-AGENT_MEMORY_SIZE:]
+            'llm_calls': self.llm_calls,
+            'recent_memory': self.memory[-self.sim_config.memory_size:]
         }
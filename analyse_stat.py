@@ -1,6 +1,6 @@
 import json
-import matplotlib.pyplot as plt
 from collections import defaultdict
+from config import PLOT_OUTPUT_DIR, PLOT_MAX_AGENT_LINES
 
 def load_stats(filename="game_stats.json"):
     """Load game statistics from JSON file"""
@@ -11,98 +11,120 @@ def load_stats(filename="game_stats.json"):
         print(f"File {filename} not found!")
         return []
 
-def analyze_survival(stats):
-    """Analyze agent survival over time"""
-    steps = []
-    alive_counts = []
-    
+def survival_series(stats):
+    """(steps, alive counts)"""
+    return [s['step'] for s in stats], [s['alive_count'] for s in stats]
+
+def energy_series(stats):
+    """{agent name: (steps, energy)} for the steps each agent was alive"""
+    agent_energy = defaultdict(lambda: ([], []))
+    for snapshot in stats:
+        step = snapshot['step']
+        for agent in snapshot['agents']:
+            if agent['alive']:
+                steps, energy = agent_energy[agent['name']]
+                steps.append(step)
+                energy.append(agent['energy'])
+    return dict(agent_energy)
+
+def energy_envelope(stats):
+    """(steps, min, median, max) energy over the agents alive at each step"""
+    import numpy as np
+    names = {agent['name']: i for i, agent in enumerate(stats[0]['agents'])}
+    matrix = np.full((len(stats), len(names)), np.nan)
+    for row, snapshot in enumerate(stats):
+        for agent in snapshot['agents']:
+            if agent['alive']:
+                matrix[row, names[agent['name']]] = agent['energy']
+    steps = np.array([s['step'] for s in stats], dtype=float)
+    has_alive = ~np.isnan(matrix).all(axis=1)
+    matrix = matrix[has_alive]
+    return (steps[has_alive], np.min(matrix, axis=1, initial=np.inf, where=~np.isnan(matrix)),
+            np.nanmedian(matrix, axis=1), np.max(matrix, axis=1, initial=-np.inf, where=~np.isnan(matrix)))
+
+def inventory_series(stats):
+    """(steps, total red, total green) held by living agents"""
+    steps, total_red, total_green = [], [], []
     for snapshot in stats:
+        alive = [agent for agent in snapshot['agents'] if agent['alive']]
         steps.append(snapshot['step'])
-        alive_counts.append(snapshot['alive_count'])
-    
+        total_red.append(sum(agent['inventory']['red'] for agent in alive))
+        total_green.append(sum(agent['inventory']['green'] for agent in alive))
+    return steps, total_red, total_green
+
+def type_survival_rates(stats):
+    """{agent type: survival rate in %} from the first and last snapshot"""
+    type_survival = defaultdict(lambda: {'total': 0, 'survived': 0})
+    for agent in stats[0]['agents']:
+        type_survival[agent['type']]['total'] += 1
+    for agent in stats[-1]['agents']:
+        if agent['alive']:
+            type_survival[agent['type']]['survived'] += 1
+    return {t: counts['survived'] / counts['total'] * 100 for t, counts in type_survival.items()}
+
+def plot_survival(steps, alive_counts, output_path=None):
+    import matplotlib.pyplot as plt
+    from plotting import finish_figure, marker_for
+
     plt.figure(figsize=(10, 6))
-    plt.plot(steps, alive_counts, marker='o')
+    plt.plot(steps, alive_counts, marker=marker_for(steps))
     plt.xlabel('Step')
     plt.ylabel('Alive Agents')
     plt.title('Agent Survival Over Time')
     plt.grid(True)
-    plt.show()
+    return finish_figure(plt, output_path)
+
+def plot_energy_by_agent(series, output_path=None):
+    import matplotlib.pyplot as plt
+    from plotting import finish_figure, marker_for
 
-def analyze_energy_by_agent(stats):
-    """Analyze energy levels for each agent over time"""
-    agent_energy = defaultdict(lambda: {'steps': [], 'energy': []})
-    
-    for snapshot in stats:
-        step = snapshot['step']
-        for agent in snapshot['agents']:
-            if agent['alive']:
-                agent_energy[agent['name']]['steps'].append(step)
-                agent_energy[agent['name']]['energy'].append(agent['energy'])
-    
     plt.figure(figsize=(12, 8))
-    for agent_name, data in agent_energy.items():
-        plt.plot(data['steps'], data['energy'], marker='o', label=agent_name)
+    for agent_name, (steps, energy) in series.items():
+        plt.plot(steps, energy, marker=marker_for(steps), label=agent_name)
     
     plt.xlabel('Step')
     plt.ylabel('Energy')
     plt.title('Agent Energy Levels Over Time')
     plt.legend()
     plt.grid(True)
-    plt.show()
+    return finish_figure(plt, output_path)
+
+def plot_energy_envelope(steps, low, median, high, num_agents, output_path=None):
+    """Min/median/max band, for runs with too many agents to draw one line each"""
+    import matplotlib.pyplot as plt
+    from plotting import finish_figure
+
+    plt.figure(figsize=(12, 8))
+    plt.fill_between(steps, low, high, alpha=0.3, label='Min-max')
+    plt.plot(steps, median, label='Median')
+    plt.xlabel('Step')
+    plt.ylabel('Energy')
+    plt.title(f'Agent Energy Levels Over Time ({num_agents} agents)')
+    plt.legend()
+    plt.grid(True)
+    return finish_figure(plt, output_path)
+
+def plot_inventory(red_steps, total_red, green_steps, total_green, output_path=None):
+    import matplotlib.pyplot as plt
+    from plotting import finish_figure, marker_for
 
-def analyze_inventory(stats):
-    """Analyze total inventory over time"""
-    steps = []
-    total_red = []
-    total_green = []
-    
-    for snapshot in stats:
-        step = snapshot['step']
-        red_count = sum(agent['inventory']['red'] for agent in snapshot['agents'] if agent['alive'])
-        green_count = sum(agent['inventory']['green'] for agent in snapshot['agents'] if agent['alive'])
-        
-        steps.append(step)
-        total_red.append(red_count)
-        total_green.append(green_count)
-    
     plt.figure(figsize=(10, 6))
-    plt.plot(steps, total_red, 'r-', marker='o', label='Red Food')
-    plt.plot(steps, total_green, 'g-', marker='o', label='Green Food')
+    plt.plot(red_steps, total_red, 'r-', marker=marker_for(red_steps), label='Red Food')
+    plt.plot(green_steps, total_green, 'g-', marker=marker_for(green_steps), label='Green Food')
     plt.xlabel('Step')
     plt.ylabel('Total Food in Inventories')
     plt.title('Total Food Inventory Over Time')
     plt.legend()
     plt.grid(True)
-    plt.show()
+    return finish_figure(plt, output_path)
+
+def plot_agent_types(rates, output_path=None):
+    import matplotlib.pyplot as plt
+    from plotting import finish_figure
+
+    types = list(rates.keys())
+    survival_rates = [rates[t] for t in types]
 
-def analyze_agent_types(stats):
-    """Analyze performance by agent type"""
-    if not stats:
-        return
-    
-    # Get final snapshot
-    final_snapshot = stats[-1]
-    
-    # Count survivors by type
-    type_survival = defaultdict(lambda: {'total': 0, 'survived': 0})
-    
-    # Process all agents from first snapshot to get totals
-    first_snapshot = stats[0]
-    for agent in first_snapshot['agents']:
-        agent_type = agent['type']
-        type_survival[agent_type]['total'] += 1
-    
-    # Check who survived
-    for agent in final_snapshot['agents']:
-        if agent['alive']:
-            agent_type = agent['type']
-            type_survival[agent_type]['survived'] += 1
-    
-    # Plot survival rates
-    types = list(type_survival.keys())
-    survival_rates = [type_survival[t]['survived'] / type_survival[t]['total'] * 100 
-                     for t in types]
-    
     plt.figure(figsize=(8, 6))
     bars = plt.bar(types, survival_rates, color=['red', 'green', 'blue'])
     plt.xlabel('Agent Type')
@@ -116,7 +138,64 @@ def analyze_agent_types(stats):
         plt.text(bar.get_x() + bar.get_width()/2., height,
                 f'{rate:.1f}%', ha='center', va='bottom')
     
-    plt.show()
+    return finish_figure(plt, output_path)
+
+def analyze_survival(stats, output_path=None):
+    """Analyze agent survival over time"""
+    return plot_survival(*survival_series(stats), output_path=output_path)
+
+def analyze_energy_by_agent(stats, output_path=None):
+    """Analyze energy levels for each agent over time"""
+    return plot_energy_by_agent(energy_series(stats), output_path=output_path)
+
+def analyze_inventory(stats, output_path=None):
+    """Analyze total inventory over time"""
+    steps, total_red, total_green = inventory_series(stats)
+    return plot_inventory(steps, total_red, steps, total_green, output_path=output_path)
+
+def analyze_agent_types(stats, output_path=None):
+    """Analyze performance by agent type"""
+    if not stats:
+        return None
+    return plot_agent_types(type_survival_rates(stats), output_path=output_path)
+
+def report_jobs(stats):
+    """Downsampled plot jobs for render_figures, one per figure"""
+    from plotting import lttb, lttb_indices
+
+    steps, alive = lttb(*survival_series(stats))
+    jobs = [(plot_survival, {'steps': steps, 'alive_counts': alive}, 'survival.png')]
+
+    num_agents = len(stats[0]['agents'])
+    if num_agents > PLOT_MAX_AGENT_LINES:
+        steps, low, median, high = energy_envelope(stats)
+        # Keep the band's points where the median's shape needs them
+        keep = lttb_indices(steps, median)
+        jobs.append((plot_energy_envelope, {
+            'steps': steps[keep], 'low': low[keep], 'median': median[keep],
+            'high': high[keep], 'num_agents': num_agents
+        }, 'energy.png'))
+    else:
+        series = {name: lttb(steps, energy) for name, (steps, energy) in energy_series(stats).items()}
+        jobs.append((plot_energy_by_agent, {'series': series}, 'energy.png'))
+
+    steps, total_red, total_green = inventory_series(stats)
+    red_steps, total_red = lttb(steps, total_red)
+    green_steps, total_green = lttb(steps, total_green)
+    jobs.append((plot_inventory, {'red_steps': red_steps, 'total_red': total_red,
+                                  'green_steps': green_steps, 'total_green': total_green},
+                 'inventory.png'))
+
+    jobs.append((plot_agent_types, {'rates': type_survival_rates(stats)}, 'agent_types.png'))
+    return jobs
+
+def generate_report(stats, output_dir=PLOT_OUTPUT_DIR):
+    """Render every figure offscreen into output_dir, in parallel"""
+    from plotting import render_figures
+    paths = render_figures(report_jobs(stats), output_dir)
+    for path in paths:
+        print(f"Figure saved to {path}")
+    return paths
 
 def print_summary(stats):
     """Print summary statistics"""
@@ -152,8 +231,39 @@ def print_summary(stats):
             if agent.get('last_actions'):
                 print(f"  Last actions: {', '.join(agent['last_actions'][-3:])}")
 
-def main():
-    """Run all analyses"""
+def print_store_summary(db_path):
+    """Print cross-run summaries straight from the SQLite experiment store"""
+    from experiment_store import ExperimentStore
+    store = ExperimentStore(db_path)
+    try:
+        runs = store.run_summaries()
+        print(f"\n=== EXPERIMENT STORE: {db_path} ===")
+        print(f"Finished runs: {len(runs)}")
+
+        by_rate = store.survival_by_rate(source="study")
+        if by_rate:
+            print("\nSurvival by consumption rate (study runs):")
+            for r in by_rate:
+                print(f"  {r['consumption_rate']}: {r['avg_survival_rate']:.2%} "
+                      f"± {r['std_survival_rate']:.2%} over {r['runs']} runs")
+
+        decisions = store.decision_stats()
+        if decisions:
+            print("\nDecisions by backend:")
+            for d in decisions:
+                backend = d['backend'] or 'none'
+                avg = d['avg_latency_ms'] or 0.0
+                print(f"  {backend}: {d['decisions']} decisions, avg {avg:.0f} ms")
+
+        print("\nLatest runs:")
+        for run in runs[:10]:
+            print(f"  #{run['run_id']} {run['source']} seed={run['seed']} "
+                  f"rate={run['consumption_rate']} survivors={run['survivors']}")
+    finally:
+        store.close()
+
+def main(report_dir=None):
+    """Run all analyses; with report_dir, render the figures headless into that directory"""
     print("Loading game statistics...")
     stats = load_stats()
     
@@ -164,18 +274,29 @@ def main():
     print_summary(stats)
     
     print("\nGenerating visualizations...")
-    analyze_survival(stats)
-    analyze_energy_by_agent(stats)
-    analyze_inventory(stats)
-    analyze_agent_types(stats)
+    if report_dir:
+        generate_report(stats, report_dir)
+    else:
+        analyze_survival(stats)
+        analyze_energy_by_agent(stats)
+        analyze_inventory(stats)
+        analyze_agent_types(stats)
     
     print("\nAnalysis complete!")
 
 if __name__ == "__main__":
     # Check if matplotlib is install
+    import sys
+    if len(sys.argv) > 2 and sys.argv[1] == "--db":
+        print_store_summary(sys.argv[2])
+        sys.exit(0)
+    report_dir = None
+    if len(sys.argv) > 1 and sys.argv[1] == "--report":
+        # Headless: python analyse_stat.py --report [output_dir]
+        report_dir = sys.argv[2] if len(sys.argv) > 2 else PLOT_OUTPUT_DIR
     try:
         import matplotlib
-        main()
+        main(report_dir)
     except ImportError:
         print("Please install matplotlib to use the analysis tool:")
         print("pip install matplotlib")
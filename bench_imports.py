@@ -0,0 +1,83 @@
+"""Import-time benchmark for the simulation entry points.
+
+Each module is imported in a fresh interpreter (so nothing is cached) with
+`python -X importtime`, repeated a few times. Reports the median wall time
+and the heaviest third-party imports pulled in by each module.
+
+Usage: python bench_imports.py [module ...] [--repeat N]
+"""
+import os
+import sys
+import time
+import statistics
+import subprocess
+
+ENTRY_MODULES = [
+    "config",
+    "environment",
+    "llm",
+    "agent",
+    "main",
+    "consumption_rate_study",
+    "analyse_stat",
+    "experiment_store",
+]
+HEAVY_MODULES = ["pygame", "openai", "requests", "dotenv", "matplotlib", "numpy", "PIL"]
+
+
+def time_import(module, repeat=5):
+    """Return (median seconds, heavy modules loaded, error) for importing `module`"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    loaded = set()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=here, capture_output=True, text=True
+        )
+        timings.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"
+            return None, set(), last_line
+        for line in proc.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            name = line.rsplit("|", 1)[-1].strip()
+            if name in HEAVY_MODULES:
+                loaded.add(name)
+    return statistics.median(timings), loaded, None
+
+
+def baseline(repeat=5):
+    """Interpreter start-up cost, subtracted from every module timing"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = 5
+    if "--repeat" in args:
+        idx = args.index("--repeat")
+        repeat = int(args[idx + 1])
+        del args[idx:idx + 2]
+    modules = args or ENTRY_MODULES
+
+    base = baseline(repeat)
+    print(f"Interpreter start-up: {base * 1000:.0f} ms (subtracted below)\n")
+    print(f"{'module':<26}{'import ms':>10}  heavy dependencies loaded")
+    for module in modules:
+        seconds, loaded, error = time_import(module, repeat)
+        if error:
+            print(f"{module:<26}{'n/a':>10}  {error}")
+            continue
+        heavy = ", ".join(sorted(loaded)) or "-"
+        print(f"{module:<26}{(seconds - base) * 1000:>10.0f}  {heavy}")
+
+
+if __name__ == "__main__":
+    main()
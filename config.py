@@ -8,12 +8,22 @@ INITIAL_FOOD_PERCENTAGE = 0.25  # 25% of cells start with food
 NUM_AGENTS = 5
 INITIAL_ENERGY = 20
 INITIAL_INVENTORY = {'red': 1, 'green': 1}
+VIEW_RADIUS = 1  # Observation window radius (1 = 3x3 around the agent)
 
 
 # NEW: Consumption rate study parameters
 CONSUMPTION_RATE = 1.0 
 CONSUMPTION_RATES = [0.8, 0.9, 1.0, 1.1, 1.2]
-STUDY_RUNS_PER_RATE = 3  
+STUDY_RUNS_PER_RATE = 3  # Runs per rate when STUDY_ADAPTIVE is False
+STUDY_ADAPTIVE = True  # Allocate runs by confidence-interval racing across rates
+STUDY_MIN_RUNS_PER_RATE = 3  # Runs every rate gets before any can be dropped
+STUDY_MAX_RUNS_PER_RATE = 20  # Upper bound on runs for a rate still in the race
+STUDY_CONFIDENCE_Z = 1.96  # z-score of the racing confidence intervals (95%)
+STUDY_MIN_STD = 0.1  # Floor on the survival-rate std used in the intervals
+STUDY_INDIFFERENCE = 0.1  # Stop once no rate can beat the best by more than this
+STUDY_COMMON_RANDOM_NUMBERS = True  # Run i uses the same scenario for every rate (paired comparisons)
+STUDY_SCENARIO_SEED = 12345  # Seed of the scenario bank
+STUDY_MIN_PAIRED_STD = 0.05  # Floor on the std of paired differences
 
 # Agent consumption rates (energy gained from eating)
 AGENT_BASE_CONFIGS = {
@@ -45,6 +55,8 @@ REPLENISH_GREEN_COUNT = 5
 TOTAL_STEPS = 200
 FPS = 2  # Frames per second for visualization
 PAUSE_ON_START = False
+LIVE_VIEW = False  # Show main.py runs in a pygame window (drawn in the main thread, sim in a worker)
+LIVE_VIEW_QUEUE_SIZE = 4  # Frames buffered for the viewer; the oldest is dropped when full
 
 # Display settings
 SCREEN_WIDTH = 540
@@ -71,12 +83,65 @@ COLORS = {
 LOG_STATS_INTERVAL = 10  # Save statistics every N steps
 ENABLE_DEBUG_OUTPUT = True
 LOG_LLM_CALLS = True
+LOG_MODE = "csv"  # "csv" (per agent per step rows), "events" (event log) or "both"
+EVENT_LOG_PATH = "logs/events.jsonl"
+EVENT_KEYFRAME_INTERVAL = 50  # Steps between full-state keyframes in the event log
+
+# Experiment store settings (SQLite)
+USE_EXPERIMENT_STORE = False  # Set to True to record runs, steps and decisions in SQLite
+EXPERIMENT_DB_PATH = "experiments.db"
+EXPERIMENT_STORE_BATCH_SIZE = 500  # Buffered rows written per transaction
+RANDOM_SEED = None  # Fixed seed for main.py runs, None draws a new seed each run
+
+# Trajectory recording settings (numpy.memmap full-state snapshots)
+RECORD_TRAJECTORY = False  # Set to True to record the full world state every step
+TRAJECTORY_DIR = "trajectories"  # Each run gets its own subdirectory
+
+# Replay viewer settings (python pygame_visualization.py --replay <trajectory_dir>)
+REPLAY_FPS = 60  # Render rate and steps per second at speed x1
+REPLAY_MAX_SPEED = 64  # Highest playback multiplier
+REPLAY_PREFETCH = 64  # Frames decoded ahead of the cursor
+REPLAY_BAR_HEIGHT = 30
+
+# Profiling settings
+PROFILE_PHASES = False  # Time each phase of a step and print per-run percentiles
+PROFILE_CPROFILE = False  # Wrap runs in cProfile and dump .prof and collapsed stacks
+PROFILE_DIR = "profiles"
+
+# Plot settings (python analyse_stat.py --report [dir] renders headless)
+PLOT_HEADLESS = False  # Save figures offscreen (Agg) instead of opening windows
+PLOT_OUTPUT_DIR = "reports"
+PLOT_WORKERS = None  # Worker processes for report figures, None uses every CPU
+PLOT_MAX_POINTS = 2000  # Long series are LTTB-downsampled to this many points
+PLOT_MAX_AGENT_LINES = 20  # Above this, energy is drawn as a min/median/max band
+PLOT_MARKER_MAX_POINTS = 200  # Point markers only on series up to this length
+PLOT_DPI = 150
+
+# Simulation server settings (python simulation_server.py serve)
+SERVER_HOST = "127.0.0.1"  # Local API only
+SERVER_PORT = 8765
+SERVER_MAX_RUNNING = 32  # Simulations stepping at once, later submissions wait in a queue
+SERVER_WORKER_THREADS = 64  # Threads running agent turns (they block on LLM calls)
+SERVER_KEEP_FINISHED = 1000  # Finished simulations kept for status/result queries
 
 # LLM settings
 LLM_MODEL = "gpt-4o" #"gpt-3.5-turbo"
 LLM_TEMPERATURE = 0.7
 LLM_MAX_TOKENS = 50
 LLM_RETRY_ATTEMPTS = 2
+# Stream responses and stop as soon as a valid action is recognised.
+# Only takes effect with LLM_CONSTRAINED_DECODING = False (see below).
+LLM_STREAMING = False
+# Constrain replies to the legal actions (Ollama format / OpenAI structured outputs),
+# with max_tokens cut to the longest reply allowed. Constrained replies are never
+# streamed (the decoder already stops when the JSON closes), so this takes
+# precedence over LLM_STREAMING.
+LLM_CONSTRAINED_DECODING = True
+PROMPT_MODE = "verbose"  # "verbose" (emoji report) or "compact" (terse fields, token-budgeted)
+PROMPT_TOKEN_BUDGET = 160  # Compact mode adds memory and tips only while under this many tokens
+LLM_SESSION_MODE = False  # Keep a conversation per agent and send only the new state each step
+PLAN_MODE = False  # Ask for a short action sequence and only call the LLM again to replan
+PLAN_LENGTH = 4  # Most actions per plan
 
 # Local LLM settings
 USE_LOCAL_LLM = False  # Set to True to use local LLM, False for OpenAI
@@ -84,7 +149,30 @@ USE_MULTIMODAL = False  # Set to True to use multimodal model (visual grid perce
 LOCAL_LLM_MODEL = "phi3" #"tinyllama"  # Ollama model name for text-only
 MULTIMODAL_LLM_MODEL = "llava"  # Ollama model name for multimodal
 LOCAL_LLM_URL = "http://localhost:11434"  # Ollama default URL
+LOCAL_LLM_URLS = [LOCAL_LLM_URL]  # All local endpoints; requests go to the least busy healthy one
+LOCAL_LLM_KEEP_ALIVE = "30m"  # How long Ollama keeps a model loaded after a request
+LOCAL_LLM_WARM_UP = True  # Preload local models on every endpoint at simulation start
 LOCAL_LLM_TIMEOUT = 60  # Timeout in seconds for local LLM requests
+OPENAI_TIMEOUT = 60  # Timeout in seconds for OpenAI requests
+OPENAI_BASE_URL = None  # None for api.openai.com; any compatible endpoint, e.g. fake_llm_server.py
+
+# Backend health settings (circuit breaker and adaptive timeouts)
+CIRCUIT_FAILURE_THRESHOLD = 3  # Consecutive failures before a backend is skipped
+CIRCUIT_RESET_SECONDS = 30  # Time a failing backend is skipped before a probe request
+ADAPTIVE_TIMEOUT_MIN = 2.0  # Lower bound for adapted timeouts (seconds)
+ADAPTIVE_TIMEOUT_MULTIPLIER = 3.0  # Timeout = p95 of recent latencies x this
+ADAPTIVE_TIMEOUT_WINDOW = 50  # Recent latencies kept per backend
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 5  # Use the configured timeout until this many samples
+
+# Request scheduler settings (rate limits and adaptive concurrency)
+OPENAI_RPM_LIMIT = 500  # Requests per minute allowed by the provider
+OPENAI_TPM_LIMIT = 30000  # Tokens per minute allowed by the provider
+LLM_INITIAL_CONCURRENCY = 4  # Concurrent requests per backend at start
+LLM_MIN_CONCURRENCY = 1
+LLM_MAX_CONCURRENCY = 32
+LLM_LATENCY_TARGET = 10.0  # Seconds; slower responses shrink concurrency
+LLM_RATE_LIMIT_BACKOFF = 1.0  # Base pause (seconds) after a 429 without Retry-After
+LLM_RATE_LIMIT_MAX_WAIT = 30.0  # Seconds an OpenAI call keeps waiting out 429s (not counted as retries)
 
 # Memory settings
 AGENT_MEMORY_SIZE = 3  # Number of past actions/observations to remember
@@ -92,4 +180,5 @@ AGENT_MEMORY_SIZE = 3  # Number of past actions/observations to remember
 # Fallback behavior settings
 CRITICAL_ENERGY_THRESHOLD = 5  # Energy level to trigger emergency eating
 LOW_ENERGY_THRESHOLD = 10     # Energy level to prioritize eating
-EXPLORATION_PROBABILITY = 0.3  # Chance to explore when no immediate goals
\ No newline at end of file
+EXPLORATION_PROBABILITY = 0.3  # Chance to explore when no immediate goals
+USE_RULE_BASED_POLICY = False  # Set to True to skip the LLM and use Agent.rule_based_action
\ No newline at end of file
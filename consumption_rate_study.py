@@ -3,104 +3,304 @@ import sys
 import csv
 import json
 import random
-import matplotlib.pyplot as plt
-import numpy as np
+import statistics
 from datetime import datetime
 from config import (
-    NUM_AGENTS,
-    GRID_SIZE,
-    TOTAL_STEPS,
-    REPLENISH_INTERVAL,
-    REPLENISH_RED_COUNT,
-    REPLENISH_GREEN_COUNT,
-    AGENT_BASE_CONFIGS,
     CONSUMPTION_RATES,
-    STUDY_RUNS_PER_RATE
+    STUDY_RUNS_PER_RATE,
+    STUDY_ADAPTIVE,
+    STUDY_MIN_RUNS_PER_RATE,
+    STUDY_MAX_RUNS_PER_RATE,
+    STUDY_CONFIDENCE_Z,
+    STUDY_MIN_STD,
+    STUDY_INDIFFERENCE,
+    STUDY_COMMON_RANDOM_NUMBERS,
+    STUDY_SCENARIO_SEED,
+    STUDY_MIN_PAIRED_STD,
+    USE_EXPERIMENT_STORE,
+    EXPERIMENT_DB_PATH,
+    USE_LOCAL_LLM,
+    LOCAL_LLM_WARM_UP,
+    PLOT_HEADLESS,
+    PLOT_OUTPUT_DIR
 )
 from environment import Environment
 from agent import Agent
+from trade_manager import TradeManager
+from simulation_config import SimulationConfig
+from llm import warm_up_local_models
+from profiler import phase, reset_phases, print_phase_report, profile_run
 
-def generate_unique_positions(num_agents: int, grid_size: int):
-    positions = set()
+def generate_unique_positions(num_agents: int, grid_size: int, rng=random):
+    # Keep draw order so the same rng state always gives each agent the same cell
+    positions = []
     while len(positions) < num_agents:
-        positions.add((
-            random.randint(0, grid_size - 1),
-            random.randint(0, grid_size - 1)
-        ))
-    return list(positions)
+        position = (
+            rng.randint(0, grid_size - 1),
+            rng.randint(0, grid_size - 1)
+        )
+        if position not in positions:
+            positions.append(position)
+    return positions
 
-def run_simulation_with_consumption_rate(consumption_rate, num_runs=None):
-    """Run multiple simulations with the given consumption rate and return average survival rate"""
+def scenario_bank(num_runs):
+    """Seeds for runs 0..num_runs-1, identical for every consumption rate (common random numbers)"""
+    rng = random.Random(STUDY_SCENARIO_SEED)
+    return [rng.randrange(2**32) for _ in range(num_runs)]
+
+def run_single_simulation(consumption_rate, store=None, seed=None, sim_config=None,
+                          decision_recorder=None):
+    """Run one simulation with the given consumption rate and return its survival rate.
+
+    `seed` fixes the scenario: initial grid, start positions and replenishment
+    all come from random.Random(seed). None draws a fresh scenario. Other
+    settings come from `sim_config` (default: the config module). Every LLM
+    decision also goes to `decision_recorder`, if given.
+    """
+    base = sim_config if sim_config is not None else SimulationConfig.from_config()
+    cfg = base.replace(consumption_rate=consumption_rate)
+
+    if seed is None:
+        seed = random.randrange(2**32)
+    random.seed(seed)  # agent-side randomness (e.g. rule-based exploration)
+    run_id = None
+    if store:
+        from experiment_store import config_snapshot
+        run_id = store.start_run("study", seed=seed, consumption_rate=cfg.consumption_rate,
+                                 config=config_snapshot(cfg), num_agents=cfg.num_agents,
+                                 total_steps=cfg.total_steps)
+
+    # Create environment and agents
+    env = Environment(rng=random.Random(seed), sim_config=cfg)
+    positions = generate_unique_positions(cfg.num_agents, cfg.grid_size, rng=env.rng)
+    agents = [
+        Agent(f"Agent{i+1}", start_pos=positions[i], sim_config=cfg)
+        for i in range(cfg.num_agents)
+    ]
+    recorders = [r for r in (decision_recorder, store and store.decision_recorder(run_id, agents)) if r]
+    if recorders:
+        def record(*decision):
+            for recorder in recorders:
+                recorder(*decision)
+        for agent in agents:
+            agent.decision_recorder = record
+    trade_manager = TradeManager(trade_recorder=store.trade_recorder(run_id) if store else None)
+
+    # Run simulation until the step limit or until every agent is dead
+    steps_run = 0
+    for step in range(1, cfg.total_steps + 1):
+        with phase("feature_maps"):
+            env.update_feature_maps(agents)
+        for agent in agents:
+            if agent.alive:
+                agent.decide_and_act(env, trade_manager, all_agents=agents)
+        steps_run = step
+
+        if store:
+            with phase("logging"):
+                store.record_agent_steps(run_id, step, agents)
+
+        if not any(agent.alive for agent in agents):
+            break
+        
+        # Replenish food periodically
+        if step % cfg.replenish_interval == 0:
+            with phase("replenish"):
+                env.fixed_replenish(
+                    red_count=cfg.replenish_red_count,
+                    green_count=cfg.replenish_green_count
+                )
+    
+    # Calculate survival rate
+    survivors = sum(1 for agent in agents if agent.alive)
+    survival_rate = survivors / cfg.num_agents
+    if store:
+        store.finish_run(run_id, steps_run, survivors, cfg.num_agents)
+    
+    ended = "" if steps_run == cfg.total_steps else f", all dead at step {steps_run}"
+    print(f"    Survival rate: {survival_rate:.2%} ({survivors}/{cfg.num_agents}{ended})")
+    return survival_rate
+
+def survival_samples(consumption_rate, num_runs=None, store=None, seeds=None):
+    """Survival rate of each of `num_runs` runs; run i uses seeds[i] when given"""
     if num_runs is None:
         num_runs = STUDY_RUNS_PER_RATE
-        
+
     survival_rates = []
     
     for run in range(num_runs):
         print(f"  Running simulation {run + 1}/{num_runs} with consumption rate {consumption_rate}")
-        
-        # Update agent configs with new consumption rate
-        import config
-        config.CONSUMPTION_RATE = consumption_rate
-        config.AGENT_CONFIGS = {
-            agent: {
-                'red': int(rates['red'] * consumption_rate),
-                'green': int(rates['green'] * consumption_rate)
-            }
-            for agent, rates in AGENT_BASE_CONFIGS.items()
-        }
-        
-        # Create environment and agents
-        env = Environment()
-        positions = generate_unique_positions(NUM_AGENTS, GRID_SIZE)
-        agents = [
-            Agent(f"Agent{i+1}", start_pos=positions[i])
-            for i in range(NUM_AGENTS)
-        ]
-        
-        # Run simulation
-        for step in range(1, TOTAL_STEPS + 1):
-            for agent in agents:
-                if agent.alive:
-                    agent.decide_and_act(env, all_agents=agents)
-            
-            # Replenish food periodically
-            if step % REPLENISH_INTERVAL == 0:
-                env.fixed_replenish(
-                    red_count=REPLENISH_RED_COUNT,
-                    green_count=REPLENISH_GREEN_COUNT
-                )
-        
-        # Calculate survival rate
-        survivors = sum(1 for agent in agents if agent.alive)
-        survival_rate = survivors / NUM_AGENTS
-        survival_rates.append(survival_rate)
-        
-        print(f"    Survival rate: {survival_rate:.2%} ({survivors}/{NUM_AGENTS})")
+        seed = seeds[run] if seeds else None
+        survival_rates.append(run_single_simulation(consumption_rate, store=store, seed=seed))
+    return survival_rates
+
+def run_simulation_with_consumption_rate(consumption_rate, num_runs=None, store=None, seeds=None):
+    """Run multiple simulations with the given consumption rate and return average survival rate"""
+    survival_rates = survival_samples(consumption_rate, num_runs, store=store, seeds=seeds)
     
-    avg_survival_rate = np.mean(survival_rates)
-    std_survival_rate = np.std(survival_rates)
+    avg_survival_rate = statistics.fmean(survival_rates)
+    std_survival_rate = statistics.pstdev(survival_rates)
     
     return avg_survival_rate, std_survival_rate
 
+def confidence_interval(samples, min_std=STUDY_MIN_STD):
+    """(mean, half-width) of a normal-approximation confidence interval.
+
+    The standard deviation is floored at `min_std` so a few identical
+    runs (common with only NUM_AGENTS possible outcomes) don't look certain.
+    """
+    mean = statistics.fmean(samples)
+    std = statistics.stdev(samples) if len(samples) > 1 else 0.0
+    std = max(std, min_std)
+    return mean, STUDY_CONFIDENCE_Z * std / len(samples) ** 0.5
+
+def paired_difference(samples, reference):
+    """(mean, half-width) of samples[i] - reference[i] over the runs both have.
+
+    With common random numbers run i of every rate shares its scenario, so
+    the pairwise differences cancel most of the environment noise.
+    """
+    n = min(len(samples), len(reference))
+    differences = [samples[i] - reference[i] for i in range(n)]
+    return confidence_interval(differences, min_std=STUDY_MIN_PAIRED_STD)
+
+def advantage_upper_bound(samples, best_samples, paired):
+    """Upper confidence bound on how much better a rate could be than the current best"""
+    if paired:
+        mean, half_width = paired_difference(samples, best_samples)
+        return mean + half_width
+    mean, half_width = confidence_interval(samples)
+    best_mean, best_half_width = confidence_interval(best_samples)
+    return (mean + half_width) - (best_mean - best_half_width)
+
+def paired_statistics(results, samples):
+    """Add each rate's paired difference to the best rate (needs common random numbers)"""
+    best = max(results, key=lambda r: r['avg_survival_rate'])['consumption_rate']
+    for r in results:
+        rate = r['consumption_rate']
+        mean, half_width = paired_difference(samples[rate], samples[best])
+        r['paired_vs_best'] = {
+            'reference_rate': best,
+            'pairs': min(len(samples[rate]), len(samples[best])),
+            'mean_difference': mean,
+            'ci_half_width': half_width
+        }
+    return results
+
+def race_consumption_rates(consumption_rates, store=None):
+    """Allocate runs across rates by confidence-interval racing.
+
+    Every still-competing rate gets one more run per round. After
+    STUDY_MIN_RUNS_PER_RATE rounds, a rate is dropped once its upper
+    confidence bound falls below the lower bound of the current best. The
+    race ends when one rate is left, when no remaining rate could beat the
+    best by more than STUDY_INDIFFERENCE, or after STUDY_MAX_RUNS_PER_RATE
+    rounds.
+    """
+    samples = {rate: [] for rate in consumption_rates}
+    eliminated_in_round = {rate: None for rate in consumption_rates}
+    active = list(consumption_rates)
+    paired = STUDY_COMMON_RANDOM_NUMBERS
+    seeds = scenario_bank(STUDY_MAX_RUNS_PER_RATE) if paired else [None] * STUDY_MAX_RUNS_PER_RATE
+
+    for round_number in range(1, STUDY_MAX_RUNS_PER_RATE + 1):
+        print(f"\nRound {round_number}: racing rates {active}")
+        for rate in active:
+            print(f"  Running simulation {round_number} with consumption rate {rate}")
+            samples[rate].append(
+                run_single_simulation(rate, store=store, seed=seeds[round_number - 1])
+            )
+
+        if round_number < STUDY_MIN_RUNS_PER_RATE:
+            continue
+        best = max(active, key=lambda r: statistics.fmean(samples[r]))
+        advantages = {
+            rate: advantage_upper_bound(samples[rate], samples[best], paired)
+            for rate in active if rate != best
+        }
+        for rate, advantage in advantages.items():
+            if advantage < 0:
+                active.remove(rate)
+                eliminated_in_round[rate] = round_number
+                print(f"  Dropping rate {rate}: {statistics.fmean(samples[rate]):.2%} "
+                      f"is below {best} ({statistics.fmean(samples[best]):.2%})")
+        if len(active) == 1:
+            print(f"  Rate {active[0]} is separated from all others")
+            break
+        if max(advantages[r] for r in active if r != best) <= STUDY_INDIFFERENCE:
+            print(f"  Remaining rates are within {STUDY_INDIFFERENCE:.0%} of {best}, stopping")
+            break
+
+    results = []
+    for rate in consumption_rates:
+        mean, half_width = confidence_interval(samples[rate])
+        results.append({
+            'consumption_rate': rate,
+            'avg_survival_rate': mean,
+            'std_survival_rate': statistics.pstdev(samples[rate]),
+            'runs': len(samples[rate]),
+            'ci_half_width': half_width,
+            'eliminated_in_round': eliminated_in_round[rate]
+        })
+    if paired:
+        paired_statistics(results, samples)
+    return results
+
 def main():
     # Use consumption rates from config
     consumption_rates = CONSUMPTION_RATES
     results = []
     
     print("Starting consumption rate study...")
+    reset_phases()
+    if USE_LOCAL_LLM and LOCAL_LLM_WARM_UP:
+        warm_up_local_models()
     print(f"Testing consumption rates: {consumption_rates}")
-    print(f"Runs per rate: {STUDY_RUNS_PER_RATE}")
+    if STUDY_ADAPTIVE:
+        print(f"Runs per rate: {STUDY_MIN_RUNS_PER_RATE}-{STUDY_MAX_RUNS_PER_RATE} (adaptive racing)")
+    else:
+        print(f"Runs per rate: {STUDY_RUNS_PER_RATE}")
+
+    store = None
+    if USE_EXPERIMENT_STORE:
+        from experiment_store import ExperimentStore
+        store = ExperimentStore()
     
-    for rate in consumption_rates:
-        print(f"\nTesting consumption rate: {rate}")
-        avg_survival, std_survival = run_simulation_with_consumption_rate(rate)
-        results.append({
-            'consumption_rate': rate,
-            'avg_survival_rate': avg_survival,
-            'std_survival_rate': std_survival
-        })
-        print(f"Average survival rate: {avg_survival:.2%} ± {std_survival:.2%}")
+    if STUDY_ADAPTIVE:
+        results = race_consumption_rates(consumption_rates, store=store)
+        total_runs = sum(r['runs'] for r in results)
+        print(f"\nRacing used {total_runs} simulations "
+              f"(fixed allocation at the maximum: {STUDY_MAX_RUNS_PER_RATE * len(consumption_rates)})")
+        for r in results:
+            print(f"  {r['consumption_rate']}: {r['avg_survival_rate']:.2%} "
+                  f"± {r['ci_half_width']:.2%} over {r['runs']} runs")
+    else:
+        seeds = scenario_bank(STUDY_RUNS_PER_RATE) if STUDY_COMMON_RANDOM_NUMBERS else None
+        samples = {}
+        for rate in consumption_rates:
+            print(f"\nTesting consumption rate: {rate}")
+            samples[rate] = survival_samples(rate, store=store, seeds=seeds)
+            avg_survival = statistics.fmean(samples[rate])
+            std_survival = statistics.pstdev(samples[rate])
+            results.append({
+                'consumption_rate': rate,
+                'avg_survival_rate': avg_survival,
+                'std_survival_rate': std_survival
+            })
+            print(f"Average survival rate: {avg_survival:.2%} ± {std_survival:.2%}")
+        if STUDY_COMMON_RANDOM_NUMBERS:
+            paired_statistics(results, samples)
+
+    if STUDY_COMMON_RANDOM_NUMBERS:
+        print("\nPaired differences to the best rate (same scenarios for every rate):")
+        for r in results:
+            p = r['paired_vs_best']
+            print(f"  {r['consumption_rate']} - {p['reference_rate']}: "
+                  f"{p['mean_difference']:+.2%} ± {p['ci_half_width']:.2%} over {p['pairs']} pairs")
+
+    if store:
+        store.close()
+    print_phase_report("Phase timings across all study runs")
     
     # Save results to JSON
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -118,11 +318,19 @@ def main():
 
 def create_survival_rate_graph(results, timestamp):
     """Create a graph showing survival rate vs consumption rate"""
+    if PLOT_HEADLESS:
+        from plotting import use_headless_backend
+        use_headless_backend()
+    import matplotlib.pyplot as plt
+
     rates = [r['consumption_rate'] for r in results]
     survival_rates = [r['avg_survival_rate'] for r in results]
     std_rates = [r['std_survival_rate'] for r in results]
+    paired = all('paired_vs_best' in r for r in results)
     
-    plt.figure(figsize=(12, 8))
+    plt.figure(figsize=(12, 12 if paired else 8))
+    if paired:
+        plt.subplot(2, 1, 1)
     plt.errorbar(rates, survival_rates, yerr=std_rates, marker='o', linewidth=2, markersize=8)
     plt.xlabel('Consumption Rate Multiplier', fontsize=12)
     plt.ylabel('Average Survival Rate', fontsize=12)
@@ -134,7 +342,7 @@ def create_survival_rate_graph(results, timestamp):
     plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda y, _: f'{y:.0%}'))
     
     # Highlight the optimum point
-    max_survival_idx = np.argmax(survival_rates)
+    max_survival_idx = max(range(len(survival_rates)), key=survival_rates.__getitem__)
     optimum_rate = rates[max_survival_idx]
     optimum_survival = survival_rates[max_survival_idx]
     
@@ -144,14 +352,44 @@ def create_survival_rate_graph(results, timestamp):
                 xytext=(optimum_rate + 0.2, optimum_survival + 0.1),
                 arrowprops=dict(arrowstyle='->', color='red'),
                 fontsize=10, color='red')
+
+    if paired:
+        # Paired differences to the optimum, with confidence intervals
+        reference = results[0]['paired_vs_best']['reference_rate']
+        differences = [r['paired_vs_best']['mean_difference'] for r in results]
+        half_widths = [r['paired_vs_best']['ci_half_width'] for r in results]
+        plt.subplot(2, 1, 2)
+        plt.errorbar(rates, differences, yerr=half_widths, marker='s', linewidth=2,
+                     markersize=8, capsize=5, color='purple')
+        plt.axhline(0, color='gray', linestyle='--')
+        plt.xlabel('Consumption Rate Multiplier', fontsize=12)
+        plt.ylabel(f'Survival Difference vs {reference}', fontsize=12)
+        plt.title('Paired Difference to Optimum (common random numbers)', fontsize=14)
+        plt.grid(True, alpha=0.3)
+        plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda y, _: f'{y:+.0%}'))
     
     plt.tight_layout()
     
     # Save the graph
     graph_file = f"survival_rate_graph_{timestamp}.png"
+    if PLOT_HEADLESS:
+        os.makedirs(PLOT_OUTPUT_DIR, exist_ok=True)
+        graph_file = os.path.join(PLOT_OUTPUT_DIR, graph_file)
     plt.savefig(graph_file, dpi=300, bbox_inches='tight')
     print(f"Graph saved to {graph_file}")
-    plt.show()
+    if PLOT_HEADLESS:
+        plt.close()
+    else:
+        plt.show()
+
+def load_results_from_store(db_path=EXPERIMENT_DB_PATH):
+    """Aggregate every recorded study run per consumption rate, without reading result files"""
+    from experiment_store import ExperimentStore
+    store = ExperimentStore(db_path)
+    try:
+        return store.survival_by_rate(source="study")
+    finally:
+        store.close()
 
 def find_optimum_rate(results):
     """Find and display the optimum consumption rate"""
@@ -163,10 +401,28 @@ def find_optimum_rate(results):
     
     # Show what this means for each agent
     print(f"\nAgent consumption rates at optimum ({max_survival_result['consumption_rate']}):")
-    for agent, base_rates in AGENT_BASE_CONFIGS.items():
-        red_rate = int(base_rates['red'] * max_survival_result['consumption_rate'])
-        green_rate = int(base_rates['green'] * max_survival_result['consumption_rate'])
-        print(f"  {agent}: Red={red_rate}, Green={green_rate}")
+    optimum = SimulationConfig.from_config(consumption_rate=max_survival_result['consumption_rate'])
+    for agent in optimum.agent_base_configs:
+        rates = optimum.agent_rates(agent)
+        print(f"  {agent}: Red={rates['red']}, Green={rates['green']}")
+
+def print_store_results(db_path=EXPERIMENT_DB_PATH):
+    """Survival per rate and the optimum over every study run in the experiment store"""
+    results = load_results_from_store(db_path)
+    if not results:
+        print(f"No finished study runs in {db_path}")
+        return
+    print(f"Study runs in {db_path}:")
+    for r in results:
+        print(f"  {r['consumption_rate']}: {r['avg_survival_rate']:.2%} "
+              f"± {r['std_survival_rate']:.2%} over {r['runs']} runs")
+    find_optimum_rate(results)
 
 if __name__ == "__main__":
-    main
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "--db":
+        # Summarise from the experiment store instead of running a study:
+        # python consumption_rate_study.py --db [path]
+        print_store_results(sys.argv[2] if len(sys.argv) > 2 else EXPERIMENT_DB_PATH)
+        sys.exit(0)
+    with profile_run("consumption_rate_study"):
+        main()
@@ -1,21 +1,129 @@
 import random
+from collections import deque
 
 GRID_SIZE = 9
 FOOD_TYPES = ['red', 'green', None]
 
+# Move name for each grid offset, matching Agent.decide_and_act
+DIRECTIONS = {'up': (-1, 0), 'down': (1, 0), 'left': (0, -1), 'right': (0, 1)}
+
+def summed_area_table(size, cells):
+    """(size+1)x(size+1) table where t[i][j] is the count of `cells` in rows < i, columns < j"""
+    table = [[0] * (size + 1) for _ in range(size + 1)]
+    marked = [[0] * size for _ in range(size)]
+    for x, y in cells:
+        marked[x][y] += 1
+    for i in range(size):
+        row_sum = 0
+        above = table[i]
+        current = table[i + 1]
+        for j in range(size):
+            row_sum += marked[i][j]
+            current[j + 1] = above[j + 1] + row_sum
+    return table
+
+def distance_field(size, sources):
+    """Multi-source BFS from `sources`: distance to the nearest one and the first move towards it.
+
+    Runs in O(cells) for all sources together. Cells with no reachable source
+    have distance None; source cells have distance 0 and direction None.
+    """
+    dist = [[None] * size for _ in range(size)]
+    direction = [[None] * size for _ in range(size)]
+    queue = deque()
+    for x, y in sources:
+        dist[x][y] = 0
+        queue.append((x, y))
+    while queue:
+        x, y = queue.popleft()
+        for name, (dx, dy) in DIRECTIONS.items():
+            nx, ny = x - dx, y - dy  # neighbour that reaches (x, y) by moving `name`
+            if 0 <= nx < size and 0 <= ny < size and dist[nx][ny] is None:
+                dist[nx][ny] = dist[x][y] + 1
+                direction[nx][ny] = name
+                queue.append((nx, ny))
+    return dist, direction
+
+def window_sum(table, size, x, y, radius):
+    """Count inside the (2*radius+1)^2 window centred on (x, y), clipped to the grid"""
+    x0, y0 = max(0, x - radius), max(0, y - radius)
+    x1, y1 = min(size, x + radius + 1), min(size, y + radius + 1)
+    return table[x1][y1] - table[x0][y1] - table[x1][y0] + table[x0][y0]
+
 class Environment:
-    def __init__(self):
-        self.size = GRID_SIZE
+    def __init__(self, rng=None, sim_config=None):
+        # Grid size comes from the run's SimulationConfig when one is given
+        self.sim_config = sim_config
+        self.size = sim_config.grid_size if sim_config is not None else GRID_SIZE
+        # All environment randomness (initial grid, replenishment) comes from rng,
+        # so a seeded random.Random reproduces the same scenario
+        self.rng = rng if rng is not None else random
         self.grid = self._generate_grid()
+        # Feature maps: food tables follow grid changes, occupancy is a per-step snapshot
+        self._food_version = 0
+        self._food_tables = None
+        self._food_tables_version = -1
+        self._distance_fields = None
+        self._occupancy_table = None
 
     def _generate_grid(self):
-        return [[random.choice(FOOD_TYPES) for _ in range(self.size)] for _ in range(self.size)]
+        return [[self.rng.choice(FOOD_TYPES) for _ in range(self.size)] for _ in range(self.size)]
 
     def get_cell_content(self, x, y):
         return self.grid[x][y]
 
     def clear_cell(self, x, y):
         self.grid[x][y] = None
+        self._food_version += 1
+
+    def update_feature_maps(self, agents):
+        """Rebuild the shared per-step feature maps; call once at the start of each step"""
+        self._occupancy_table = summed_area_table(
+            self.size, [a.position for a in agents if a.alive]
+        )
+        self._refresh_food_tables()
+
+    def _refresh_food_tables(self):
+        if self._food_tables_version == self._food_version:
+            return
+        cells = {'red': [], 'green': []}
+        for x, row in enumerate(self.grid):
+            for y, cell in enumerate(row):
+                if cell in cells:
+                    cells[cell].append((x, y))
+        self._food_tables = {
+            food: summed_area_table(self.size, positions) for food, positions in cells.items()
+        }
+        self._distance_fields = {
+            food: distance_field(self.size, positions) for food, positions in cells.items()
+        }
+        self._food_tables_version = self._food_version
+
+    def neighbourhood_counts(self, x, y, radius, agents=None):
+        """Red food, green food and agents within `radius` of (x, y), in O(1).
+
+        Agents are counted at their positions when update_feature_maps() was last
+        called (start of step), including the observer itself. `agents` is only
+        used to build the snapshot if no step has done so yet.
+        """
+        if self._occupancy_table is None:
+            self.update_feature_maps(agents or [])
+        self._refresh_food_tables()
+        return {
+            'red': window_sum(self._food_tables['red'], self.size, x, y, radius),
+            'green': window_sum(self._food_tables['green'], self.size, x, y, radius),
+            'agents': window_sum(self._occupancy_table, self.size, x, y, radius),
+        }
+
+    def nearest_food(self, x, y, food):
+        """(distance, first move) to the nearest `food` cell from (x, y), in O(1).
+
+        Returns (None, None) when there is no such food on the grid and
+        (0, None) when (x, y) itself holds it.
+        """
+        self._refresh_food_tables()
+        dist, direction = self._distance_fields[food]
+        return dist[x][y], direction[x][y]
 
     def count_food(self):
         """Count total food in the environment"""
@@ -48,15 +156,26 @@ class Environment:
         print()
 
     def fixed_replenish(self, red_count=5, green_count=5):
-        """Replenish exactly red_count red and green_count green foods randomly."""
-        empty_cells = [(x, y) for x in range(self.size) for y in range(self.size) if self.grid[x][y] is None]
-        random.shuffle(empty_cells)
+        """Replenish exactly red_count red and green_count green foods randomly.
+
+        Returns the (x, y, food) cells that were filled.
+        """
+        # Shuffle every cell, not just the empty ones, so the rng draws (and the
+        # placement order) don't depend on what the agents have eaten
+        all_cells = [(x, y) for x in range(self.size) for y in range(self.size)]
+        self.rng.shuffle(all_cells)
+        empty_cells = [(x, y) for x, y in reversed(all_cells) if self.grid[x][y] is None]
 
+        placed = []
         for _ in range(red_count):
             if empty_cells:
                 x, y = empty_cells.pop()
                 self.grid[x][y] = 'red'
+                placed.append((x, y, 'red'))
         for _ in range(green_count):
             if empty_cells:
                 x, y = empty_cells.pop()
-                self.grid[x][y] = 'green'
\ No newline at end of file
+                self.grid[x][y] = 'green'
+                placed.append((x, y, 'green'))
+        self._food_version += 1
+        return placed
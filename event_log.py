@@ -0,0 +1,184 @@
+import json
+import copy
+
+FOOD_SYMBOLS = {'red': 'R', 'green': 'G', None: '.'}
+SYMBOL_FOODS = {symbol: food for food, symbol in FOOD_SYMBOLS.items()}
+
+
+def agent_state(agent):
+    """Snapshot of the agent fields the event log tracks"""
+    return (agent.position, agent.inventory['red'], agent.inventory['green'],
+            agent.energy, agent.alive)
+
+
+class EventLogWriter:
+    """Append-only log of state-changing events with periodic keyframes.
+
+    One JSON object per line. Energy loss per turn is implicit: readers
+    subtract energy_loss from every living agent at the start of each step,
+    so a step where nothing happens writes nothing at all.
+    """
+
+    def __init__(self, path, env, agents, energy_loss, keyframe_interval):
+        self.file = open(path, "w", encoding="utf-8")
+        self.keyframe_interval = keyframe_interval
+        self.events_written = 0
+        self.last_step = 0
+        self._write({
+            'e': 'header',
+            'grid_size': env.size,
+            'agents': [a.name for a in agents],
+            'energy_loss': energy_loss,
+            'keyframe_interval': keyframe_interval
+        })
+        self.keyframe(0, env, agents)
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self.events_written += 1
+
+    def keyframe(self, step, env, agents):
+        """Full state after `step`"""
+        self._write({
+            'e': 'keyframe',
+            's': step,
+            'grid': ["".join(FOOD_SYMBOLS[cell] for cell in row) for row in env.grid],
+            'agents': [
+                [a.position[0], a.position[1], a.energy,
+                 a.inventory['red'], a.inventory['green'], int(a.alive)]
+                for a in agents
+            ]
+        })
+
+    def record_agent_step(self, step, index, before, agent, energy_loss):
+        """Compare an agent's state before/after its turn and log what changed"""
+        position, red, green, energy, alive = before
+        if not alive:
+            return
+        if not agent.alive:
+            self._write({'e': 'death', 's': step, 'a': index})
+            return
+        if agent.position != position:
+            self._write({'e': 'move', 's': step, 'a': index, 'to': list(agent.position)})
+        for food, count in (('red', red), ('green', green)):
+            change = agent.inventory[food] - count
+            if change > 0:
+                self._write({'e': 'collect', 's': step, 'a': index, 'food': food,
+                             'at': list(agent.position)})
+            elif change < 0:
+                gain = agent.energy - (energy - energy_loss)
+                self._write({'e': 'eat', 's': step, 'a': index, 'food': food, 'gain': gain})
+
+    def replenish(self, step, placed):
+        if placed:
+            self._write({'e': 'replenish', 's': step,
+                         'cells': [[x, y, food] for x, y, food in placed]})
+
+    def trade(self, step, offer, to_agent_index=None):
+        self._write({'e': 'trade', 's': step, 'offer': offer['id'], 'to': to_agent_index,
+                     'give': offer['give'], 'want': offer['want'], 'status': offer['status']})
+
+    def end_step(self, step, env, agents):
+        self.last_step = step
+        if self.keyframe_interval and step % self.keyframe_interval == 0:
+            self.keyframe(step, env, agents)
+
+    def close(self):
+        self._write({'e': 'end', 's': self.last_step})
+        self.file.close()
+
+
+class EventLogReader:
+    """Rebuilds full per-step state from an event log on demand"""
+
+    def __init__(self, path):
+        self.path = path
+        self.keyframes = {}  # step -> byte offset of the keyframe line
+        self.last_step = 0
+        with open(path, "rb") as f:
+            self.header = json.loads(f.readline())
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                record = json.loads(line)
+                step = record.get('s', 0)
+                self.last_step = max(self.last_step, step)
+                if record['e'] == 'keyframe':
+                    self.keyframes[step] = offset
+        self.agent_names = self.header['agents']
+        self.energy_loss = self.header['energy_loss']
+
+    def _state_from_keyframe(self, record):
+        return {
+            'step': record['s'],
+            'grid': [[SYMBOL_FOODS[symbol] for symbol in row] for row in record['grid']],
+            'agents': [
+                {'name': name, 'position': (x, y), 'energy': energy,
+                 'inventory': {'red': red, 'green': green}, 'alive': bool(alive)}
+                for name, (x, y, energy, red, green, alive) in zip(self.agent_names, record['agents'])
+            ]
+        }
+
+    def _tick(self, state, step):
+        state['step'] = step
+        for agent in state['agents']:
+            if agent['alive']:
+                agent['energy'] -= self.energy_loss
+
+    def _apply(self, state, record):
+        kind = record['e']
+        if kind in ('move', 'collect', 'eat', 'death'):
+            agent = state['agents'][record['a']]
+        if kind == 'move':
+            agent['position'] = tuple(record['to'])
+        elif kind == 'collect':
+            x, y = record['at']
+            state['grid'][x][y] = None
+            agent['inventory'][record['food']] += 1
+        elif kind == 'eat':
+            agent['inventory'][record['food']] -= 1
+            agent['energy'] += record['gain']
+        elif kind == 'death':
+            agent['alive'] = False
+        elif kind == 'replenish':
+            for x, y, food in record['cells']:
+                state['grid'][x][y] = food
+
+    def iter_states(self, start=0, end=None):
+        """Yield the state after every step from `start` to `end` (inclusive).
+
+        Starts from the nearest keyframe at or before `start`, so the cost is
+        bounded by the keyframe interval plus the events in the range.
+        """
+        end = self.last_step if end is None else end
+        base = max(s for s in self.keyframes if s <= start)
+        with open(self.path, "rb") as f:
+            f.seek(self.keyframes[base])
+            state = self._state_from_keyframe(json.loads(f.readline()))
+            step = base
+            for line in f:
+                record = json.loads(line)
+                if record['e'] in ('keyframe', 'end') or record['s'] <= base:
+                    continue
+                # Every event of `step` has been applied once a later step shows up
+                while step < record['s']:
+                    if step >= start:
+                        yield copy.deepcopy(state)
+                    if step >= end:
+                        return
+                    step += 1
+                    self._tick(state, step)
+                self._apply(state, record)
+            while True:
+                if step >= start:
+                    yield copy.deepcopy(state)
+                if step >= end:
+                    return
+                step += 1
+                self._tick(state, step)
+
+    def state_at(self, step):
+        """Full state (grid and agents) after `step`"""
+        return next(self.iter_states(step, step))
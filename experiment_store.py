@@ -0,0 +1,284 @@
+import json
+import sqlite3
+import hashlib
+from datetime import datetime
+from config import EXPERIMENT_DB_PATH, EXPERIMENT_STORE_BATCH_SIZE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    seed INTEGER,
+    consumption_rate REAL,
+    num_agents INTEGER,
+    total_steps INTEGER,
+    steps_run INTEGER,
+    survivors INTEGER,
+    survival_rate REAL,
+    config_json TEXT
+);
+
+CREATE TABLE IF NOT EXISTS agent_steps (
+    run_id INTEGER NOT NULL,
+    step INTEGER NOT NULL,
+    agent TEXT NOT NULL,
+    x INTEGER,
+    y INTEGER,
+    energy INTEGER,
+    red INTEGER,
+    green INTEGER,
+    alive INTEGER,
+    action TEXT,
+    PRIMARY KEY (run_id, agent, step)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS decisions (
+    decision_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL,
+    step INTEGER,
+    agent TEXT,
+    prompt_hash TEXT,
+    backend TEXT,
+    latency_ms REAL,
+    action TEXT,
+    response TEXT
+);
+
+CREATE TABLE IF NOT EXISTS trades (
+    trade_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL,
+    step INTEGER,
+    offer_id INTEGER,
+    from_agent TEXT,
+    to_agent TEXT,
+    give_json TEXT,
+    want_json TEXT,
+    status TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_runs_source_rate ON runs (source, consumption_rate);
+CREATE INDEX IF NOT EXISTS idx_agent_steps_run_step ON agent_steps (run_id, step);
+CREATE INDEX IF NOT EXISTS idx_decisions_run_step ON decisions (run_id, step);
+CREATE INDEX IF NOT EXISTS idx_decisions_backend ON decisions (backend);
+CREATE INDEX IF NOT EXISTS idx_trades_run_step ON trades (run_id, step);
+"""
+
+
+def prompt_hash(prompt: str) -> str:
+    """Short stable hash used to group identical prompts"""
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class ExperimentStore:
+    """SQLite (WAL mode) store for runs, per-step agent state, decisions and trades.
+
+    Row writes are buffered and flushed in a single transaction every
+    EXPERIMENT_STORE_BATCH_SIZE rows, when a run finishes, or on close().
+    """
+
+    def __init__(self, db_path=EXPERIMENT_DB_PATH, batch_size=EXPERIMENT_STORE_BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._agent_steps = []
+        self._decisions = []
+        self._trades = []
+
+    # ---------- writes ----------
+
+    def start_run(self, source, seed=None, consumption_rate=None, config=None,
+                  num_agents=None, total_steps=None):
+        """Insert a run row and return its run_id.
+
+        Pass the run's own consumption_rate, num_agents and total_steps (from its
+        SimulationConfig); `config` is only stored as the JSON snapshot.
+        """
+        config = config or {}
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (source, started_at, seed, consumption_rate, "
+                "num_agents, total_steps, config_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, datetime.now().isoformat(), seed, consumption_rate,
+                 num_agents, total_steps, json.dumps(config, default=str))
+            )
+        return cur.lastrowid
+
+    def record_agent_steps(self, run_id, step, agents, actions=None):
+        """Buffer one row per agent for this step"""
+        actions = actions or {}
+        for agent in agents:
+            x, y = agent.position
+            self._agent_steps.append((
+                run_id, step, agent.name, x, y, agent.energy,
+                agent.inventory.get('red', 0), agent.inventory.get('green', 0),
+                int(agent.alive), actions.get(agent.name)
+            ))
+        self._maybe_flush()
+
+    def record_decision(self, run_id, step, agent_name, prompt, backend, latency, action, response=None):
+        self._decisions.append((
+            run_id, step, agent_name, prompt_hash(prompt), backend,
+            None if latency is None else latency * 1000.0, action, response
+        ))
+        self._maybe_flush()
+
+    def decision_recorder(self, run_id, agents):
+        """Recorder storing these agents' decisions under run_id (see Agent.decision_recorder)"""
+        agent_by_name = {agent.name: agent for agent in agents}
+        return lambda name, prompt, backend, latency, response, action: self.record_decision(
+            run_id, agent_by_name[name].step_count, name, prompt, backend, latency, action, response
+        )
+
+    def trade_recorder(self, run_id):
+        """Recorder storing a TradeManager's offers under run_id (see TradeManager.trade_recorder)"""
+        return lambda offer, step, to_agent=None: self.record_trade(run_id, step, offer, to_agent)
+
+    def record_trade(self, run_id, step, offer, to_agent=None):
+        self._trades.append((
+            run_id, step, offer['id'], offer['from'], to_agent,
+            json.dumps(offer['give']), json.dumps(offer['want']), offer['status']
+        ))
+        self._maybe_flush()
+
+    def finish_run(self, run_id, steps_run, survivors, num_agents):
+        self.flush()
+        with self.conn:
+            self.conn.execute(
+                "UPDATE runs SET finished_at = ?, steps_run = ?, survivors = ?, "
+                "survival_rate = ? WHERE run_id = ?",
+                (datetime.now().isoformat(), steps_run, survivors,
+                 survivors / num_agents if num_agents else None, run_id)
+            )
+
+    def _maybe_flush(self):
+        pending = len(self._agent_steps) + len(self._decisions) + len(self._trades)
+        if pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows in one transaction"""
+        if not (self._agent_steps or self._decisions or self._trades):
+            return
+        with self.conn:
+            if self._agent_steps:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO agent_steps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._agent_steps
+                )
+            if self._decisions:
+                self.conn.executemany(
+                    "INSERT INTO decisions (run_id, step, agent, prompt_hash, backend, "
+                    "latency_ms, action, response) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._decisions
+                )
+            if self._trades:
+                self.conn.executemany(
+                    "INSERT INTO trades (run_id, step, offer_id, from_agent, to_agent, "
+                    "give_json, want_json, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._trades
+                )
+        self._agent_steps = []
+        self._decisions = []
+        self._trades = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    # ---------- queries ----------
+
+    def survival_by_rate(self, source='study'):
+        """Mean/std survival rate and run count per consumption rate, computed in SQL"""
+        rows = self.conn.execute(
+            "SELECT consumption_rate, COUNT(*), AVG(survival_rate), "
+            "AVG(survival_rate * survival_rate) FROM runs "
+            "WHERE source = ? AND finished_at IS NOT NULL "
+            "GROUP BY consumption_rate ORDER BY consumption_rate",
+            (source,)
+        ).fetchall()
+        results = []
+        for rate, count, mean, mean_sq in rows:
+            variance = max(0.0, mean_sq - mean * mean)
+            results.append({
+                'consumption_rate': rate,
+                'runs': count,
+                'avg_survival_rate': mean,
+                'std_survival_rate': variance ** 0.5
+            })
+        return results
+
+    def run_summaries(self, source=None, limit=None):
+        query = ("SELECT run_id, source, started_at, seed, consumption_rate, "
+                 "steps_run, survivors, survival_rate FROM runs WHERE finished_at IS NOT NULL")
+        params = []
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+        query += " ORDER BY run_id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        columns = ['run_id', 'source', 'started_at', 'seed', 'consumption_rate',
+                   'steps_run', 'survivors', 'survival_rate']
+        return [dict(zip(columns, row)) for row in self.conn.execute(query, params)]
+
+    def agent_energy_series(self, run_id, agent_name):
+        """(step, energy) pairs for one agent while it was alive"""
+        return self.conn.execute(
+            "SELECT step, energy FROM agent_steps WHERE run_id = ? AND agent = ? "
+            "AND alive = 1 ORDER BY step",
+            (run_id, agent_name)
+        ).fetchall()
+
+    def alive_counts(self, run_id):
+        """(step, alive agents) pairs for one run"""
+        return self.conn.execute(
+            "SELECT step, SUM(alive) FROM agent_steps WHERE run_id = ? "
+            "GROUP BY step ORDER BY step",
+            (run_id,)
+        ).fetchall()
+
+    def decision_stats(self, run_id=None):
+        """Decision count and latency per backend, optionally for a single run"""
+        query = ("SELECT backend, COUNT(*), AVG(latency_ms), MAX(latency_ms) "
+                 "FROM decisions")
+        params = []
+        if run_id is not None:
+            query += " WHERE run_id = ?"
+            params.append(run_id)
+        query += " GROUP BY backend ORDER BY COUNT(*) DESC"
+        return [
+            {'backend': b, 'decisions': n, 'avg_latency_ms': avg, 'max_latency_ms': mx}
+            for b, n, avg, mx in self.conn.execute(query, params)
+        ]
+
+    def action_counts(self, run_id=None):
+        query = "SELECT action, COUNT(*) FROM decisions"
+        params = []
+        if run_id is not None:
+            query += " WHERE run_id = ?"
+            params.append(run_id)
+        query += " GROUP BY action ORDER BY COUNT(*) DESC"
+        return self.conn.execute(query, params).fetchall()
+
+
+def config_snapshot(sim_config=None):
+    """Plain-data copy of the current config module for the runs table.
+
+    With a SimulationConfig, its settings (what the run actually used) are
+    stored under "SIMULATION".
+    """
+    import config
+    snapshot = {
+        name: getattr(config, name)
+        for name in dir(config)
+        if name.isupper()
+    }
+    if sim_config is not None:
+        snapshot['SIMULATION'] = sim_config.to_dict()
+    return snapshot
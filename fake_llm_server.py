@@ -0,0 +1,251 @@
+"""Local stand-in for Ollama and the OpenAI API, for load tests without a GPU or API bill.
+
+Speaks POST /api/generate (Ollama, JSON or NDJSON streaming, with a
+context array) and POST /v1/chat/completions (OpenAI, JSON or SSE
+streaming). Latency is log-normal around a median; a share of requests
+can fail with 500, be rate limited with 429 + Retry-After, or answer with
+text that isn't a valid action. Plan-mode prompts ("up to N actions") get a
+comma-separated plan. Requests with a JSON schema (Ollama "format", OpenAI
+"response_format") get JSON drawn from the schema's enums, like a
+constrained decoder would produce, pretty-printed for a share of them the
+way Ollama's grammar output often is. Replies are cut off at the request's
+num_predict / max_tokens (one token per word, punctuation mark or run of
+whitespace).
+
+    python fake_llm_server.py [--port 18080] [--latency-ms 300] [--rate-limit-rate 0.05] ...
+
+Point the simulation at it with LOCAL_LLM_URLS = ["http://127.0.0.1:18080"]
+and/or OPENAI_BASE_URL = "http://127.0.0.1:18080/v1".
+"""
+import sys
+import json
+import math
+import time
+import random
+import re
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ACTIONS = ["move up", "move down", "move left", "move right",
+           "collect", "eat red", "eat green", "do nothing"]
+GARBAGE = "I think the best option here would be to look around first"
+# Streamed after the action, the way chatty models keep explaining themselves
+TRAILER = " because it seems like the most sensible choice given my current energy"
+PLAN_REQUEST = re.compile(r"up to (\d+) (?:valid )?actions")
+TOKEN = re.compile(r"\s+|\w+|[^\w\s]")
+
+
+class FakeLLMServer:
+    """Threaded fake backend; start() serves in the background, stop() shuts down"""
+
+    def __init__(self, host="127.0.0.1", port=18080, latency_ms=300.0, latency_sigma=0.5,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0, garbage_rate=0.0,
+                 pretty_json_rate=0.5, seed=None):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.garbage_rate = garbage_rate
+        self.pretty_json_rate = pretty_json_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.httpd = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _draw(self, prompt="", schema=None, max_tokens=None):
+        """(outcome, latency seconds, reply) for one request"""
+        plan = PLAN_REQUEST.search(prompt)
+        with self.lock:
+            roll = self.rng.random()
+            latency = self.latency_ms / 1000 * math.exp(self.latency_sigma * self.rng.gauss(0, 1))
+            if roll < self.rate_limit_rate:
+                outcome = "rate_limited"
+            elif roll < self.rate_limit_rate + self.error_rate:
+                outcome = "error"
+            else:
+                outcome = "ok"
+            if isinstance(schema, dict) and "properties" in schema:
+                reply = self._constrained(schema["properties"])
+            elif self.rng.random() < self.garbage_rate:
+                reply = GARBAGE
+            elif plan:
+                length = self.rng.randint(1, int(plan.group(1)))
+                reply = ", ".join(self.rng.choice(ACTIONS) for _ in range(length))
+            else:
+                reply = self.rng.choice(ACTIONS)
+        if max_tokens:
+            reply = "".join(TOKEN.findall(reply)[:max_tokens])
+        return outcome, latency, reply
+
+    def _constrained(self, properties):
+        """JSON reply matching an action or plan schema (call with the lock held)"""
+        indent = 2 if self.rng.random() < self.pretty_json_rate else None
+        if "action" in properties:
+            return json.dumps({"action": self.rng.choice(properties["action"]["enum"])}, indent=indent)
+        then = properties["then"]
+        length = self.rng.randint(0, then.get("maxItems", 0))
+        return json.dumps({"first": self.rng.choice(properties["first"]["enum"]),
+                           "then": [self.rng.choice(then["items"]["enum"]) for _ in range(length)]},
+                          indent=indent)
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _json(self, code, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self, content_type, chunks, delay):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for chunk in chunks:
+                    time.sleep(delay)
+                    data = chunk.encode("utf-8")
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                server._count("stream_cancelled")
+                self.close_connection = True
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/api/generate":
+                return self._generate(request)
+            if self.path.rstrip("/").endswith("/chat/completions"):
+                return self._chat(request)
+            self._json(404, {"error": "not found"})
+
+        def _fail(self, outcome, latency, api):
+            server._count(f"{api}_{outcome}")
+            time.sleep(latency / 4)
+            if outcome == "rate_limited":
+                self._json(429, {"error": {"message": "rate limited", "type": "rate_limit_error"}},
+                           {"Retry-After": str(server.retry_after)})
+            else:
+                self._json(500, {"error": {"message": "internal error", "type": "server_error"}})
+
+        def _generate(self, request):
+            if not request.get("prompt"):
+                # Ollama loads the model and returns immediately for an empty prompt
+                server._count("ollama_load")
+                return self._json(200, {"model": request.get("model"), "response": "", "done": True})
+            outcome, latency, reply = server._draw(request["prompt"], request.get("format"),
+                                                   (request.get("options") or {}).get("num_predict"))
+            if outcome != "ok":
+                return self._fail(outcome, latency, "ollama")
+            server._count("ollama_ok")
+            context = list(request.get("context") or []) + [1] * (len(request["prompt"]) // 4)
+            if request.get("stream"):
+                words = (reply + TRAILER).split(" ")
+                chunks = [json.dumps({"response": (" " if i else "") + word, "done": False}) + "\n"
+                          for i, word in enumerate(words)]
+                chunks.append(json.dumps({"response": "", "done": True, "context": context}) + "\n")
+                return self._stream("application/x-ndjson", chunks, latency / len(chunks))
+            time.sleep(latency)
+            self._json(200, {"model": request.get("model"), "response": reply,
+                             "done": True, "context": context})
+
+        def _chat(self, request):
+            messages = request.get("messages", [])
+            schema = (request.get("response_format") or {}).get("json_schema", {}).get("schema")
+            outcome, latency, reply = server._draw(
+                (messages[-1].get("content") or "") if messages else "", schema,
+                request.get("max_tokens")
+            )
+            if outcome != "ok":
+                return self._fail(outcome, latency, "openai")
+            server._count("openai_ok")
+            base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request.get("model")}
+            if request.get("stream"):
+                words = (reply + TRAILER).split(" ")
+                chunks = [
+                    "data: " + json.dumps(dict(base, object="chat.completion.chunk", choices=[
+                        {"index": 0, "delta": {"content": (" " if i else "") + word},
+                         "finish_reason": None}])) + "\n\n"
+                    for i, word in enumerate(words)
+                ]
+                chunks.append("data: [DONE]\n\n")
+                return self._stream("text/event-stream", chunks, latency / len(chunks))
+            time.sleep(latency)
+            prompt_tokens = sum(len(m.get("content") or "") for m in request.get("messages", [])) // 4
+            self._json(200, dict(base, object="chat.completion", choices=[
+                {"index": 0, "message": {"role": "assistant", "content": reply},
+                 "finish_reason": "stop"}
+            ], usage={"prompt_tokens": prompt_tokens, "completion_tokens": 3,
+                      "total_tokens": prompt_tokens + 3}))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="median response latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429")
+    parser.add_argument("--garbage-rate", type=float, default=0.0, help="share of invalid replies")
+    parser.add_argument("--pretty-json-rate", type=float, default=0.5,
+                        help="share of constrained (JSON) replies sent pretty-printed")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def server_from_args(args, port=0):
+    return FakeLLMServer(port=port, latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+                         error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                         retry_after=args.retry_after, garbage_rate=args.garbage_rate,
+                         pretty_json_rate=args.pretty_json_rate, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama/OpenAI backend")
+    parser.add_argument("--port", type=int, default=18080)
+    add_server_arguments(parser)
+    args = parser.parse_args(sys.argv[1:])
+    server = server_from_args(args, port=args.port).start()
+    print(f"Fake LLM backend on {server.url} (Ollama /api/generate, OpenAI {server.url}/v1)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+        print(f"\nRequests served: {dict(server.counts)}")
@@ -1,101 +1,559 @@
 import os
+import re
 import json
 import time
-import requests
-from dotenv import load_dotenv
-from openai import OpenAI
+from functools import lru_cache
 from config import (
-    USE_LOCAL_LLM,
-    USE_MULTIMODAL,
     LOCAL_LLM_MODEL,
     MULTIMODAL_LLM_MODEL,
-    LOCAL_LLM_URL,
+    LOCAL_LLM_URLS,
     LOCAL_LLM_TIMEOUT,
+    LOCAL_LLM_KEEP_ALIVE,
     LLM_MODEL,
     LLM_TEMPERATURE,
     LLM_MAX_TOKENS,
-    LLM_RETRY_ATTEMPTS
+    LLM_RETRY_ATTEMPTS,
+    LLM_RATE_LIMIT_MAX_WAIT,
+    OPENAI_TIMEOUT,
+    OPENAI_BASE_URL,
+    OPENAI_RPM_LIMIT,
+    OPENAI_TPM_LIMIT
 )
+from llm_health import get_backend_health
+from llm_pool import get_local_pool, get_http_session
+from llm_scheduler import get_scheduler, estimate_tokens, PRIORITY_CRITICAL, PRIORITY_NORMAL
+from prompts import build_prompt, session_system_prompt, session_turn_prompt, count_tokens, ALL_ACTIONS
+from llm_session import AgentSession
+from simulation_config import SimulationConfig
 
-# Load OpenAI key
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
+# requests, openai and dotenv are imported on first use so that importing
+# this module (e.g. in worker processes) stays cheap for unused backends.
+
+
+@lru_cache(maxsize=None)
+def get_api_key() -> str | None:
+    """Load the OpenAI key from the environment / .env once"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    return os.getenv("OPENAI_API_KEY")
 
 LOG_FILE = "llm_logs.txt"
 
+VALID_ACTIONS = list(ALL_ACTIONS)
+
+
+def _record_decision(recorder, agent_name, prompt, backend, latency, response, action):
+    """Pass a decision to the run's recorder(agent_name, prompt, backend, latency, response, action)"""
+    if recorder is not None:
+        try:
+            recorder(agent_name, prompt, backend, latency, response, action)
+        except Exception as e:
+            print(f"Decision recorder failed: {e}")
+
+
+@lru_cache(maxsize=None)
+def _openai_client():
+    """One client (and HTTP connection pool) per process, shared by every thread"""
+    from openai import OpenAI
+    # Retries are driven by the scheduler, not by the SDK's own backoff
+    return OpenAI(api_key=get_api_key(), base_url=OPENAI_BASE_URL, max_retries=0)
+
+
+def _openai_scheduler():
+    return get_scheduler("openai", OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT)
+
+
+def _local_scheduler():
+    return get_scheduler("local")
+
 
-def log(prompt: str, response: str):
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
+def _retry_after(headers) -> float | None:
+    """Seconds from a Retry-After header, if the server sent one"""
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _report_latency(report: dict | None, start: float) -> None:
+    """Tell the caller how long the admitted request took (scheduler queueing excluded)"""
+    if report is not None:
+        report['latency'] = time.perf_counter() - start
+
+
+def _report_rate_limited(report: dict | None, rate_limited: bool) -> None:
+    """Tell the caller (via its report dict) whether the reply was lost to rate limiting"""
+    if report is not None:
+        report['rate_limited'] = rate_limited
+
+
+def log(prompt: str, response: str, log_file: str | None = LOG_FILE):
+    if log_file is None:
+        return
+    with open(log_file, "a", encoding="utf-8") as f:
         f.write("\n" + "=" * 40 + "\n")
         f.write("Prompt:\n" + prompt.strip() + "\n\n")
         f.write("Response:\n" + response.strip() + "\n")
 
 
-def call_local_llm(prompt: str) -> str | None:
+def _local_payload(model: str, prompt: str, stream: bool, image_base64: str | None = None,
+                   schema: dict | None = None) -> dict:
     payload = {
-        "model": LOCAL_LLM_MODEL,
+        "model": model,
         "prompt": prompt,
-        "stream": False,
+        "stream": stream,
+        "keep_alive": LOCAL_LLM_KEEP_ALIVE,
         "options": {
             "temperature": LLM_TEMPERATURE,
-            "num_predict": LLM_MAX_TOKENS,
+            "num_predict": reply_token_limit(schema) if schema else LLM_MAX_TOKENS,
             "stop": ["\n", ".", "Action:"]
         }
     }
-    try:
-        resp = requests.post(
-            f"{LOCAL_LLM_URL}/api/generate",
-            json=payload,
-            timeout=LOCAL_LLM_TIMEOUT
-        )
-        if resp.status_code == 200:
-            return resp.json().get("response", "").strip()
-    except Exception:
-        pass
+    if schema:
+        # Ollama's grammar-constrained JSON output; the stop words could cut the JSON short
+        payload["format"] = schema
+        del payload["options"]["stop"]
+    if image_base64:
+        payload["images"] = [image_base64]
+    return payload
+
+
+def _generate_local(payload: dict, timeout: float, priority: int,
+                    report: dict | None = None) -> dict | None:
+    """Non-streaming /api/generate on the least busy healthy local endpoint; returns the response body"""
+    with _local_scheduler().request(estimate_tokens(payload["prompt"], payload["options"]["num_predict"]),
+                                    priority) as ticket, \
+         get_local_pool().lease() as lease:
+        if lease['url'] is None:
+            return None
+        start = time.perf_counter()
+        try:
+            resp = get_http_session().post(
+                f"{lease['url']}/api/generate",
+                json=payload,
+                timeout=timeout
+            )
+            if resp.status_code == 200:
+                ticket['outcome'] = 'ok'
+                lease['ok'] = True
+                return resp.json()
+            if resp.status_code in (429, 503):
+                ticket['outcome'] = 'rate_limited'
+                ticket['retry_after'] = _retry_after(resp.headers)
+                _report_rate_limited(report, True)
+        except Exception:
+            pass
+        finally:
+            _report_latency(report, start)
     return None
 
 
-def call_multimodal_llm(prompt: str, image_base64: str) -> str | None:
-    payload = {
-        "model": MULTIMODAL_LLM_MODEL,
-        "prompt": prompt,
-        "images": [image_base64],
-        "stream": False,
-        "options": {
-            "temperature": LLM_TEMPERATURE,
-            "num_predict": LLM_MAX_TOKENS,
-            "stop": ["\n", ".", "Action:"]
-        }
-    }
-    try:
-        resp = requests.post(
-            f"{LOCAL_LLM_URL}/api/generate",
-            json=payload,
-            timeout=LOCAL_LLM_TIMEOUT
-        )
-        if resp.status_code == 200:
-            return resp.json().get("response", "").strip()
-    except Exception:
-        pass
+def call_local_llm(
+    prompt: str,
+    timeout: float = LOCAL_LLM_TIMEOUT,
+    priority: int = PRIORITY_NORMAL,
+    schema: dict | None = None,
+    report: dict | None = None
+) -> str | None:
+    payload = _local_payload(LOCAL_LLM_MODEL, prompt, False, schema=schema)
+    body = _generate_local(payload, timeout, priority, report)
+    return body.get("response", "").strip() if body else None
+
+
+def call_multimodal_llm(
+    prompt: str,
+    image_base64: str,
+    timeout: float = LOCAL_LLM_TIMEOUT,
+    priority: int = PRIORITY_NORMAL,
+    schema: dict | None = None,
+    report: dict | None = None
+) -> str | None:
+    payload = _local_payload(MULTIMODAL_LLM_MODEL, prompt, False, image_base64, schema)
+    body = _generate_local(payload, timeout, priority, report)
+    return body.get("response", "").strip() if body else None
+
+
+def call_local_session(
+    session: AgentSession,
+    model: str,
+    message: str,
+    image_base64: str | None = None,
+    timeout: float = LOCAL_LLM_TIMEOUT,
+    priority: int = PRIORITY_NORMAL,
+    schema: dict | None = None,
+    report: dict | None = None
+) -> str | None:
+    """Send only this step's state, continuing the agent's Ollama context"""
+    payload = _local_payload(model, "", False, image_base64, schema)
+    payload.update(session.generate_fields(model, message))
+    body = _generate_local(payload, timeout, priority, report)
+    if not body:
+        return None
+    reply = body.get("response", "").strip()
+    session.record(message, reply, model, body.get("context"))
+    return reply
+
+
+def warm_up_local_models(sim_config: SimulationConfig | None = None) -> None:
+    """Preload the local models a run uses on every endpoint so no agent pays a cold start"""
+    cfg = sim_config if sim_config is not None else SimulationConfig.from_config()
+    models = [LOCAL_LLM_MODEL] + ([MULTIMODAL_LLM_MODEL] if cfg.use_multimodal else [])
+    print(f"Warming up {', '.join(models)} on {len(LOCAL_LLM_URLS)} local endpoint(s)...")
+    for (url, model), ok in get_local_pool().warm_up(models).items():
+        print(f"  {url} {model}: {'ready' if ok else 'FAILED'}")
+
+
+def match_action_prefix(text: str) -> str | None:
+    """Valid action that `text` starts with, "" while it may still become one, None once it cannot"""
+    text = text.lower().lstrip()
+    for valid in VALID_ACTIONS:
+        if text.startswith(valid):
+            return valid
+    if any(valid.startswith(text) for valid in VALID_ACTIONS):
+        return ""
     return None
 
 
-def call_openai_llm(prompt: str) -> str | None:
-    client = OpenAI(api_key=api_key)
-    for attempt in range(LLM_RETRY_ATTEMPTS):
+def response_action(response: str) -> str | None:
+    """Action named by a reply: the "action" field of constrained JSON, else the action the text starts with"""
+    try:
+        value = json.loads(response)
+    except ValueError:
+        value = None
+    if isinstance(value, dict) and isinstance(value.get("action"), str):
+        response = value["action"]
+    return match_action_prefix(response) or None
+
+
+def action_schema(actions: list[str]) -> dict:
+    """JSON schema allowing exactly one of `actions`"""
+    return {
+        "type": "object",
+        "properties": {"action": {"type": "string", "enum": list(actions)}},
+        "required": ["action"],
+        "additionalProperties": False,
+    }
+
+
+def plan_schema(first_actions: list[str], length: int) -> dict:
+    """JSON schema for a plan: a first action from `first_actions`, then up to length-1 valid actions"""
+    return {
+        "type": "object",
+        "properties": {
+            "first": {"type": "string", "enum": list(first_actions)},
+            "then": {
+                "type": "array",
+                "items": {"type": "string", "enum": VALID_ACTIONS},
+                "maxItems": length - 1,
+            },
+        },
+        "required": ["first", "then"],
+        "additionalProperties": False,
+    }
+
+
+def reply_token_limit(schema: dict) -> int:
+    """max_tokens for a constrained reply: the longest reply the schema allows, pretty-printed.
+
+    Counts one token per line break on top of count_tokens and adds half again
+    plus 4 as headroom, since Ollama's tokenizer splits JSON and whitespace
+    differently and a reply cut off mid-JSON is lost.
+    """
+    props = schema["properties"]
+    if "action" in props:
+        longest = {"action": max(props["action"]["enum"], key=len)}
+    else:
+        then = props["then"]
+        longest = {"first": max(props["first"]["enum"], key=len),
+                   "then": [max(then["items"]["enum"], key=len)] * then["maxItems"]}
+    text = json.dumps(longest, indent=2)
+    tokens = count_tokens(text) + text.count("\n")
+    return tokens + tokens // 2 + 4
+
+
+def _read_until_action(pieces, start):
+    """Accumulate streamed text until it settles on an action (or cannot become one).
+
+    Returns (text, seconds from `start` until the action was decided).
+    """
+    text = ""
+    for piece in pieces:
+        text += piece or ""
+        if match_action_prefix(text) != "":
+            break
+    return text.strip(), time.perf_counter() - start
+
+
+def stream_local_llm(
+    prompt: str,
+    image_base64: str | None = None,
+    timeout: float = LOCAL_LLM_TIMEOUT,
+    priority: int = PRIORITY_NORMAL,
+    report: dict | None = None
+) -> tuple[str | None, float | None]:
+    """Streaming Ollama call that disconnects as soon as a valid action prefix is seen.
+
+    Closing the connection makes Ollama stop generating. Returns
+    (text, time-to-action in seconds), or (None, None) on failure.
+    """
+    model = MULTIMODAL_LLM_MODEL if image_base64 else LOCAL_LLM_MODEL
+    payload = _local_payload(model, prompt, True, image_base64)
+    with _local_scheduler().request(estimate_tokens(prompt, LLM_MAX_TOKENS), priority) as ticket, \
+         get_local_pool().lease() as lease:
+        if lease['url'] is None:
+            return None, None
+        start = time.perf_counter()
         try:
-            resp = client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=LLM_TEMPERATURE,
-                max_tokens=LLM_MAX_TOKENS
-            )
-            return resp.choices[0].message.content.strip()
+            with get_http_session().post(
+                f"{lease['url']}/api/generate",
+                json=payload,
+                timeout=timeout,
+                stream=True
+            ) as resp:
+                if resp.status_code in (429, 503):
+                    ticket['outcome'] = 'rate_limited'
+                    ticket['retry_after'] = _retry_after(resp.headers)
+                    _report_rate_limited(report, True)
+                if resp.status_code != 200:
+                    return None, None
+                pieces = (
+                    json.loads(line).get("response", "")
+                    for line in resp.iter_lines() if line
+                )
+                text, time_to_action = _read_until_action(pieces, start)
+                ticket['outcome'] = 'ok'
+                lease['ok'] = True
+                return text or None, time_to_action
         except Exception:
-            time.sleep(0.5)
+            pass
+        finally:
+            _report_latency(report, start)
+    return None, None
+
+
+def stream_openai_llm(
+    prompt: str,
+    timeout: float = OPENAI_TIMEOUT,
+    priority: int = PRIORITY_NORMAL,
+    report: dict | None = None
+) -> tuple[str | None, float | None]:
+    """Streaming chat completion, cancelled once a valid action prefix is seen.
+
+    Retries like call_openai_llm.
+    """
+    from openai import RateLimitError
+    client = _openai_client()
+    deadline = time.monotonic() + LLM_RATE_LIMIT_MAX_WAIT
+    attempts = 0
+    while attempts < LLM_RETRY_ATTEMPTS:
+        with _openai_scheduler().request(estimate_tokens(prompt, LLM_MAX_TOKENS), priority) as ticket:
+            start = time.perf_counter()
+            try:
+                stream = client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=LLM_TEMPERATURE,
+                    max_tokens=LLM_MAX_TOKENS,
+                    stream=True,
+                    timeout=timeout
+                )
+                try:
+                    pieces = (
+                        chunk.choices[0].delta.content
+                        for chunk in stream if chunk.choices
+                    )
+                    text, time_to_action = _read_until_action(pieces, start)
+                finally:
+                    stream.response.close()
+                ticket['outcome'] = 'ok'
+                return text or None, time_to_action
+            except RateLimitError as e:
+                ticket['outcome'] = 'rate_limited'
+                ticket['retry_after'] = _retry_after(e.response.headers)
+                if time.monotonic() < deadline:
+                    # The scheduler pauses admissions; waiting that out isn't a retry
+                    continue
+                _report_rate_limited(report, True)
+                return None, None
+            except Exception:
+                pass
+            finally:
+                _report_latency(report, start)
+        attempts += 1
+        time.sleep(0.5)
+    return None, None
+
+
+def call_openai_llm(
+    prompt: str,
+    timeout: float = OPENAI_TIMEOUT,
+    priority: int = PRIORITY_NORMAL,
+    messages: list[dict] | None = None,
+    schema: dict | None = None,
+    report: dict | None = None
+) -> str | None:
+    """Chat completion for `prompt`, or for a full `messages` list when given.
+
+    With a JSON `schema` the reply is constrained to it (structured outputs)
+    and max_tokens is reply_token_limit(schema).
+    Errors are retried LLM_RETRY_ATTEMPTS times. Rate-limited attempts wait for
+    the scheduler's pause instead and don't use up a retry, for at most
+    LLM_RATE_LIMIT_MAX_WAIT seconds; a reply still lost to rate limiting then
+    sets report['rate_limited']. report['latency'] is the last attempt's time
+    after admission.
+    """
+    from openai import RateLimitError
+    client = _openai_client()
+    if messages is None:
+        messages = [{"role": "user", "content": prompt}]
+    max_tokens = reply_token_limit(schema) if schema else LLM_MAX_TOKENS
+    tokens = estimate_tokens("".join(m["content"] for m in messages), max_tokens)
+    extra = {}
+    if schema:
+        extra["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": "agent_reply", "strict": True, "schema": schema}
+        }
+    deadline = time.monotonic() + LLM_RATE_LIMIT_MAX_WAIT
+    attempts = 0
+    while attempts < LLM_RETRY_ATTEMPTS:
+        with _openai_scheduler().request(tokens, priority) as ticket:
+            start = time.perf_counter()
+            try:
+                resp = client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=messages,
+                    temperature=LLM_TEMPERATURE,
+                    max_tokens=max_tokens,
+                    timeout=timeout,
+                    **extra
+                )
+                ticket['outcome'] = 'ok'
+                return resp.choices[0].message.content.strip()
+            except RateLimitError as e:
+                ticket['outcome'] = 'rate_limited'
+                ticket['retry_after'] = _retry_after(e.response.headers)
+                if time.monotonic() < deadline:
+                    # The scheduler pauses admissions; waiting that out isn't a retry
+                    continue
+                _report_rate_limited(report, True)
+                return None
+            except Exception:
+                pass
+            finally:
+                _report_latency(report, start)
+        attempts += 1
+        time.sleep(0.5)
     return None
 
 
+def call_openai_session(
+    session: AgentSession,
+    message: str,
+    timeout: float = OPENAI_TIMEOUT,
+    priority: int = PRIORITY_NORMAL,
+    schema: dict | None = None,
+    report: dict | None = None
+) -> str | None:
+    """Chat with the agent's system message and windowed history plus this step's state"""
+    reply = call_openai_llm(message, timeout, priority, messages=session.chat_messages(message),
+                            schema=schema, report=report)
+    if reply is not None:
+        session.record(message, reply)
+    return reply
+
+
+def new_session(agent_name: str, consumption_rate: dict,
+                sim_config: SimulationConfig | None = None) -> AgentSession:
+    """Conversation state for one agent in session mode"""
+    cfg = sim_config if sim_config is not None else SimulationConfig.from_config()
+    system_prompt = session_system_prompt(
+        agent_name, consumption_rate, cfg.use_multimodal,
+        grid_size=cfg.grid_size, energy_loss=cfg.energy_loss_per_turn
+    )
+    return AgentSession(system_prompt, window=cfg.memory_size)
+
+
+def _log_tag(backend: str, time_to_action: float | None) -> str:
+    if time_to_action is None:
+        return f"[{backend}] "
+    return f"[{backend} STREAM {time_to_action:.2f}s] "
+
+
+def _query_backends(prompt, cfg, priority, grid_image_base64=None, session=None, stream=False,
+                    schema=None, log_file=LOG_FILE):
+    """Ask the backends in fallback order; returns (reply text or None, backend, latency).
+
+    With a JSON `schema` replies are constrained to it and max_tokens is
+    reply_token_limit(schema). The decoder ends the reply when the JSON closes,
+    so there is nothing to cut short early and streaming is skipped.
+    """
+    multimodal = bool(cfg.use_multimodal and grid_image_base64)
+    limits = {'schema': schema} if schema else {}
+    if schema:
+        stream = False
+
+    # Each backend call takes (timeout, priority, report) and returns (text, time-to-action)
+    if session is not None:
+        # Streaming would cut off Ollama's final chunk, which carries the context
+        call_multimodal = lambda t, p, r: (call_local_session(
+            session, MULTIMODAL_LLM_MODEL, prompt, grid_image_base64, t, p, report=r, **limits), None)
+        call_text = lambda t, p, r: (call_local_session(
+            session, LOCAL_LLM_MODEL, prompt, None, t, p, report=r, **limits), None)
+        call_openai = lambda t, p, r: (call_openai_session(session, prompt, t, p, report=r, **limits), None)
+    elif stream:
+        call_multimodal = lambda t, p, r: stream_local_llm(prompt, grid_image_base64, timeout=t, priority=p,
+                                                           report=r)
+        call_text = lambda t, p, r: stream_local_llm(prompt, timeout=t, priority=p, report=r)
+        call_openai = lambda t, p, r: stream_openai_llm(prompt, timeout=t, priority=p, report=r)
+    else:
+        call_multimodal = lambda t, p, r: (call_multimodal_llm(prompt, grid_image_base64, t, p,
+                                                               report=r, **limits), None)
+        call_text = lambda t, p, r: (call_local_llm(prompt, t, p, report=r, **limits), None)
+        call_openai = lambda t, p, r: (call_openai_llm(prompt, t, p, report=r, **limits), None)
+
+    # 1) Multimodal local, 2) text-only local, 3) fallback to OpenAI
+    backends = [
+        ("local_multimodal", "LOCAL MULTI", LOCAL_LLM_TIMEOUT,
+         lambda: cfg.use_local_llm and multimodal, call_multimodal),
+        ("local_text", "LOCAL TEXT", LOCAL_LLM_TIMEOUT, lambda: cfg.use_local_llm, call_text),
+        ("openai", "OPENAI", OPENAI_TIMEOUT, lambda: bool(get_api_key()), call_openai),
+    ]
+
+    reply: str | None = None
+    backend = None
+    start = time.perf_counter()
+    for name, tag, max_timeout, enabled, call in backends:
+        if reply or not enabled():
+            continue
+        # Backends whose circuit breaker is open are skipped straight away
+        health = get_backend_health(name, max_timeout)
+        if not health.allow_request():
+            continue
+        # The call reports how long its admitted request took; queueing for a
+        # scheduler slot says nothing about the backend's speed
+        report = {}
+        reply, time_to_action = call(health.timeout(), priority, report)
+        if reply is None and report.get('rate_limited'):
+            # Rate limiting isn't a fault of the backend, so the breaker ignores it
+            health.record_rate_limited()
+        else:
+            health.record(reply is not None, report.get('latency'))
+        if reply:
+            backend = name
+            log(prompt, _log_tag(tag, time_to_action) + reply, log_file)
+
+    return reply or None, backend, time.perf_counter() - start
+
+
+def _priority(energy, cfg):
+    # Agents about to starve are served first when requests queue up
+    return PRIORITY_CRITICAL if energy <= cfg.critical_energy_threshold else PRIORITY_NORMAL
+
+
 def get_agent_action(
     agent_name: str,
     position: tuple[int, int],
@@ -105,100 +563,136 @@ def get_agent_action(
     consumption_rate: dict,
     memory: list[str] | None = None,
     grid_image_base64: str | None = None,
-    retry_message: str | None = None
+    retry_message: str | None = None,
+    food_hint: str | None = None,
+    memory_records: list[dict] | None = None,
+    session: AgentSession | None = None,
+    step: int | None = None,
+    sim_config: SimulationConfig | None = None,
+    legal_actions: list[str] | None = None,
+    recorder=None,
+    log_file: str | None = LOG_FILE
 ) -> str:
-    # Build recent-memory section
-    history_section = ""
-    if memory:
-        entries = memory[-3:]
-        history_section = "📜 Recent memory:\n" + "\n".join(f"- {e}" for e in entries) + "\n\n"
-
-    # Core prompt (exact text as requested)
-    base_prompt = f"""🧠 Agent Status Report: {agent_name}
-📍 Position: {position} on a 9x9 grid
-⚡ Energy Level: {energy} (you lose 1 energy every step)
-🎒 Inventory: {inventory}
-🍽️ Consumption Rate: {consumption_rate}. — Give priority to eat the food that gives you the most energy according to consumption rate.
-📦 Current Cell Contents: {cell_content if cell_content else 'nothing'}
-{f"✅ You can collect the {cell_content} food here." if cell_content in ['red', 'green'] else ""}
-
-{history_section}
-
-🧭 Strategy Tips:
-- Collect food if it's available.
-- Eat if you have food available or your energy is low.
-- Move in all directions (up, down, left, right) to find food — the grid is 9x9.
-- Avoid wasting turns — survive as long as possible!
-
-🧭 Movement Tips:
-- Based on your recent actions above, try to make a smart decision.
-- Avoid repeating moves that led to empty cells or no gain.
-- Change your direction if move is blocked.
-- Explore unvisited or promising directions based on your recent outcomes.
-- Learn from past actions: if moving in one direction wasn't useful, try a different one.
-
-🚨 PRIORITY: 🔺 Don't forget to eat food to maintain energy levels.
-
-🎮 Valid Actions (choose one only):
-- Move → 'move up', 'move down', 'move left', 'move right'
-- Collect food → 'collect'
-- Eat → 'eat red', 'eat green'
-- Take a break → 'do nothing' (not recommended if you can act)
-
-🎯 Decision Rule:
-Reply with only **one valid action** exactly as described above. No explanation or reasoning."""
-
-    prompt = base_prompt
-
-    # Include retry note if needed
-    if retry_message:
-        prompt += f"\n⚠️ Note: Previous failed because: {retry_message}. Try something different.\n"
-
-    # Prepend visual instructions for multimodal
-    if USE_MULTIMODAL and grid_image_base64:
-        visual_part = """Look at the image showing the grid around you. In the image:
-- 🍎 Red circles = red food
-- 🥦 Green circles = green food  
-- ⚪ Gray circles = other agents
-- 🟡 Yellow circle with black border = you
-- ⬜ White squares = empty cells
-
-Use this visual information along with the text description to make your decision.
-"""
-        prompt = visual_part + "\n" + base_prompt
-
-    action: str | None = None
-
-    # 1) Multimodal local
-    if USE_LOCAL_LLM and USE_MULTIMODAL and grid_image_base64:
-        action = call_multimodal_llm(prompt, grid_image_base64)
-        if action:
-            log(prompt, "[LOCAL MULTI] " + action)
-
-    # 2) Text-only local
-    if not action and USE_LOCAL_LLM:
-        action = call_local_llm(prompt)
-        if action:
-            log(prompt, "[LOCAL TEXT] " + action)
-
-    # 3) Fallback to OpenAI
-    if not action and api_key:
-        action = call_openai_llm(prompt)
-        if action:
-            log(prompt, "[OPENAI] " + action)
+    """One action for the agent, always one of `legal_actions` (default: any valid action).
+
+    The prompt offers only the legal actions and, with the run's constrained_decoding,
+    backends can only answer with one of them. Always asks a backend (the agent
+    skips the call when there is nothing to decide). The decision goes to the
+    run's `recorder`, if any, and prompt and reply to `log_file` (None: no log).
+    """
+    # Backend endpoints and limits are process-wide; what this run uses comes from sim_config
+    cfg = sim_config if sim_config is not None else SimulationConfig.from_config()
+    allowed = [action for action in VALID_ACTIONS if legal_actions is None or action in legal_actions]
+    multimodal = bool(cfg.use_multimodal and grid_image_base64)
+    if session is not None:
+        # Session mode: the rules live in the session, send only the new state
+        last_outcome = memory_records[-1]['outcome'] if memory_records else None
+        prompt = session_turn_prompt(
+            step, position, inventory, cell_content, energy, last_outcome,
+            retry_message=retry_message, food_hint=food_hint, legal_actions=allowed
+        )
+    else:
+        prompt = build_prompt(
+            cfg.prompt_mode, agent_name, position, inventory, cell_content, energy,
+            consumption_rate, memory=memory, memory_records=memory_records,
+            retry_message=retry_message, food_hint=food_hint, multimodal=multimodal,
+            grid_size=cfg.grid_size, energy_loss=cfg.energy_loss_per_turn,
+            legal_actions=allowed
+        )
+
+    schema = action_schema(allowed) if cfg.constrained_decoding else None
+    response, backend, latency = _query_backends(
+        prompt, cfg, _priority(energy, cfg), grid_image_base64, session, cfg.llm_streaming, schema,
+        log_file
+    )
 
     # 4) Final fallback
-    if not action:
-        log(prompt, "[NO RESP] defaulting to do nothing")
+    if not response:
+        log(prompt, "[NO RESP] defaulting to do nothing", log_file)
+        _record_decision(recorder, agent_name, prompt, None, latency, None, "do nothing")
         return "do nothing"
 
-    action = action.lower().strip()
-    # Validate against allowed actions
-    for valid in [
-        "move up", "move down", "move left", "move right",
-        "collect", "eat red", "eat green", "do nothing"
-    ]:
-        if action.startswith(valid):
-            return valid
+    # Validate against the legal actions (a no-op for constrained replies)
+    action = response_action(response)
+    if action in allowed:
+        _record_decision(recorder, agent_name, prompt, backend, latency, response, action)
+        return action
 
+    _record_decision(recorder, agent_name, prompt, backend, latency, response, "do nothing")
     return "do nothing"
+
+
+def parse_action_plan(text: str, max_length: int) -> list[str]:
+    """Valid actions listed in `text` (comma/semicolon/newline/"then" separated), up to max_length.
+
+    Parsing stops at the first entry that isn't a valid action, so a plan is
+    never resumed past something the model didn't mean as an action. A
+    constrained {"first": ..., "then": [...]} reply is read the same way.
+    """
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = None
+    if isinstance(value, dict) and isinstance(value.get("then"), list):
+        text = ", ".join(str(item) for item in [value.get("first")] + value["then"])
+    plan = []
+    for part in re.split(r"[,;\n]|\bthen\b", text.lower()):
+        part = part.strip(" .'\"*-0123456789)")
+        if not part:
+            continue
+        action = match_action_prefix(part)
+        if not action:
+            break
+        plan.append(action)
+        if len(plan) == max_length:
+            break
+    return plan
+
+
+def get_agent_plan(
+    agent_name: str,
+    position: tuple[int, int],
+    inventory: dict,
+    cell_content: str | None,
+    energy: int,
+    consumption_rate: dict,
+    memory: list[str] | None = None,
+    grid_image_base64: str | None = None,
+    retry_message: str | None = None,
+    food_hint: str | None = None,
+    memory_records: list[dict] | None = None,
+    sim_config: SimulationConfig | None = None,
+    legal_actions: list[str] | None = None,
+    recorder=None,
+    log_file: str | None = LOG_FILE
+) -> list[str]:
+    """Plan mode: a short sequence of actions for the agent to carry out over the next steps.
+
+    The first action is one of `legal_actions`; later ones are checked by the
+    agent when their turn comes. Uses plain (non-streaming, non-session) calls
+    since the whole reply is needed. Returns ["do nothing"] when no backend
+    answers with a usable plan.
+    """
+    cfg = sim_config if sim_config is not None else SimulationConfig.from_config()
+    allowed = [action for action in VALID_ACTIONS if legal_actions is None or action in legal_actions]
+    multimodal = bool(cfg.use_multimodal and grid_image_base64)
+    prompt = build_prompt(
+        cfg.prompt_mode, agent_name, position, inventory, cell_content, energy,
+        consumption_rate, memory=memory, memory_records=memory_records,
+        retry_message=retry_message, food_hint=food_hint, multimodal=multimodal,
+        grid_size=cfg.grid_size, energy_loss=cfg.energy_loss_per_turn,
+        plan_length=cfg.plan_length, legal_actions=allowed
+    )
+
+    schema = plan_schema(allowed, cfg.plan_length) if cfg.constrained_decoding else None
+    response, backend, latency = _query_backends(
+        prompt, cfg, _priority(energy, cfg), grid_image_base64, schema=schema, log_file=log_file
+    )
+    plan = parse_action_plan(response, cfg.plan_length) if response else []
+    if plan and plan[0] not in allowed:
+        plan = []
+    if not response:
+        log(prompt, "[NO RESP] defaulting to do nothing", log_file)
+    _record_decision(recorder, agent_name, prompt, backend if response else None, latency, response,
+                     ", ".join(plan) if plan else "do nothing")
+    return plan or ["do nothing"]
@@ -0,0 +1,137 @@
+import time
+import threading
+from collections import deque
+from config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    ADAPTIVE_TIMEOUT_MIN,
+    ADAPTIVE_TIMEOUT_MULTIPLIER,
+    ADAPTIVE_TIMEOUT_WINDOW,
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class BackendHealth:
+    """Circuit breaker and adaptive timeout for one LLM backend.
+
+    closed:    requests flow; CIRCUIT_FAILURE_THRESHOLD consecutive failures open it.
+    open:      requests are skipped until CIRCUIT_RESET_SECONDS have passed.
+    half_open: a single probe request is let through; success closes the
+               circuit, failure re-opens it.
+    The timeout tracks the p95 of recent latencies times
+    ADAPTIVE_TIMEOUT_MULTIPLIER, clamped to [ADAPTIVE_TIMEOUT_MIN, max_timeout].
+    Requests that hit the timeout count as a latency sample of that length so
+    the timeout can grow again when the backend slows down; half-open probes
+    always get max_timeout.
+    """
+
+    def __init__(self, name, max_timeout):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.latencies = deque(maxlen=ADAPTIVE_TIMEOUT_WINDOW)
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        """True if a request may be sent now (may turn an open circuit half-open)"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= CIRCUIT_RESET_SECONDS:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.skipped += 1
+            return False
+
+    def record_success(self, latency):
+        with self.lock:
+            self.successes += 1
+            if latency is not None:
+                self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self.probe_in_flight = False
+
+    def record_failure(self, latency=None):
+        with self.lock:
+            if latency is not None and latency >= 0.9 * self._current_timeout():
+                self.latencies.append(latency)
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+                if self.state != OPEN:
+                    print(f"⚠️ {self.name} backend unhealthy, skipping it for {CIRCUIT_RESET_SECONDS}s")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def record_rate_limited(self):
+        """The request was lost to rate limiting: not a failure, but frees the half-open probe"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record(self, ok, latency):
+        if ok:
+            self.record_success(latency)
+        else:
+            self.record_failure(latency)
+
+    def _current_timeout(self):
+        if self.state != CLOSED or len(self.latencies) < ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+            return self.max_timeout
+        adaptive = percentile(self.latencies, 95) * ADAPTIVE_TIMEOUT_MULTIPLIER
+        return min(self.max_timeout, max(ADAPTIVE_TIMEOUT_MIN, adaptive))
+
+    def timeout(self):
+        """Request timeout adapted to the observed latency distribution"""
+        with self.lock:
+            return self._current_timeout()
+
+    def status(self):
+        with self.lock:
+            return {
+                'backend': self.name,
+                'state': self.state,
+                'successes': self.successes,
+                'failures': self.failures,
+                'skipped': self.skipped,
+                'p95_latency': percentile(self.latencies, 95) if self.latencies else None,
+            }
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend_health(name, max_timeout):
+    """Process-wide health tracker for backend `name`"""
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BackendHealth(name, max_timeout)
+        return _backends[name]
+
+
+def health_report():
+    with _backends_lock:
+        backends = list(_backends.values())
+    return [backend.status() for backend in backends]
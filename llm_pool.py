@@ -0,0 +1,105 @@
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from config import LOCAL_LLM_URLS, LOCAL_LLM_TIMEOUT, LOCAL_LLM_KEEP_ALIVE, LLM_MAX_CONCURRENCY
+from llm_health import get_backend_health
+
+
+class LocalEndpointPool:
+    """Spreads local (Ollama) requests over several endpoints.
+
+    Each request goes to the healthy endpoint with the fewest outstanding
+    requests. Every endpoint has its own circuit breaker
+    (llm_health "local@<url>"), so a dead instance is skipped while the
+    others keep serving.
+    """
+
+    def __init__(self, urls):
+        self.urls = [url.rstrip("/") for url in urls]
+        self.outstanding = {url: 0 for url in self.urls}
+        self.lock = threading.Lock()
+
+    def health(self, url):
+        return get_backend_health(f"local@{url}", LOCAL_LLM_TIMEOUT)
+
+    def _choose(self):
+        with self.lock:
+            candidates = sorted(self.urls, key=lambda url: self.outstanding[url])
+        for url in candidates:
+            if self.health(url).allow_request():
+                with self.lock:
+                    self.outstanding[url] += 1
+                return url
+        return None
+
+    @contextmanager
+    def lease(self):
+        """Pick an endpoint for one request. Yields a ticket with 'url' (None if
+        every endpoint is unavailable); set ticket['ok'] = True on success."""
+        url = self._choose()
+        ticket = {'url': url, 'ok': False}
+        start = time.perf_counter()
+        try:
+            yield ticket
+        finally:
+            if url is not None:
+                with self.lock:
+                    self.outstanding[url] -= 1
+                self.health(url).record(ticket['ok'], time.perf_counter() - start)
+
+    def warm_up(self, models):
+        """Load `models` on every endpoint and pin them with keep_alive.
+
+        An Ollama /api/generate request without a prompt only loads the model.
+        Returns {(url, model): True/False}.
+        """
+        def load(url, model):
+            try:
+                resp = get_http_session().post(
+                    f"{url}/api/generate",
+                    json={"model": model, "keep_alive": LOCAL_LLM_KEEP_ALIVE},
+                    timeout=LOCAL_LLM_TIMEOUT
+                )
+                return resp.status_code == 200
+            except Exception:
+                return False
+
+        jobs = [(url, model) for url in self.urls for model in models]
+        with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+            results = list(executor.map(lambda job: load(*job), jobs))
+        return dict(zip(jobs, results))
+
+    def status(self):
+        with self.lock:
+            outstanding = dict(self.outstanding)
+        return [
+            dict(self.health(url).status(), url=url, outstanding=outstanding[url])
+            for url in self.urls
+        ]
+
+
+@lru_cache(maxsize=None)
+def get_http_session():
+    """Shared requests session so local calls reuse keep-alive connections"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=len(LOCAL_LLM_URLS), pool_maxsize=LLM_MAX_CONCURRENCY)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_local_pool():
+    """Process-wide pool over config.LOCAL_LLM_URLS"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LocalEndpointPool(LOCAL_LLM_URLS)
+        return _pool
@@ -0,0 +1,170 @@
+import time
+import heapq
+import random
+import threading
+import itertools
+from contextlib import contextmanager
+from config import (
+    LLM_INITIAL_CONCURRENCY,
+    LLM_MIN_CONCURRENCY,
+    LLM_MAX_CONCURRENCY,
+    LLM_LATENCY_TARGET,
+    LLM_RATE_LIMIT_BACKOFF
+)
+
+# Priorities: lower value is served first
+PRIORITY_CRITICAL = 0
+PRIORITY_NORMAL = 1
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Rough token cost of a request (≈4 characters per token plus the completion)"""
+    return len(prompt) // 4 + max_tokens
+
+
+class TokenBucket:
+    """Continuously refilled bucket holding at most `per_minute` units"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (0 if they are now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class RequestScheduler:
+    """Admission control in front of one LLM backend.
+
+    Requests wait until they are first in priority order, a concurrency slot
+    is free and the request/token buckets allow them. The concurrency limit
+    follows AIMD: it grows by ~1 per limit's worth of fast successes and is
+    halved on a rate-limit response or when latency exceeds
+    LLM_LATENCY_TARGET. A rate limit also pauses all admissions for the
+    server's Retry-After (or an exponential backoff).
+    """
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.limit = float(LLM_INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.consecutive_rate_limits = 0
+        self.waiters = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.stats = {'admitted': 0, 'rate_limited': 0, 'errors': 0, 'max_wait': 0.0}
+
+    def _admission_delay(self, tokens, now):
+        """Seconds until a request costing `tokens` could start (0 = now)"""
+        if self.in_flight >= int(self.limit):
+            return None  # woken by release()
+        delay = max(0.0, self.paused_until - now)
+        if self.request_bucket:
+            delay = max(delay, self.request_bucket.wait_time(1, now))
+        if self.token_bucket:
+            delay = max(delay, self.token_bucket.wait_time(tokens, now))
+        return delay
+
+    def acquire(self, tokens, priority=PRIORITY_NORMAL):
+        entry = (priority, next(self.counter))
+        start = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = None
+                    if self.waiters[0] == entry:
+                        delay = self._admission_delay(tokens, now)
+                        if delay == 0.0:
+                            break
+                    self.cond.wait(timeout=delay)
+                heapq.heappop(self.waiters)
+                self.in_flight += 1
+                if self.request_bucket:
+                    self.request_bucket.take(1)
+                if self.token_bucket:
+                    self.token_bucket.take(tokens)
+                self.stats['admitted'] += 1
+                self.stats['max_wait'] = max(self.stats['max_wait'], time.monotonic() - start)
+            except BaseException:
+                if entry in self.waiters:
+                    self.waiters.remove(entry)
+                    heapq.heapify(self.waiters)
+                raise
+            finally:
+                self.cond.notify_all()
+
+    def release(self, outcome, latency=None, retry_after=None):
+        """Report how the admitted request went: 'ok', 'rate_limited' or 'error'"""
+        with self.cond:
+            self.in_flight -= 1
+            if outcome == 'rate_limited':
+                self.stats['rate_limited'] += 1
+                self.consecutive_rate_limits += 1
+                self.limit = max(LLM_MIN_CONCURRENCY, self.limit / 2)
+                backoff = retry_after
+                if backoff is None:
+                    backoff = LLM_RATE_LIMIT_BACKOFF * 2 ** (self.consecutive_rate_limits - 1)
+                    backoff *= random.uniform(0.5, 1.0)
+                self.paused_until = max(self.paused_until, time.monotonic() + backoff)
+            elif outcome == 'ok':
+                self.consecutive_rate_limits = 0
+                if latency is not None and latency > LLM_LATENCY_TARGET:
+                    self.limit = max(LLM_MIN_CONCURRENCY, self.limit / 2)
+                else:
+                    self.limit = min(LLM_MAX_CONCURRENCY, self.limit + 1 / self.limit)
+            else:
+                self.stats['errors'] += 1
+            self.cond.notify_all()
+
+    @contextmanager
+    def request(self, tokens, priority=PRIORITY_NORMAL):
+        """Hold a slot for one request. Set ticket['outcome'] / ticket['retry_after'] inside."""
+        self.acquire(tokens, priority)
+        ticket = {'outcome': 'error', 'retry_after': None}
+        start = time.monotonic()
+        try:
+            yield ticket
+        finally:
+            self.release(ticket['outcome'], time.monotonic() - start, ticket['retry_after'])
+
+    def status(self):
+        with self.cond:
+            return dict(self.stats, backend=self.name, limit=self.limit,
+                        in_flight=self.in_flight, waiting=len(self.waiters))
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(name, requests_per_minute=None, tokens_per_minute=None):
+    """Process-wide scheduler for backend `name` (limits apply on first creation)"""
+    with _schedulers_lock:
+        if name not in _schedulers:
+            _schedulers[name] = RequestScheduler(name, requests_per_minute, tokens_per_minute)
+        return _schedulers[name]
+
+
+def scheduler_report():
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return [scheduler.status() for scheduler in schedulers]
@@ -0,0 +1,53 @@
+from collections import deque
+from config import AGENT_MEMORY_SIZE
+
+
+class AgentSession:
+    """Running conversation between one agent and its LLM backend.
+
+    The instructions are sent once as a system message; each step adds only
+    the new state. OpenAI gets the system message plus the last `window`
+    exchanges as chat messages. Ollama continues from the `context` tokens it
+    returned last time. That context can't be trimmed, so after `window`
+    continued turns it is restarted with a short recap of the last exchanges.
+    """
+
+    def __init__(self, system_prompt, window=AGENT_MEMORY_SIZE):
+        self.system_prompt = system_prompt
+        self.window = window
+        self.turns = deque(maxlen=window)  # (state message, reply)
+        self.context = None
+        self.context_model = None
+        self.context_turns = 0
+
+    def _continues(self, model):
+        return (self.context is not None and self.context_model == model
+                and self.context_turns < self.window)
+
+    def chat_messages(self, message):
+        messages = [{"role": "system", "content": self.system_prompt}]
+        for user, assistant in self.turns:
+            messages.append({"role": "user", "content": user})
+            messages.append({"role": "assistant", "content": assistant})
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    def generate_fields(self, model, message):
+        """prompt/system/context fields for an Ollama /api/generate request"""
+        if self._continues(model):
+            return {"prompt": message, "context": self.context}
+        recap = "\n".join(f"{user}\n-> {assistant}" for user, assistant in self.turns)
+        prompt = f"Earlier turns:\n{recap}\n\nNow:\n{message}" if recap else message
+        return {"prompt": prompt, "system": self.system_prompt}
+
+    def record(self, message, reply, model=None, context=None):
+        """Add an answered turn; `context` is Ollama's, None for other backends"""
+        if context is not None:
+            self.context_turns = self.context_turns + 1 if self._continues(model) else 1
+            self.context = context
+            self.context_model = model
+        else:
+            # A turn served elsewhere is missing from the Ollama context
+            self.context = None
+            self.context_turns = 0
+        self.turns.append((message, reply))
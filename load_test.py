@@ -0,0 +1,133 @@
+"""Load test for the LLM layer against bundled fake backends (fake_llm_server.py).
+
+Starts one or more fake servers in-process, points llm.py at them and calls
+get_agent_action (get_agent_plan with --plan) from `--concurrency` threads.
+Reports throughput, end-to-end latency percentiles (including scheduler
+queueing), which backend answered, fallbacks to "do nothing", JSON replies
+cut off by the token limit, and the scheduler / circuit-breaker state.
+
+    python load_test.py --backend both --concurrency 32 --requests 500 \\
+        --latency-ms 200 --rate-limit-rate 0.05 --error-rate 0.02 --stream
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from fake_llm_server import add_server_arguments, server_from_args
+
+
+def configure(args, servers):
+    """Point the LLM layer at the fake servers; must run before llm is imported"""
+    import config
+    config.LOCAL_LLM_URLS = [server.url for server in servers]
+    config.OPENAI_BASE_URL = f"{servers[0].url}/v1"
+    # An empty key disables the OpenAI fallback (load_dotenv won't override it)
+    os.environ["OPENAI_API_KEY"] = "fake-key" if args.backend in ("openai", "both") else ""
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def run(args):
+    servers = [server_from_args(args).start() for _ in range(args.endpoints)]
+    configure(args, servers)
+
+    import json
+    from llm import get_agent_action, get_agent_plan, response_action
+    from simulation_config import SimulationConfig
+    from llm_health import health_report
+    from llm_scheduler import scheduler_report
+
+    decisions = []
+    lock = threading.Lock()
+
+    def record(name, prompt, backend, latency, response, action):
+        with lock:
+            decisions.append((backend, response, action))
+
+    sim_config = SimulationConfig.from_config(
+        use_local_llm=args.backend in ("local", "both"), use_multimodal=False,
+        llm_streaming=args.stream, constrained_decoding=not args.stream, session_mode=False,
+        plan_mode=args.plan
+    )
+    agent_names = list(sim_config.agent_base_configs)
+    size = sim_config.grid_size
+
+    def one_request(i):
+        rng = random.Random(i)
+        name = agent_names[i % len(agent_names)]
+        start = time.perf_counter()
+        decide = get_agent_plan if args.plan else get_agent_action
+        decide(
+            agent_name=name,
+            position=(rng.randrange(size), rng.randrange(size)),
+            inventory={'red': rng.randint(0, 2), 'green': rng.randint(0, 2)},
+            cell_content=rng.choice([None, 'red', 'green']),
+            energy=rng.randint(1, 40),
+            consumption_rate=sim_config.agent_rates(name),
+            food_hint=f"{rng.choice(['red', 'green'])}, {rng.randint(1, 6)} steps up",
+            sim_config=sim_config,
+            recorder=record
+        )
+        return time.perf_counter() - start
+
+    print(f"Driving {args.requests} decisions at concurrency {args.concurrency} against "
+          f"{args.endpoints} fake endpoint(s), backend={args.backend}, stream={args.stream}, plan={args.plan}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = sorted(executor.map(one_request, range(args.requests)))
+    wall = time.perf_counter() - start
+    for server in servers:
+        server.stop()
+
+    answered_by = Counter(backend or "none (do nothing)" for backend, _, _ in decisions)
+    invalid = 0 if args.plan else sum(1 for backend, response, action in decisions
+                                      if response is not None and response_action(response) != action)
+    cut_off = 0
+    for _, response, _ in decisions:
+        if response is not None and response.startswith("{"):
+            try:
+                json.loads(response)
+            except ValueError:
+                cut_off += 1
+    print(f"\nThroughput: {len(latencies) / wall:.1f} decisions/s over {wall:.1f}s")
+    print(f"Latency ms: p50 {percentile(latencies, 50) * 1000:.0f}  "
+          f"p95 {percentile(latencies, 95) * 1000:.0f}  p99 {percentile(latencies, 99) * 1000:.0f}  "
+          f"max {latencies[-1] * 1000:.0f}")
+    print("Answered by: " + ", ".join(f"{name} {count}" for name, count in answered_by.most_common()))
+    print(f"Invalid replies mapped to 'do nothing': {invalid}")
+    print(f"JSON replies cut off by the token limit: {cut_off}")
+
+    server_counts = Counter()
+    for server in servers:
+        server_counts.update(server.counts)
+    print("Fake server: " + ", ".join(f"{key} {count}" for key, count in sorted(server_counts.items())))
+    for status in scheduler_report():
+        print(f"Scheduler {status['backend']}: limit {status['limit']:.1f}, "
+              f"rate limited {status['rate_limited']}, errors {status['errors']}, "
+              f"max wait {status['max_wait']:.2f}s")
+    for status in health_report():
+        print(f"Health {status['backend']}: {status['state']}, ok {status['successes']}, "
+              f"failed {status['failures']}, skipped {status['skipped']}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Load test get_agent_action against fake backends")
+    parser.add_argument("--backend", choices=["local", "openai", "both"], default="both",
+                        help="which backends are enabled ('both' = local with OpenAI fallback)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--endpoints", type=int, default=1, help="fake local endpoints to balance over")
+    parser.add_argument("--stream", action="store_true", help="use the streaming code paths (free-text replies)")
+    parser.add_argument("--plan", action="store_true", help="request plan-mode plans")
+    add_server_arguments(parser)
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -2,16 +2,24 @@ import os
 import sys
 import csv
 import random
+from contextlib import ExitStack
 from config import (
-    NUM_AGENTS,
-    GRID_SIZE,
-    TOTAL_STEPS,
-    REPLENISH_INTERVAL,
-    REPLENISH_RED_COUNT,
-    REPLENISH_GREEN_COUNT
+    USE_EXPERIMENT_STORE,
+    RANDOM_SEED,
+    RECORD_TRAJECTORY,
+    TRAJECTORY_DIR,
+    LOG_MODE,
+    EVENT_LOG_PATH,
+    EVENT_KEYFRAME_INTERVAL,
+    LOCAL_LLM_WARM_UP,
+    LIVE_VIEW
 )
 from environment import Environment
 from agent import Agent
+from trade_manager import TradeManager
+from simulation_config import SimulationConfig
+from llm import warm_up_local_models
+from profiler import phase, reset_phases, print_phase_report, profile_run
 
 def generate_unique_positions(num_agents: int, grid_size: int):
     positions = set()
@@ -22,61 +30,172 @@ def generate_unique_positions(num_agents: int, grid_size: int):
         ))
     return list(positions)
 
-def main():
+def main(sim_config=None, frames=None):
+    """Run one simulation; with `frames` (a FrameQueue) every step is published for a live viewer"""
+    # Every setting of this run, fixed from here on
+    cfg = sim_config if sim_config is not None else SimulationConfig.from_config()
+    if cfg.use_local_llm and LOCAL_LLM_WARM_UP:
+        warm_up_local_models(cfg)
+
+    # Seed the run so it can be identified (and repeated) from the experiment store
+    seed = RANDOM_SEED if RANDOM_SEED is not None else random.randrange(2**32)
+    random.seed(seed)
+    reset_phases()
+
     # Prepare environment and agents
-    env = Environment()
-    positions = generate_unique_positions(NUM_AGENTS, GRID_SIZE)
+    env = Environment(sim_config=cfg)
+    positions = generate_unique_positions(cfg.num_agents, cfg.grid_size)
     agents = [
-        Agent(f"Agent{i+1}", start_pos=positions[i])
-        for i in range(NUM_AGENTS)
+        Agent(f"Agent{i+1}", start_pos=positions[i], sim_config=cfg)
+        for i in range(cfg.num_agents)
     ]
 
+    # Optional SQLite experiment store
+    store = None
+    run_id = None
+    if USE_EXPERIMENT_STORE:
+        from experiment_store import ExperimentStore, config_snapshot
+        store = ExperimentStore()
+        run_id = store.start_run("main", seed=seed, consumption_rate=cfg.consumption_rate,
+                                 config=config_snapshot(cfg), num_agents=cfg.num_agents,
+                                 total_steps=cfg.total_steps)
+        decisions = store.decision_recorder(run_id, agents)
+        for agent in agents:
+            agent.decision_recorder = decisions
+    trade_manager = TradeManager(trade_recorder=store.trade_recorder(run_id) if store else None)
+
+    # Optional full-state trajectory (memory-mapped, one row per step)
+    recorder = None
+    if RECORD_TRAJECTORY:
+        from datetime import datetime
+        from trajectory import TrajectoryRecorder
+        trajectory_path = os.path.join(
+            TRAJECTORY_DIR, f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+        recorder = TrajectoryRecorder(
+            trajectory_path, cfg.total_steps, cfg.grid_size, [a.name for a in agents],
+            metadata={'seed': seed, 'run_id': run_id}
+        )
+        recorder.record(0, env, agents)
+
+    if frames is not None:
+        from pygame_visualization import snapshot_frame
+        frames.put(snapshot_frame(0, env, agents))
+
     # Ensure logs directory exists
     os.makedirs("logs", exist_ok=True)
     energy_log_path = os.path.join("logs", "llm_agent_log.csv")
     action_log_path = os.path.join("logs", "llm_actions_log.csv")
+    write_csv = LOG_MODE in ("csv", "both")
+
+    # Event log: only state-changing events plus periodic keyframes
+    event_log = None
+    if LOG_MODE in ("events", "both"):
+        from event_log import EventLogWriter, agent_state
+        event_log = EventLogWriter(EVENT_LOG_PATH, env, agents,
+                                   cfg.energy_loss_per_turn, EVENT_KEYFRAME_INTERVAL)
 
     # Open CSV files and write headers
-    with open(energy_log_path, "w", newline="", encoding="utf-8") as elog, \
-         open(action_log_path, "w", newline="", encoding="utf-8") as alog:
+    with ExitStack() as stack:
+        if write_csv:
+            elog = stack.enter_context(open(energy_log_path, "w", newline="", encoding="utf-8"))
+            alog = stack.enter_context(open(action_log_path, "w", newline="", encoding="utf-8"))
 
-        energy_writer = csv.writer(elog)
-        action_writer = csv.writer(alog)
+            energy_writer = csv.writer(elog)
+            action_writer = csv.writer(alog)
 
-        energy_writer.writerow(["Step", "Agent", "Energy"])
-        action_writer.writerow(["Step", "Agent", "Action"])
+            energy_writer.writerow(["Step", "Agent", "Energy"])
+            action_writer.writerow(["Step", "Agent", "Action"])
 
         # Main simulation loop
-        for step in range(1, TOTAL_STEPS + 1):
+        for step in range(1, cfg.total_steps + 1):
             print(f"\n--- Step {step} ---")
             alive_count = sum(1 for a in agents if a.alive)
-            print(f"Alive: {alive_count}/{NUM_AGENTS}")
+            print(f"Alive: {alive_count}/{cfg.num_agents}")
+            with phase("feature_maps"):
+                env.update_feature_maps(agents)
 
-            for agent in agents:
+            step_actions = {}
+            for index, agent in enumerate(agents):
                 if agent.alive:
-                    action = agent.decide_and_act(env, all_agents=agents)
+                    before = agent_state(agent) if event_log else None
+                    action = agent.decide_and_act(env, trade_manager, all_agents=agents)
+                    if event_log:
+                        with phase("logging"):
+                            event_log.record_agent_step(step, index, before, agent, cfg.energy_loss_per_turn)
                 else:
                     action = "inactive"
+                step_actions[agent.name] = action
 
-                # Console log
-                print(f"{agent.name} @ {agent.position} | E={agent.energy}: {action}")
+                with phase("logging"):
+                    # Console log
+                    print(f"{agent.name} @ {agent.position} | E={agent.energy}: {action}")
 
-                # CSV log
-                energy_writer.writerow([step, agent.name, agent.energy])
-                action_writer.writerow([step, agent.name, action])
+                    # CSV log
+                    if write_csv:
+                        energy_writer.writerow([step, agent.name, agent.energy])
+                        action_writer.writerow([step, agent.name, action])
+
+            if store:
+                with phase("logging"):
+                    store.record_agent_steps(run_id, step, agents, step_actions)
 
             # Replenish food periodically
-            if step % REPLENISH_INTERVAL == 0:
-                print(f"🔄 Replenishing {REPLENISH_RED_COUNT} red & "
-                      f"{REPLENISH_GREEN_COUNT} green")
-                env.fixed_replenish(
-                    red_count=REPLENISH_RED_COUNT,
-                    green_count=REPLENISH_GREEN_COUNT
-                )
+            if step % cfg.replenish_interval == 0:
+                print(f"🔄 Replenishing {cfg.replenish_red_count} red & "
+                      f"{cfg.replenish_green_count} green")
+                with phase("replenish"):
+                    placed = env.fixed_replenish(
+                        red_count=cfg.replenish_red_count,
+                        green_count=cfg.replenish_green_count
+                    )
+                if event_log:
+                    event_log.replenish(step, placed)
+
+            with phase("logging"):
+                if event_log:
+                    event_log.end_step(step, env, agents)
 
+                if recorder:
+                    recorder.record(step, env, agents)
+
+                if frames is not None:
+                    frames.put(snapshot_frame(step, env, agents))
+
+    if event_log:
+        event_log.close()
+        print(f"Event log saved to {EVENT_LOG_PATH} ({event_log.events_written} records)")
+
+    if recorder:
+        recorder.close()
+        print(f"Trajectory saved to {trajectory_path}")
+
+    if store:
+        survivors = sum(1 for a in agents if a.alive)
+        store.finish_run(run_id, cfg.total_steps, survivors, cfg.num_agents)
+        store.close()
+        print(f"Run {run_id} (seed {seed}) recorded in experiment store")
+
+    if not cfg.use_rule_based_policy:
+        agent_steps = sum(len(a.actions_taken) for a in agents)
+        llm_calls = sum(a.llm_calls for a in agents)
+        print(f"LLM calls: {llm_calls} for {agent_steps} agent-steps "
+              f"({llm_calls / max(1, agent_steps):.2f} per step)")
+
+    print_phase_report()
     print("\nSimulation complete.")
-    print(f"Energy log saved to {energy_log_path}")
-    print(f"Actions log saved to {action_log_path}")
+    if write_csv:
+        print(f"Energy log saved to {energy_log_path}")
+        print(f"Actions log saved to {action_log_path}")
+
+def profiled_main(frames=None):
+    with profile_run("main"):
+        main(frames=frames)
 
 if __name__ == "__main__":
-    main()
+    if LIVE_VIEW:
+        # The viewer takes the main thread; the simulation (and its profile) runs in a worker
+        from pygame_visualization import run_live
+        run_live(profiled_main, title="LLM agents (live)")
+    else:
+        profiled_main()
@@ -0,0 +1,93 @@
+"""Headless figure rendering shared by analyse_stat and the consumption rate study.
+
+Long per-step series are thinned with LTTB (Largest-Triangle-Three-Buckets),
+which keeps the points that carry the visual shape (peaks, drops, plateaus)
+instead of every n-th sample. Figures are rendered offscreen with the Agg
+backend, one worker process per figure.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from config import PLOT_MAX_POINTS, PLOT_WORKERS, PLOT_DPI, PLOT_MARKER_MAX_POINTS
+
+
+def lttb_indices(x, y, threshold=PLOT_MAX_POINTS):
+    """Indices of the at most `threshold` points LTTB keeps, first and last included"""
+    import numpy as np
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets over the interior points; edges[i]:edges[i+1] is bucket i
+    every = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * every).astype(int) + 1
+    edges[-1] = n - 1
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the area of the triangle (selected point, candidate, next bucket's mean)
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def lttb(x, y, threshold=PLOT_MAX_POINTS):
+    """Downsample (x, y) to at most `threshold` points, keeping the visual shape"""
+    import numpy as np
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = lttb_indices(x, y, threshold)
+    return x[keep], y[keep]
+
+
+def marker_for(points, marker='o'):
+    """Markers only make sense when individual points are distinguishable"""
+    return marker if len(points) <= PLOT_MARKER_MAX_POINTS else None
+
+
+def use_headless_backend():
+    """Switch matplotlib to the offscreen Agg backend (call before importing pyplot)"""
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def finish_figure(plt, output_path=None):
+    """Save and close the current figure, or show it when no path is given"""
+    if output_path:
+        plt.savefig(output_path, dpi=PLOT_DPI, bbox_inches='tight')
+        plt.close()
+        return output_path
+    plt.show()
+    return None
+
+
+def _render(job):
+    plot, kwargs, output_path = job
+    plot(**kwargs, output_path=output_path)
+    return output_path
+
+
+def render_figures(jobs, output_dir, workers=PLOT_WORKERS):
+    """Render [(plot_function, kwargs, filename)] into output_dir in parallel.
+
+    Plot functions must be module-level (picklable) and accept output_path.
+    Returns the written paths in job order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(plot, kwargs, os.path.join(output_dir, filename)) for plot, kwargs, filename in jobs]
+    workers = min(len(jobs), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        use_headless_backend()
+        return [_render(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=use_headless_backend) as executor:
+        return list(executor.map(_render, jobs))
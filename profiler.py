@@ -0,0 +1,166 @@
+"""Opt-in hot-path profiling.
+
+Phase timers: wrap a section in `with phase("name"):`. When PROFILE_PHASES
+is off this returns a shared no-op context, so instrumented code pays only
+a function call. Timings accumulate per phase until reset_phases();
+print_phase_report() shows count, total and percentiles for each phase.
+
+cProfile: `with profile_run("main"):` profiles everything inside when
+PROFILE_CPROFILE is on and writes <PROFILE_DIR>/<name>_<timestamp>.prof
+plus a .collapsed file (one "frame;frame;frame microseconds" line per
+stack) that flamegraph.pl, speedscope or inferno can render.
+
+Usage: python profiler.py <file.prof> converts an existing profile.
+"""
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from config import PROFILE_PHASES, PROFILE_CPROFILE, PROFILE_DIR
+
+_NULL_PHASE = nullcontext()
+_timings = defaultdict(list)
+
+
+class _PhaseTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _timings[self.name].append(time.perf_counter() - self.start)
+        return False
+
+
+def phase(name):
+    """Time the enclosed block under `name` (no-op unless PROFILE_PHASES)"""
+    if not PROFILE_PHASES:
+        return _NULL_PHASE
+    return _PhaseTimer(name)
+
+
+def reset_phases():
+    _timings.clear()
+
+
+def _percentile(ordered, pct):
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def phase_report():
+    """{phase: {'count', 'total', 'p50', 'p95', 'p99', 'max'}} in seconds"""
+    report = {}
+    for name, samples in list(_timings.items()):
+        ordered = sorted(samples)
+        if not ordered:
+            continue
+        report[name] = {
+            'count': len(ordered),
+            'total': sum(ordered),
+            'p50': _percentile(ordered, 50),
+            'p95': _percentile(ordered, 95),
+            'p99': _percentile(ordered, 99),
+            'max': ordered[-1],
+        }
+    return report
+
+
+def print_phase_report(title="Phase timings"):
+    report = phase_report()
+    if not report:
+        return
+    grand_total = sum(stats['total'] for stats in report.values()) or 1.0
+    print(f"\n⏱️ {title} (ms)")
+    print(f"{'phase':<16}{'count':>8}{'total':>10}{'share':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, stats in sorted(report.items(), key=lambda item: -item[1]['total']):
+        print(f"{name:<16}{stats['count']:>8}{stats['total'] * 1000:>10.1f}"
+              f"{stats['total'] / grand_total:>8.1%}"
+              f"{stats['p50'] * 1000:>9.3f}{stats['p95'] * 1000:>9.3f}"
+              f"{stats['p99'] * 1000:>9.3f}{stats['max'] * 1000:>9.3f}")
+
+
+def _frame_label(func):
+    filename, lineno, name = func
+    if filename == "~":  # built-in
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{lineno})".replace(";", ",")
+
+
+def collapsed_stacks(stats, min_microseconds=1):
+    """Approximate full call stacks from pstats caller/callee totals.
+
+    cProfile only keeps caller -> callee edges, so a function's time is split
+    over the paths leading to it in proportion to the time each caller spent
+    in it. Recursion is cut at the first repeated frame.
+    Returns {"root;...;leaf": microseconds of self time}.
+    """
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+    roots = [func for func, entry in stats.items() if not entry[4]]
+
+    stacks = defaultdict(float)
+
+    def walk(func, path, labels, scale):
+        own = stats[func][2] * scale * 1e6
+        if own >= min_microseconds:
+            stacks[";".join(labels)] += own
+        for callee, edge_time in callees[func].items():
+            total = stats[callee][3]
+            if callee in path or total <= 0:
+                continue
+            share = scale * edge_time / total
+            if share * total * 1e6 < min_microseconds:
+                continue
+            walk(callee, path | {callee}, labels + [_frame_label(callee)], share)
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    for root in roots:
+        walk(root, {root}, [_frame_label(root)], 1.0)
+    return {stack: int(round(value)) for stack, value in stacks.items() if value >= min_microseconds}
+
+
+def write_collapsed(stats, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, microseconds in sorted(collapsed_stacks(stats).items()):
+            f.write(f"{stack} {microseconds}\n")
+
+
+@contextmanager
+def profile_run(name):
+    """cProfile the enclosed block and dump .prof/.collapsed files (no-op unless PROFILE_CPROFILE)"""
+    if not PROFILE_CPROFILE:
+        yield None
+        return
+    import cProfile
+    import pstats
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}")
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(base + ".prof")
+        write_collapsed(pstats.Stats(profile).stats, base + ".collapsed")
+        print(f"Profile saved to {base}.prof (flamegraph input: {base}.collapsed)")
+
+
+if __name__ == "__main__":
+    import pstats
+    if len(sys.argv) != 2:
+        print("Usage: python profiler.py <file.prof>")
+        sys.exit(1)
+    source = sys.argv[1]
+    target = os.path.splitext(source)[0] + ".collapsed"
+    write_collapsed(pstats.Stats(source).stats, target)
+    print(f"Collapsed stacks written to {target}")
@@ -0,0 +1,149 @@
+"""A/B comparison of the verbose and compact prompt encodings.
+
+Offline (no LLM calls): replays a rule-based simulation and builds both
+prompts for every agent turn, reporting token counts per mode.
+
+    python prompt_ab.py --offline [--runs N]
+
+Live: runs the same scenarios (common random numbers) once per prompt mode
+against the configured LLM backends and compares prompt tokens, latency,
+action validity (share of responses that parsed to a valid action) and
+survival, with a paired confidence interval on the survival difference.
+
+    python prompt_ab.py [--runs N]
+"""
+import sys
+import random
+import statistics
+from environment import Environment
+from agent import Agent
+from prompts import build_prompt, count_tokens
+from llm import response_action
+from simulation_config import SimulationConfig
+from consumption_rate_study import (
+    generate_unique_positions,
+    scenario_bank,
+    run_single_simulation,
+    paired_difference
+)
+
+MODES = ("verbose", "compact")
+
+
+def prompt_tokens(agent, env):
+    """Token count of this agent's current prompt in each mode"""
+    x, y = agent.position
+    cfg = agent.sim_config
+    counts = {}
+    for mode in MODES:
+        prompt = build_prompt(
+            mode, agent.name, agent.position, agent.inventory, env.get_cell_content(x, y),
+            agent.energy, agent.consumption_rates, memory=agent.memory,
+            memory_records=agent.memory_records, food_hint=agent.food_hint(env),
+            multimodal=cfg.use_multimodal, grid_size=cfg.grid_size,
+            energy_loss=cfg.energy_loss_per_turn
+        )
+        counts[mode] = count_tokens(prompt)
+    return counts
+
+
+def offline_run(seed, cfg):
+    """Token counts of both encodings along one rule-based trajectory"""
+    random.seed(seed)
+    env = Environment(rng=random.Random(seed), sim_config=cfg)
+    positions = generate_unique_positions(cfg.num_agents, cfg.grid_size, rng=env.rng)
+    agents = [Agent(f"Agent{i+1}", start_pos=positions[i], sim_config=cfg)
+              for i in range(cfg.num_agents)]
+    tokens = {mode: [] for mode in MODES}
+    for step in range(1, cfg.total_steps + 1):
+        env.update_feature_maps(agents)
+        for agent in agents:
+            if not agent.alive:
+                continue
+            # Same turn structure as Agent.decide_and_act, with the rule-based policy
+            agent.step_count += 1
+            agent.energy -= cfg.energy_loss_per_turn
+            if agent.energy <= 0:
+                agent.alive = False
+                continue
+            for mode, count in prompt_tokens(agent, env).items():
+                tokens[mode].append(count)
+            obs = agent.get_current_observation(env, agents)
+            occupied = {a.position for a in agents if a.alive and a is not agent}
+            action = agent.rule_based_action(env, occupied)
+            agent.add_memory(obs, action, agent.apply_action(action, env, occupied))
+        if not any(agent.alive for agent in agents):
+            break
+        if step % cfg.replenish_interval == 0:
+            env.fixed_replenish(red_count=cfg.replenish_red_count,
+                                green_count=cfg.replenish_green_count)
+    return tokens
+
+
+def summarize(values):
+    if not values:
+        return "n/a"
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return f"mean {statistics.fmean(ordered):7.1f}  p95 {p95:5d}  max {ordered[-1]:5d}"
+
+
+def offline(num_runs):
+    cfg = SimulationConfig.from_config()
+    tokens = {mode: [] for mode in MODES}
+    for seed in scenario_bank(num_runs):
+        for mode, counts in offline_run(seed, cfg).items():
+            tokens[mode].extend(counts)
+    print(f"Prompt tokens over {len(tokens['verbose'])} agent turns ({num_runs} runs):")
+    for mode in MODES:
+        print(f"  {mode:<8} {summarize(tokens[mode])}")
+    saving = 1 - statistics.fmean(tokens['compact']) / statistics.fmean(tokens['verbose'])
+    print(f"  compact saves {saving:.1%} of input tokens")
+
+
+def live(num_runs):
+    seeds = scenario_bank(num_runs)
+    base = SimulationConfig.from_config()
+    results = {}
+    for mode in MODES:
+        decisions = []
+        cfg = base.replace(prompt_mode=mode)
+        record = lambda name, prompt, backend, latency, response, action: decisions.append(
+            (count_tokens(prompt), latency, response, action)
+        )
+        print(f"\n=== Prompt mode: {mode} ===")
+        survival = [run_single_simulation(cfg.consumption_rate, seed=seed, sim_config=cfg,
+                                          decision_recorder=record)
+                    for seed in seeds]
+        answered = [d for d in decisions if d[2] is not None]
+        valid = [d for d in answered if response_action(d[2]) == d[3]]
+        results[mode] = {
+            'survival': survival,
+            'tokens': [d[0] for d in decisions],
+            'latency': [d[1] for d in answered],
+            'validity': len(valid) / len(answered) if answered else 0.0,
+        }
+
+    print("\n=== Prompt A/B results ===")
+    for mode in MODES:
+        r = results[mode]
+        latency = statistics.fmean(r['latency']) * 1000 if r['latency'] else 0.0
+        print(f"{mode:<8} tokens {summarize(r['tokens'])} | latency {latency:.0f} ms | "
+              f"valid {r['validity']:.1%} | survival {statistics.fmean(r['survival']):.2%}")
+    mean, half_width = paired_difference(results['compact']['survival'], results['verbose']['survival'])
+    print(f"Survival compact - verbose: {mean:+.2%} ± {half_width:.2%} (paired, {num_runs} scenarios)")
+    return results
+
+
+def main(argv):
+    num_runs = 3
+    if "--runs" in argv:
+        num_runs = int(argv[argv.index("--runs") + 1])
+    if "--offline" in argv:
+        offline(num_runs)
+    else:
+        live(num_runs)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,269 @@
+"""Agent prompt encodings.
+
+"verbose" is the original emoji report with strategy tips and three full
+memory entries. "compact" is terse fixed-field lines: consecutive repeats
+in memory are merged, and memory and tips are added newest-first only
+while the prompt stays within PROMPT_TOKEN_BUDGET.
+
+Single-action prompts list only the actions that are legal right now.
+With plan_length > 1 (plan mode) both ask for a comma-separated sequence
+of up to that many actions instead, whose first must be legal now.
+
+Session mode (SimulationConfig.session_mode) splits the prompt instead: the rules go in
+a system message once per agent, and each step sends only the state delta.
+"""
+import re
+from functools import lru_cache
+from config import GRID_SIZE, ENERGY_LOSS_PER_TURN, LLM_MODEL, PROMPT_TOKEN_BUDGET
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+ALL_ACTIONS = ("move up", "move down", "move left", "move right",
+               "collect", "eat red", "eat green", "do nothing")
+
+
+@lru_cache(maxsize=None)
+def _tiktoken_encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(LLM_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Offline token count: tiktoken when installed, otherwise a BPE-like estimate.
+
+    The estimate counts words, 1-3 digit groups and punctuation marks as one
+    token each, and every non-ASCII character (emoji) as two.
+    """
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        tokens += 2 if not piece.isascii() else 1
+    return tokens
+
+
+def plan_rule(plan_length, legal_actions=None):
+    rule = (f"Reply with a plan of up to {plan_length} valid actions, in the order to carry them out, "
+            "separated by commas (e.g. 'move right, move right, collect'). No explanation or reasoning.")
+    if legal_actions:
+        rule += f" The first action must be possible now: {', '.join(legal_actions)}."
+    return rule
+
+
+def _verbose_action_lines(actions):
+    quoted = lambda group: ", ".join(f"'{a}'" for a in group)
+    moves = [a for a in actions if a.startswith("move")]
+    eats = [a for a in actions if a.startswith("eat")]
+    lines = []
+    if moves:
+        lines.append(f"- Move → {quoted(moves)}")
+    if "collect" in actions:
+        lines.append("- Collect food → 'collect'")
+    if eats:
+        lines.append(f"- Eat → {quoted(eats)}")
+    if "do nothing" in actions:
+        lines.append("- Take a break → 'do nothing' (not recommended if you can act)")
+    return "\n".join(lines)
+
+
+def verbose_prompt(agent_name, position, inventory, cell_content, energy, consumption_rate,
+                   memory=None, retry_message=None, food_hint=None, multimodal=False,
+                   plan_length=1, legal_actions=None, grid_size=GRID_SIZE,
+                   energy_loss=ENERGY_LOSS_PER_TURN):
+    # Build recent-memory section
+    history_section = ""
+    if memory:
+        entries = memory[-3:]
+        history_section = "📜 Recent memory:\n" + "\n".join(f"- {e}" for e in entries) + "\n\n"
+
+    # Core prompt (exact text as requested)
+    base_prompt = f"""🧠 Agent Status Report: {agent_name}
+📍 Position: {position} on a {grid_size}x{grid_size} grid
+⚡ Energy Level: {energy} (you lose {energy_loss} energy every step)
+🎒 Inventory: {inventory}
+🍽️ Consumption Rate: {consumption_rate}. — Give priority to eat the food that gives you the most energy according to consumption rate.
+📦 Current Cell Contents: {cell_content if cell_content else 'nothing'}
+{f"✅ You can collect the {cell_content} food here." if cell_content in ['red', 'green'] else ""}
+{f"🧭 Nearest preferred food: {food_hint}" if food_hint else ""}
+
+{history_section}
+
+🧭 Strategy Tips:
+- Collect food if it's available.
+- Eat if you have food available or your energy is low.
+- Move in all directions (up, down, left, right) to find food — the grid is {grid_size}x{grid_size}.
+- Head towards the nearest preferred food shown above when there is none here.
+- Avoid wasting turns — survive as long as possible!
+
+🧭 Movement Tips:
+- Based on your recent actions above, try to make a smart decision.
+- Avoid repeating moves that led to empty cells or no gain.
+- Change your direction if move is blocked.
+- Explore unvisited or promising directions based on your recent outcomes.
+- Learn from past actions: if moving in one direction wasn't useful, try a different one.
+
+🚨 PRIORITY: 🔺 Don't forget to eat food to maintain energy levels.
+
+🎮 Valid Actions (choose one only):
+{_verbose_action_lines(legal_actions if legal_actions and plan_length == 1 else ALL_ACTIONS)}
+
+🎯 Decision Rule:
+Reply with only **one valid action** exactly as described above. No explanation or reasoning."""
+
+    if plan_length > 1:
+        base_prompt = base_prompt.replace(
+            "🎮 Valid Actions (choose one only):", "🎮 Valid Actions:"
+        ).replace(
+            "Reply with only **one valid action** exactly as described above. No explanation or reasoning.",
+            plan_rule(plan_length, legal_actions)
+        )
+
+    prompt = base_prompt
+
+    # Include retry note if needed
+    if retry_message:
+        prompt += f"\n⚠️ Note: Previous failed because: {retry_message}. Try something different.\n"
+
+    # Prepend visual instructions for multimodal
+    if multimodal:
+        visual_part = """Look at the image showing the grid around you. In the image:
+- 🍎 Red circles = red food
+- 🥦 Green circles = green food
+- ⚪ Gray circles = other agents
+- 🟡 Yellow circle with black border = you
+- ⬜ White squares = empty cells
+
+Use this visual information along with the text description to make your decision.
+"""
+        prompt = visual_part + "\n" + base_prompt
+
+    return prompt
+
+
+def _short_outcome(outcome):
+    # "moved up (energy: 12)" -> "moved up"; energy is already a field of its own
+    return re.sub(r"\s*\(energy: -?\d+\)", "", outcome or "")
+
+
+def compact_memory(records):
+    """Memory records as terse entries, merging consecutive identical ones (oldest first)"""
+    entries = []
+    for record in records:
+        key = (record['action'], _short_outcome(record['outcome']))
+        if entries and entries[-1][0] == key:
+            entries[-1][1] += 1
+            entries[-1][2] = record['step']
+        else:
+            entries.append([key, 1, record['step'], record['step']])
+    lines = []
+    for (action, outcome), count, last, first in entries:
+        steps = f"s{first}" if count == 1 else f"s{first}-{last}"
+        repeat = f" x{count}" if count > 1 else ""
+        lines.append(f"{steps} {action}->{outcome}{repeat}")
+    return lines
+
+
+def compact_prompt(agent_name, position, inventory, cell_content, energy, consumption_rate,
+                   memory_records=None, retry_message=None, food_hint=None, multimodal=False,
+                   budget=PROMPT_TOKEN_BUDGET, grid_size=GRID_SIZE, energy_loss=ENERGY_LOSS_PER_TURN,
+                   plan_length=1, legal_actions=None):
+    """Fixed-field state lines plus as much memory and advice as the token budget allows"""
+    lines = []
+    if multimodal:
+        lines.append("Image: red=red food, green=green food, gray=agent, yellow=you.")
+    lines += [
+        f"{agent_name} on {grid_size}x{grid_size} grid. pos={position[0]},{position[1]} "
+        f"energy={energy} (-{energy_loss}/step)",
+        f"inv red={inventory.get('red', 0)} green={inventory.get('green', 0)}; "
+        f"eat gain red={consumption_rate.get('red', 0)} green={consumption_rate.get('green', 0)}",
+        f"cell={cell_content or 'empty'}" + (" (collectable)" if cell_content in ('red', 'green') else ""),
+    ]
+    if food_hint:
+        lines.append(f"nearest food: {food_hint}")
+    if retry_message:
+        lines.append(f"last attempt failed: {retry_message}")
+    if plan_length > 1:
+        footer = (f"Reply with up to {plan_length} actions in order, comma-separated: "
+                  + "|".join(ALL_ACTIONS))
+        if legal_actions:
+            footer += "; first one of: " + "|".join(legal_actions)
+    else:
+        footer = "Reply with one action only: " + "|".join(legal_actions or ALL_ACTIONS)
+
+    used = count_tokens("\n".join(lines + [footer]))
+    optional = []
+    history = compact_memory(memory_records or [])
+    # Newest memory first, so the budget drops the oldest entries
+    kept = []
+    for entry in reversed(history):
+        cost = count_tokens(entry) + 1
+        if used + cost > budget:
+            break
+        kept.append(entry)
+        used += cost
+    if kept:
+        optional.append("recent: " + "; ".join(reversed(kept)))
+    tip = "Collect edible food, eat the best-gain food when energy is low, don't repeat blocked moves."
+    if used + count_tokens(tip) <= budget:
+        optional.append(tip)
+    return "\n".join(lines + optional + [footer])
+
+
+def build_prompt(mode, agent_name, position, inventory, cell_content, energy, consumption_rate,
+                 memory=None, memory_records=None, retry_message=None, food_hint=None,
+                 multimodal=False, grid_size=GRID_SIZE, energy_loss=ENERGY_LOSS_PER_TURN,
+                 plan_length=1, legal_actions=None):
+    if mode == "compact":
+        return compact_prompt(agent_name, position, inventory, cell_content, energy,
+                              consumption_rate, memory_records, retry_message, food_hint,
+                              multimodal, grid_size=grid_size, energy_loss=energy_loss,
+                              plan_length=plan_length, legal_actions=legal_actions)
+    return verbose_prompt(agent_name, position, inventory, cell_content, energy,
+                          consumption_rate, memory, retry_message, food_hint, multimodal,
+                          plan_length=plan_length, legal_actions=legal_actions,
+                          grid_size=grid_size, energy_loss=energy_loss)
+
+
+def session_system_prompt(agent_name, consumption_rate, multimodal=False,
+                          grid_size=GRID_SIZE, energy_loss=ENERGY_LOSS_PER_TURN):
+    """Instructions sent once per agent conversation (session mode)"""
+    lines = [
+        f"You are {agent_name}, an agent on a {grid_size}x{grid_size} grid trying to survive as long as possible.",
+        f"You lose {energy_loss} energy every step. Eating gives red={consumption_rate.get('red', 0)} "
+        f"green={consumption_rate.get('green', 0)} energy.",
+        "Each turn you get your current state and the result of your last action.",
+        "Collect food you can eat, eat the best-gain food when energy is low, head for the nearest "
+        "food you can eat, and change direction when a move is blocked or finds nothing.",
+        "Each turn lists the actions possible right now (from: move up, move down, move left, "
+        "move right, collect, eat red, eat green, do nothing). Reply with one of them only, no explanation.",
+    ]
+    if multimodal:
+        lines.insert(1, "Each turn also has an image of the grid: red circles are red food, green circles "
+                        "green food, gray circles other agents, the yellow circle is you.")
+    return "\n".join(lines)
+
+
+def session_turn_prompt(step, position, inventory, cell_content, energy, last_outcome=None,
+                        retry_message=None, food_hint=None, legal_actions=None):
+    """The per-step state delta sent in session mode"""
+    lines = []
+    if last_outcome:
+        lines.append(f"result: {_short_outcome(last_outcome)}")
+    if retry_message:
+        lines.append(f"failed: {retry_message}")
+    lines.append(
+        f"step {step}: pos={position[0]},{position[1]} energy={energy} "
+        f"inv red={inventory.get('red', 0)} green={inventory.get('green', 0)} "
+        f"cell={cell_content or 'empty'}"
+    )
+    if food_hint:
+        lines.append(f"nearest food: {food_hint}")
+    lines.append("possible: " + "|".join(legal_actions or ALL_ACTIONS))
+    return "\n".join(lines)
@@ -1,14 +1,17 @@
 import pygame
 import io
 import base64
+import threading
+from collections import namedtuple, deque
 from config import *
 
-def draw_grid(screen, env, agents, font, sub_font):
+def draw_grid(screen, env, agents, font, sub_font, flip=True):
     screen.fill(COLORS['GRID'])
 
-    # Draw grid and food
-    for i in range(GRID_SIZE):
-        for j in range(GRID_SIZE):
+    # Draw grid and food (the run's grid size, which may differ from config)
+    size = len(env.grid)
+    for i in range(size):
+        for j in range(size):
             rect = pygame.Rect(j * CELL_SIZE, i * CELL_SIZE, CELL_SIZE - MARGIN, CELL_SIZE - MARGIN)
             pygame.draw.rect(screen, COLORS['WHITE'], rect)
 
@@ -53,7 +56,7 @@ def draw_grid(screen, env, agents, font, sub_font):
     # Draw grid coordinates (optional)
     if ENABLE_DEBUG_OUTPUT:
         coord_font = pygame.font.SysFont('Arial', 10)
-        for i in range(GRID_SIZE):
+        for i in range(size):
             # Row numbers
             label = coord_font.render(str(i), True, (100, 100, 100))
             screen.blit(label, (2, i * CELL_SIZE + 2))
@@ -61,7 +64,8 @@ def draw_grid(screen, env, agents, font, sub_font):
             label = coord_font.render(str(i), True, (100, 100, 100))
             screen.blit(label, (i * CELL_SIZE + 2, 2))
 
-    pygame.display.flip()
+    if flip:
+        pygame.display.flip()
 
 def render_grid_for_agent(env, agent, all_agents):
     """Render a small grid image centered on the agent for multimodal LLM"""
@@ -77,9 +81,9 @@ def render_grid_for_agent(env, agent, all_agents):
     
     # Calculate visible area around agent
     start_x = max(0, agent_x - view_size // 2)
-    end_x = min(GRID_SIZE, agent_x + view_size // 2 + 1)
+    end_x = min(len(env.grid), agent_x + view_size // 2 + 1)
     start_y = max(0, agent_y - view_size // 2)
-    end_y = min(GRID_SIZE, agent_y + view_size // 2 + 1)
+    end_y = min(len(env.grid), agent_y + view_size // 2 + 1)
     
     # Draw grid cells
     for i in range(start_x, end_x):
@@ -170,4 +174,296 @@ def draw_stats_overlay(screen, env, agents, font):
         label = font.render(text, True, COLORS['WHITE'])
         overlay.blit(label, (10, 50))
     
-    screen.blit(overlay, (0, SCREEN_HEIGHT - overlay_height))
\ No newline at end of file
+    screen.blit(overlay, (0, SCREEN_HEIGHT - overlay_height))
+
+
+# ---------- Replay of recorded trajectories ----------
+
+# Lightweight stand-ins for Agent/Environment so draw_grid can render recorded steps
+ReplayAgent = namedtuple('ReplayAgent', ['name', 'position', 'inventory', 'energy', 'alive'])
+
+
+class ReplayFrame(namedtuple('ReplayFrame', ['step', 'grid', 'agents'])):
+    def count_food(self):
+        red = sum(row.count('red') for row in self.grid)
+        green = sum(row.count('green') for row in self.grid)
+        return {'red': red, 'green': green}
+
+
+def load_replay_frame(reader, step):
+    """Decode one step of a TrajectoryReader into a ReplayFrame"""
+    agents = tuple(ReplayAgent(**state) for state in reader.agents_at(step))
+    return ReplayFrame(step, reader.grid_at(step), agents)
+
+
+class FramePrefetcher:
+    """Decodes frames ahead of the playback cursor in a background thread"""
+
+    def __init__(self, reader, window=REPLAY_PREFETCH):
+        self.reader = reader
+        self.window = window
+        self.cache = {}
+        self.cursor = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            with self.lock:
+                cursor = self.cursor
+                missing = [s for s in range(cursor, min(cursor + self.window, len(self.reader)))
+                           if s not in self.cache]
+            if not missing:
+                self.wake.wait(0.05)
+                self.wake.clear()
+                continue
+            for step in missing:
+                if not self.running or self.cursor != cursor:
+                    break
+                frame = load_replay_frame(self.reader, step)
+                with self.lock:
+                    self.cache[step] = frame
+
+    def seek(self, step):
+        with self.lock:
+            self.cursor = step
+            # Drop frames outside the window behind the cursor
+            for cached in [s for s in self.cache if s < step - self.window or s >= step + self.window]:
+                del self.cache[cached]
+        self.wake.set()
+
+    def get(self, step):
+        self.seek(step)
+        with self.lock:
+            frame = self.cache.get(step)
+        if frame is None:
+            frame = load_replay_frame(self.reader, step)
+            with self.lock:
+                self.cache[step] = frame
+        return frame
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        self.thread.join(timeout=1)
+
+
+def draw_replay_status(screen, frame, total, speed, paused, font):
+    """Progress bar and playback state below the grid"""
+    bar_top = SCREEN_HEIGHT
+    pygame.draw.rect(screen, (30, 30, 30), (0, bar_top, SCREEN_WIDTH, REPLAY_BAR_HEIGHT))
+    progress = frame.step / max(1, total - 1)
+    pygame.draw.rect(screen, (90, 90, 90), (0, bar_top, SCREEN_WIDTH, 6))
+    pygame.draw.rect(screen, (30, 144, 255), (0, bar_top, int(SCREEN_WIDTH * progress), 6))
+    alive = sum(1 for agent in frame.agents if agent.alive)
+    state = "PAUSED" if paused else f"x{speed:g}"
+    text = f"Step {frame.step}/{total - 1}  Alive {alive}/{len(frame.agents)}  {state}"
+    screen.blit(font.render(text, True, COLORS['WHITE']), (8, bar_top + 10))
+
+
+def run_replay(trajectory_dir):
+    """Play back a recorded trajectory without re-running the simulation.
+
+    Controls: SPACE play/pause, LEFT/RIGHT frame-step, UP/DOWN double/halve speed,
+    HOME/END jump to start/end, PAGEUP/PAGEDOWN seek 10%, 0-9 seek to 0%-90%,
+    click the progress bar to seek, ESC/Q quit.
+    """
+    from trajectory import TrajectoryReader
+    reader = TrajectoryReader(trajectory_dir)
+    total = len(reader)
+    if total == 0:
+        print(f"No recorded steps in {trajectory_dir}")
+        return
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT + REPLAY_BAR_HEIGHT))
+    pygame.display.set_caption(f"Replay: {trajectory_dir}")
+    font = pygame.font.SysFont('Arial', 16)
+    sub_font = pygame.font.SysFont('Arial', 10)
+    clock = pygame.time.Clock()
+    prefetcher = FramePrefetcher(reader)
+
+    position = 0.0
+    speed = 1.0
+    paused = PAUSE_ON_START
+    running = True
+    try:
+        while running:
+            last = total - 1
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key in (pygame.K_ESCAPE, pygame.K_q):
+                        running = False
+                    elif event.key == pygame.K_SPACE:
+                        paused = not paused
+                        if not paused and position >= last:
+                            position = 0
+                    elif event.key == pygame.K_RIGHT:
+                        position = min(last, int(position) + 1)
+                    elif event.key == pygame.K_LEFT:
+                        position = max(0, int(position) - 1)
+                    elif event.key == pygame.K_UP:
+                        speed = min(REPLAY_MAX_SPEED, speed * 2)
+                    elif event.key == pygame.K_DOWN:
+                        speed = max(1 / 16, speed / 2)
+                    elif event.key == pygame.K_HOME:
+                        position = 0
+                    elif event.key == pygame.K_END:
+                        position = last
+                    elif event.key == pygame.K_PAGEUP:
+                        position = min(last, position + total / 10)
+                    elif event.key == pygame.K_PAGEDOWN:
+                        position = max(0, position - total / 10)
+                    elif pygame.K_0 <= event.key <= pygame.K_9:
+                        position = int(last * (event.key - pygame.K_0) / 10)
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.pos[1] >= SCREEN_HEIGHT:
+                    position = int(last * event.pos[0] / SCREEN_WIDTH)
+
+            frame = prefetcher.get(int(position))
+            draw_grid(screen, frame, frame.agents, font, sub_font, flip=False)
+            draw_replay_status(screen, frame, total, speed, paused, font)
+            pygame.display.flip()
+
+            elapsed = clock.tick(REPLAY_FPS) / 1000.0
+            if not paused:
+                # Advance REPLAY_FPS * speed steps per second, independent of render rate
+                position = min(last, position + elapsed * REPLAY_FPS * speed)
+                if position >= last:
+                    paused = True
+    finally:
+        prefetcher.stop()
+        pygame.quit()
+
+
+# ---------- Live view of a running simulation ----------
+
+def snapshot_frame(step, env, agents):
+    """Immutable copy of the world after `step`, safe to hand to another thread"""
+    grid = tuple(tuple(row) for row in env.grid)
+    frozen = tuple(
+        ReplayAgent(agent.name, agent.position, dict(agent.inventory), agent.energy, agent.alive)
+        for agent in agents
+    )
+    return ReplayFrame(step, grid, frozen)
+
+
+class FrameQueue:
+    """Bounded frame hand-off between the simulation and the viewer.
+
+    put() never blocks: when the queue is full the oldest frame is dropped,
+    so a slow viewer costs frames, not simulation speed.
+    """
+
+    def __init__(self, maxsize=LIVE_VIEW_QUEUE_SIZE):
+        self.frames = deque(maxlen=maxsize)
+        self.lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.shown = 0
+        self.closed = False
+
+    def put(self, frame):
+        with self.lock:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(frame)
+            self.published += 1
+
+    def latest(self):
+        """Newest frame, discarding older ones; None if nothing new arrived"""
+        with self.lock:
+            if not self.frames:
+                return None
+            frame = self.frames[-1]
+            self.frames.clear()
+            self.shown += 1
+            return frame
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+
+
+def draw_live_status(screen, frame, frames, paused, font):
+    """Step, survivors and frame statistics below the grid"""
+    bar_top = SCREEN_HEIGHT
+    pygame.draw.rect(screen, (30, 30, 30), (0, bar_top, SCREEN_WIDTH, REPLAY_BAR_HEIGHT))
+    alive = sum(1 for agent in frame.agents if agent.alive)
+    state = "PAUSED" if paused else ("FINISHED" if frames.closed else "LIVE")
+    text = (f"Step {frame.step}  Alive {alive}/{len(frame.agents)}  {state}  "
+            f"shown {frames.shown}/{frames.published}")
+    screen.blit(font.render(text, True, COLORS['WHITE']), (8, bar_top + 10))
+
+
+def run_live(simulate, title="Live simulation"):
+    """Run simulate(frames) in a worker thread and draw its newest frame at FPS.
+
+    The viewer keeps the main thread (pygame needs it on some platforms) and
+    the simulation never waits for it. Closing the window stops only the
+    viewer; the simulation runs to completion. Controls: SPACE freeze/resume,
+    ESC/Q close. Returns simulate's result.
+    """
+    frames = FrameQueue()
+    outcome = {}
+
+    def worker():
+        try:
+            outcome['result'] = simulate(frames)
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            frames.close()
+
+    thread = threading.Thread(target=worker, name="simulation", daemon=True)
+    thread.start()
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT + REPLAY_BAR_HEIGHT))
+    pygame.display.set_caption(title)
+    font = pygame.font.SysFont('Arial', 16)
+    sub_font = pygame.font.SysFont('Arial', 10)
+    clock = pygame.time.Clock()
+    frame = None
+    paused = False
+    running = True
+    try:
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key in (pygame.K_ESCAPE, pygame.K_q):
+                        running = False
+                    elif event.key == pygame.K_SPACE:
+                        paused = not paused
+
+            newest = None if paused else frames.latest()
+            if newest is not None:
+                frame = newest
+            if frame is not None:
+                draw_grid(screen, frame, frame.agents, font, sub_font, flip=False)
+                draw_live_status(screen, frame, frames, paused, font)
+                pygame.display.flip()
+            clock.tick(FPS)
+    finally:
+        pygame.quit()
+
+    thread.join()
+    print(f"Live view: showed {frames.shown} of {frames.published} frames "
+          f"({frames.dropped} dropped while the viewer was busy)")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result')
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 2 and sys.argv[1] == "--replay":
+        run_replay(sys.argv[2])
+    else:
+        print("Usage: python pygame_visualization.py --replay <trajectory_dir>")
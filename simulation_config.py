@@ -0,0 +1,120 @@
+from dataclasses import dataclass, fields, replace
+from types import MappingProxyType
+from typing import Mapping
+
+
+def _frozen(mapping):
+    """Read-only copy of a (nested) dict"""
+    return MappingProxyType({
+        key: _frozen(value) if isinstance(value, Mapping) else value
+        for key, value in mapping.items()
+    })
+
+
+def _thawed(mapping):
+    return {key: _thawed(value) if isinstance(value, Mapping) else value
+            for key, value in mapping.items()}
+
+
+@dataclass(frozen=True)
+class SimulationConfig:
+    """Everything one simulation run depends on, fixed for the whole run.
+
+    Environment, Agent and get_agent_action take it explicitly
+    instead of reading config module globals, so differently configured
+    simulations can run side by side in one process. Process-wide
+    infrastructure (backend URLs, rate limits, timeouts) stays in config.
+    Build one with SimulationConfig.from_config(**overrides) and derive
+    variants with .replace(...).
+    """
+    # Grid and agents
+    grid_size: int
+    num_agents: int
+    initial_energy: int
+    initial_inventory: Mapping
+    view_radius: int
+    memory_size: int
+    # Consumption: energy gained per food is agent_base_configs[name] x consumption_rate
+    consumption_rate: float
+    agent_base_configs: Mapping
+    # Mechanics
+    total_steps: int
+    energy_loss_per_turn: int
+    replenish_interval: int
+    replenish_red_count: int
+    replenish_green_count: int
+    # Policy and LLM behaviour
+    use_rule_based_policy: bool
+    low_energy_threshold: int
+    critical_energy_threshold: int
+    exploration_probability: float
+    use_local_llm: bool
+    use_multimodal: bool
+    llm_streaming: bool
+    constrained_decoding: bool
+    prompt_mode: str
+    session_mode: bool
+    plan_mode: bool
+    plan_length: int
+
+    def __post_init__(self):
+        # Freeze the mappings too, so no run can change another run's settings
+        object.__setattr__(self, 'initial_inventory', _frozen(self.initial_inventory))
+        object.__setattr__(self, 'agent_base_configs', _frozen(self.agent_base_configs))
+        if self.prompt_mode not in ("verbose", "compact"):
+            raise ValueError(f"unknown prompt mode: {self.prompt_mode}")
+        if self.plan_length < 1:
+            raise ValueError("plan_length must be positive")
+
+    @classmethod
+    def from_config(cls, **overrides):
+        """Snapshot of the config module as it is now, with `overrides` applied"""
+        import config
+        values = {
+            'grid_size': config.GRID_SIZE,
+            'num_agents': config.NUM_AGENTS,
+            'initial_energy': config.INITIAL_ENERGY,
+            'initial_inventory': config.INITIAL_INVENTORY,
+            'view_radius': config.VIEW_RADIUS,
+            'memory_size': config.AGENT_MEMORY_SIZE,
+            'consumption_rate': config.CONSUMPTION_RATE,
+            'agent_base_configs': config.AGENT_BASE_CONFIGS,
+            'total_steps': config.TOTAL_STEPS,
+            'energy_loss_per_turn': config.ENERGY_LOSS_PER_TURN,
+            'replenish_interval': config.REPLENISH_INTERVAL,
+            'replenish_red_count': config.REPLENISH_RED_COUNT,
+            'replenish_green_count': config.REPLENISH_GREEN_COUNT,
+            'use_rule_based_policy': config.USE_RULE_BASED_POLICY,
+            'low_energy_threshold': config.LOW_ENERGY_THRESHOLD,
+            'critical_energy_threshold': config.CRITICAL_ENERGY_THRESHOLD,
+            'exploration_probability': config.EXPLORATION_PROBABILITY,
+            'use_local_llm': config.USE_LOCAL_LLM,
+            'use_multimodal': config.USE_MULTIMODAL,
+            'llm_streaming': config.LLM_STREAMING,
+            'constrained_decoding': config.LLM_CONSTRAINED_DECODING,
+            'prompt_mode': config.PROMPT_MODE,
+            'session_mode': config.LLM_SESSION_MODE,
+            'plan_mode': config.PLAN_MODE,
+            'plan_length': config.PLAN_LENGTH,
+        }
+        unknown = set(overrides) - set(values)
+        if unknown:
+            raise ValueError(f"unknown simulation settings: {', '.join(sorted(unknown))}")
+        values.update(overrides)
+        return cls(**values)
+
+    def replace(self, **changes):
+        return replace(self, **changes)
+
+    def agent_rates(self, agent_name):
+        """Energy this agent gains per red/green food at this run's consumption rate"""
+        base = self.agent_base_configs.get(agent_name, {'red': 0, 'green': 0})
+        return {food: int(rate * self.consumption_rate) for food, rate in base.items()}
+
+    def to_dict(self):
+        """Plain-data copy (JSON serializable)"""
+        return {
+            f.name: _thawed(getattr(self, f.name)) if isinstance(getattr(self, f.name), Mapping)
+            else getattr(self, f.name)
+            for f in fields(self)
+        }
@@ -0,0 +1,362 @@
+"""Long-lived service running many simulations concurrently in one process.
+
+Every simulation is an asyncio task. Agent turns (which block on LLM calls)
+run in a shared thread pool, so all worlds use the same LLM scheduler,
+endpoint pool, circuit breakers and HTTP connections. Throughput is bounded
+by those, not by process start-up. Worlds write no side files (LLM log,
+movement histories); each counts its own LLM decisions instead.
+
+There is no response cache shared between worlds: prompts carry each agent's
+position, memory and energy, so repeats are rare, and a replayed reply would
+stand in for a fresh sample.
+
+    python simulation_server.py serve
+    python simulation_server.py submit '{"consumption_rate": 1.1, "seed": 7, "grid_size": 12}'
+    python simulation_server.py status [id]
+    python simulation_server.py result <id>
+    python simulation_server.py cancel <id>
+    python simulation_server.py backends
+
+HTTP API on SERVER_HOST:SERVER_PORT (JSON in and out):
+    POST   /simulations       submit settings, returns {"id": ...}; any
+                              SimulationConfig field plus "seed" ("steps"
+                              is accepted for total_steps)
+    GET    /simulations       progress of every simulation
+    GET    /simulations/<id>  progress, plus the result once finished
+    DELETE /simulations/<id>  cancel
+    GET    /backends          LLM scheduler, health and endpoint pool status
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import threading
+import itertools
+from collections import OrderedDict
+from typing import Mapping
+from dataclasses import fields
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import (
+    USE_LOCAL_LLM,
+    LOCAL_LLM_WARM_UP,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_MAX_RUNNING,
+    SERVER_WORKER_THREADS,
+    SERVER_KEEP_FINISHED
+)
+from environment import Environment
+from agent import Agent
+from consumption_rate_study import generate_unique_positions
+from simulation_config import SimulationConfig
+
+
+class Simulation:
+    """One submitted world and its progress"""
+
+    def __init__(self, sim_id, sim_config, seed):
+        self.id = sim_id
+        self.config = sim_config
+        self.seed = seed
+        self.status = "queued"
+        self.step = 0
+        self.alive = sim_config.num_agents
+        self.decisions = 0
+        self.answered = 0  # Decisions a backend replied to
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def to_dict(self, with_result=False):
+        info = {
+            'id': self.id,
+            'status': self.status,
+            'config': dict(self.config.to_dict(), seed=self.seed),
+            'step': self.step,
+            'alive': self.alive,
+            'decisions': self.decisions,
+            'answered': self.answered,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+        if with_result:
+            info['result'] = self.result
+        return info
+
+
+def _check_type(name, value, expected):
+    """Raise ValueError unless a submitted `value` fits a SimulationConfig field of type `expected`"""
+    if expected is bool:
+        ok = isinstance(value, bool)
+    elif expected is int:
+        ok = isinstance(value, int) and not isinstance(value, bool)
+    elif expected is float:
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif expected is Mapping:
+        ok = isinstance(value, Mapping)
+    else:
+        ok = isinstance(value, expected)
+    if not ok:
+        raise ValueError(f"{name} must be {'an object' if expected is Mapping else expected.__name__}")
+
+
+def parse_config(raw):
+    """(SimulationConfig, seed) for a submitted config, defaults from config.py; raises ValueError"""
+    if not isinstance(raw, dict):
+        raise ValueError("settings must be a JSON object")
+    overrides = dict(raw)
+    seed = overrides.pop('seed', None)
+    if 'steps' in overrides:
+        overrides['total_steps'] = overrides.pop('steps')
+    if seed is not None:
+        _check_type('seed', seed, int)
+    field_types = {field.name: field.type for field in fields(SimulationConfig)}
+    for name, value in overrides.items():
+        if name in field_types:  # from_config rejects unknown names
+            _check_type(name, value, field_types[name])
+    sim_config = SimulationConfig.from_config(**overrides)
+    if seed is None:
+        seed = random.randrange(2**32)
+    if sim_config.grid_size < 1:
+        raise ValueError("grid_size must be positive")
+    if not 1 <= sim_config.num_agents <= sim_config.grid_size ** 2:
+        raise ValueError("num_agents must fit on the grid")
+    if sim_config.total_steps < 1:
+        raise ValueError("total_steps must be positive")
+    return sim_config, seed
+
+
+class SimulationService:
+    """Queue and run simulations on one event loop with a shared worker pool"""
+
+    def __init__(self, max_running=SERVER_MAX_RUNNING, worker_threads=SERVER_WORKER_THREADS):
+        self.loop = None
+        self.slots = None
+        self.max_running = max_running
+        self.executor = ThreadPoolExecutor(max_workers=worker_threads, thread_name_prefix="agent")
+        self.simulations = OrderedDict()
+        self.ids = itertools.count(1)
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(self.max_running)
+
+    def submit(self, raw_config):
+        """Queue a simulation (call on the event loop) and return it"""
+        sim_config, seed = parse_config(raw_config)  # before taking an id, so rejects use none
+        simulation = Simulation(next(self.ids), sim_config, seed)
+        self.simulations[simulation.id] = simulation
+        simulation.task = self.loop.create_task(self._run(simulation))
+        self._forget_old()
+        return simulation
+
+    def cancel(self, sim_id):
+        simulation = self.simulations.get(sim_id)
+        if simulation and simulation.task and not simulation.task.done():
+            simulation.task.cancel()
+        return simulation
+
+    def _forget_old(self):
+        finished = [s.id for s in self.simulations.values() if s.finished_at is not None]
+        for sim_id in finished[:max(0, len(finished) - SERVER_KEEP_FINISHED)]:
+            del self.simulations[sim_id]
+
+    def _build_world(self, simulation):
+        sim_config = simulation.config
+        env = Environment(rng=random.Random(simulation.seed), sim_config=sim_config)
+        positions = generate_unique_positions(sim_config.num_agents, sim_config.grid_size, rng=env.rng)
+        # Every world uses the same agent names, so shared side files would collide
+        agents = [
+            Agent(f"Agent{i+1}", start_pos=positions[i], sim_config=sim_config, side_files=False)
+            for i in range(sim_config.num_agents)
+        ]
+
+        def record(name, prompt, backend, latency, response, action):
+            simulation.decisions += 1
+            if response is not None:
+                simulation.answered += 1
+        for agent in agents:
+            agent.decision_recorder = record
+        return env, agents
+
+    async def _run(self, simulation):
+        try:
+            async with self.slots:
+                simulation.status = "running"
+                simulation.started_at = time.time()
+                await self._step_world(simulation)
+                simulation.status = "done"
+        except asyncio.CancelledError:
+            simulation.status = "cancelled"
+        except Exception as e:
+            simulation.status = "failed"
+            simulation.error = f"{type(e).__name__}: {e}"
+        finally:
+            simulation.finished_at = time.time()
+
+    async def _step_world(self, simulation):
+        cfg = simulation.config
+        env, agents = self._build_world(simulation)
+        for step in range(1, cfg.total_steps + 1):
+            env.update_feature_maps(agents)
+            for agent in agents:
+                if agent.alive:
+                    # Turns within a world stay sequential; worlds overlap
+                    await self.loop.run_in_executor(
+                        self.executor, agent.decide_and_act, env, None, agents
+                    )
+            simulation.step = step
+            simulation.alive = sum(1 for agent in agents if agent.alive)
+            if simulation.alive == 0:
+                break
+            if step % cfg.replenish_interval == 0:
+                env.fixed_replenish(
+                    red_count=cfg.replenish_red_count,
+                    green_count=cfg.replenish_green_count
+                )
+        simulation.result = {
+            'steps_run': simulation.step,
+            'survivors': simulation.alive,
+            'survival_rate': simulation.alive / len(agents),
+            'agents': [agent.get_status_dict() for agent in agents],
+        }
+
+    def backends(self):
+        from llm_health import health_report
+        from llm_pool import get_local_pool
+        from llm_scheduler import scheduler_report
+        return {
+            'schedulers': scheduler_report(),
+            'health': health_report(),
+            'local_endpoints': get_local_pool().status(),
+        }
+
+    def call(self, fn, *args):
+        """Run fn(*args) on the event loop from another thread and return its result"""
+        async def run():
+            return fn(*args)
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result()
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _sim_id(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "simulations" and parts[1].isdigit():
+                return int(parts[1])
+            return None
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/simulations":
+                sims = service.call(lambda: [s.to_dict() for s in service.simulations.values()])
+                return self._send(200, sims)
+            if self.path.rstrip("/") == "/backends":
+                return self._send(200, service.call(service.backends))
+            sim_id = self._sim_id()
+            simulation = service.simulations.get(sim_id) if sim_id else None
+            if simulation is None:
+                return self._send(404, {'error': 'not found'})
+            self._send(200, service.call(simulation.to_dict, True))
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/simulations":
+                return self._send(404, {'error': 'not found'})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                raw = json.loads(self.rfile.read(length) or b"{}")
+                simulation = service.call(service.submit, raw)
+            except (ValueError, TypeError) as e:
+                return self._send(400, {'error': str(e)})
+            except Exception as e:
+                return self._send(500, {'error': f"{type(e).__name__}: {e}"})
+            self._send(201, {'id': simulation.id})
+
+        def do_DELETE(self):
+            sim_id = self._sim_id()
+            simulation = service.call(service.cancel, sim_id) if sim_id else None
+            if simulation is None:
+                return self._send(404, {'error': 'not found'})
+            self._send(200, {'id': simulation.id, 'status': simulation.status})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT):
+    service = SimulationService()
+    await service.start()
+    if USE_LOCAL_LLM and LOCAL_LLM_WARM_UP:
+        from llm import warm_up_local_models
+        await service.loop.run_in_executor(None, warm_up_local_models)
+
+    httpd = ThreadingHTTPServer((host, port), make_handler(service))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print(f"Simulation server listening on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        httpd.shutdown()
+        service.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def request(method, path, payload=None):
+    """Tiny JSON client for the CLI commands"""
+    import urllib.request
+    import urllib.error
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(
+        f"http://{SERVER_HOST}:{SERVER_PORT}{path}", data=data, method=method,
+        headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read())
+
+
+def main(argv):
+    if not argv or argv[0] == "serve":
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            print("\nSimulation server stopped.")
+        return
+    command, args = argv[0], argv[1:]
+    if command == "submit":
+        result = request("POST", "/simulations", json.loads(args[0]) if args else {})
+    elif command == "status":
+        result = request("GET", f"/simulations/{args[0]}" if args else "/simulations")
+        if args and isinstance(result, dict):
+            result.pop('result', None)
+    elif command == "result":
+        result = request("GET", f"/simulations/{args[0]}").get('result')
+    elif command == "cancel":
+        result = request("DELETE", f"/simulations/{args[0]}")
+    elif command == "backends":
+        result = request("GET", "/backends")
+    else:
+        print(__doc__)
+        return
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,36 @@
+"""Agents only ask the LLM when there is something to decide.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import agent as agent_module
+from agent import Agent
+from environment import Environment
+from simulation_config import SimulationConfig
+
+
+def _no_llm(*args, **kwargs):
+    raise AssertionError("the LLM was asked although only one action was possible")
+
+
+@pytest.mark.parametrize("plan_mode", [False, True])
+def test_single_legal_action_skips_the_llm(plan_mode, monkeypatch):
+    monkeypatch.setattr(agent_module, "get_agent_action", _no_llm)
+    monkeypatch.setattr(agent_module, "get_agent_plan", _no_llm)
+    # A 1x1 grid with an empty cell and empty inventory: only "do nothing" is possible
+    cfg = SimulationConfig.from_config(
+        grid_size=1, num_agents=1, initial_inventory={'red': 0, 'green': 0},
+        use_rule_based_policy=False, use_multimodal=False, session_mode=False, plan_mode=plan_mode
+    )
+    env = Environment(sim_config=cfg)
+    env.grid[0][0] = None
+    agent = Agent("Agent1", start_pos=(0, 0), sim_config=cfg, side_files=False)
+
+    assert agent.decide_and_act(env, all_agents=[agent]) == "did nothing"
+    assert agent.llm_calls == 0
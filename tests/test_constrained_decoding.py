@@ -0,0 +1,40 @@
+"""Token limits for constrained (JSON schema) replies.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from config import LLM_MAX_TOKENS
+from fake_llm_server import TOKEN
+from llm import (reply_token_limit, action_schema, plan_schema, response_action,
+                 parse_action_plan, VALID_ACTIONS)
+
+
+def test_action_limit_is_below_the_default():
+    assert reply_token_limit(action_schema(VALID_ACTIONS)) < LLM_MAX_TOKENS
+
+
+def test_action_limit_fits_pretty_printed_reply():
+    # The fake server counts every run of whitespace as a token, more than real tokenizers
+    reply = json.dumps({"action": "move right"}, indent=2)
+    limit = reply_token_limit(action_schema(VALID_ACTIONS))
+    assert len(TOKEN.findall(reply)) <= limit
+    assert response_action(reply) == "move right"
+
+
+@pytest.mark.parametrize("length", [2, 4, 8])
+def test_plan_limit_fits_longest_pretty_printed_plan(length):
+    plan = ["move right"] * length
+    reply = json.dumps({"first": plan[0], "then": plan[1:]}, indent=2)
+    assert len(TOKEN.findall(reply)) <= reply_token_limit(plan_schema(VALID_ACTIONS, length))
+    assert parse_action_plan(reply, length) == plan
+
+
+def test_limit_follows_the_allowed_actions():
+    assert reply_token_limit(action_schema(["collect"])) < reply_token_limit(action_schema(VALID_ACTIONS))
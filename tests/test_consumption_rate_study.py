@@ -0,0 +1,46 @@
+"""Smoke test: a tiny full consumption-rate study, from the runs to find_optimum_rate.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import consumption_rate_study as study
+
+
+def test_study_runs_end_to_end(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    # Rule-based agents and a short run, so no LLM backend is needed
+    monkeypatch.setattr(config, "USE_RULE_BASED_POLICY", True)
+    monkeypatch.setattr(config, "USE_LOCAL_LLM", False)
+    monkeypatch.setattr(config, "USE_MULTIMODAL", False)
+    monkeypatch.setattr(config, "TOTAL_STEPS", 15)
+    monkeypatch.setattr(study, "CONSUMPTION_RATES", [0.8, 1.2])
+    monkeypatch.setattr(study, "STUDY_ADAPTIVE", False)
+    monkeypatch.setattr(study, "STUDY_RUNS_PER_RATE", 2)
+    monkeypatch.setattr(study, "USE_EXPERIMENT_STORE", False)
+    monkeypatch.setattr(study, "PLOT_HEADLESS", True)
+    monkeypatch.setattr(study, "PLOT_OUTPUT_DIR", str(tmp_path / "reports"))
+
+    study.main()
+
+    out = capsys.readouterr().out
+    assert "=== OPTIMUM CONSUMPTION RATE ===" in out
+    for agent in config.AGENT_BASE_CONFIGS:
+        assert f"  {agent}: Red=" in out
+    assert list(tmp_path.glob("consumption_rate_study_*.json"))
+    assert list((tmp_path / "reports").glob("survival_rate_graph_*.png"))
+
+
+def test_optimum_uses_each_agents_scaled_rates(capsys):
+    results = [
+        {'consumption_rate': 0.5, 'avg_survival_rate': 0.2, 'std_survival_rate': 0.0},
+        {'consumption_rate': 2.0, 'avg_survival_rate': 0.8, 'std_survival_rate': 0.1},
+    ]
+    study.find_optimum_rate(results)
+    out = capsys.readouterr().out
+    base = config.AGENT_BASE_CONFIGS['Agent1']
+    assert f"Agent1: Red={int(base['red'] * 2.0)}, Green={int(base['green'] * 2.0)}" in out
@@ -0,0 +1,57 @@
+"""Event-log reconstruction matches the recorded trajectory step for step.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import main
+from event_log import EventLogReader
+from simulation_config import SimulationConfig
+from trajectory import TrajectoryReader
+
+TOTAL_STEPS = 60
+KEYFRAME_INTERVAL = 7  # Not a divisor of the replenish interval or the run length
+
+
+@pytest.fixture
+def recorded_run(tmp_path, monkeypatch):
+    """Rule-based run writing both an event log and a trajectory into tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "LOG_MODE", "events")
+    monkeypatch.setattr(main, "EVENT_LOG_PATH", str(tmp_path / "events.jsonl"))
+    monkeypatch.setattr(main, "EVENT_KEYFRAME_INTERVAL", KEYFRAME_INTERVAL)
+    monkeypatch.setattr(main, "RECORD_TRAJECTORY", True)
+    monkeypatch.setattr(main, "TRAJECTORY_DIR", str(tmp_path / "trajectories"))
+    monkeypatch.setattr(main, "USE_EXPERIMENT_STORE", False)
+    monkeypatch.setattr(main, "RANDOM_SEED", 1234)
+    cfg = SimulationConfig.from_config(use_rule_based_policy=True, total_steps=TOTAL_STEPS,
+                                       replenish_interval=5)
+    main.main(cfg)
+    trajectory_dir = tmp_path / "trajectories"
+    (run,) = os.listdir(trajectory_dir)
+    return EventLogReader(str(tmp_path / "events.jsonl")), TrajectoryReader(str(trajectory_dir / run))
+
+
+def test_every_reconstructed_state_matches_the_trajectory(recorded_run):
+    events, trajectory = recorded_run
+    assert len(trajectory) == TOTAL_STEPS + 1
+    assert sorted(events.keyframes) == list(range(0, TOTAL_STEPS + 1, KEYFRAME_INTERVAL))
+
+    states = list(events.iter_states())
+    assert [state['step'] for state in states] == list(range(TOTAL_STEPS + 1))
+    for step, state in enumerate(states):
+        assert state['grid'] == trajectory.grid_at(step), f"grid differs at step {step}"
+        assert state['agents'] == trajectory.agents_at(step), f"agents differ at step {step}"
+
+
+def test_random_access_matches_sequential_replay(recorded_run):
+    events, trajectory = recorded_run
+    for step in (0, 1, KEYFRAME_INTERVAL - 1, KEYFRAME_INTERVAL, KEYFRAME_INTERVAL + 1, TOTAL_STEPS):
+        state = events.state_at(step)
+        assert state['grid'] == trajectory.grid_at(step)
+        assert state['agents'] == trajectory.agents_at(step)
@@ -0,0 +1,33 @@
+"""Trades made through a TradeManager end up in the experiment store.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+
+from experiment_store import ExperimentStore
+from trade_manager import TradeManager
+
+
+def test_offers_and_acceptances_are_recorded(tmp_path):
+    store = ExperimentStore(str(tmp_path / "experiments.db"))
+    run_id = store.start_run("test", num_agents=2, total_steps=10)
+    trade_manager = TradeManager(trade_recorder=store.trade_recorder(run_id))
+    seller = SimpleNamespace(name="Agent1", step_count=3)
+    buyer = SimpleNamespace(name="Agent2", step_count=5)
+
+    offer = trade_manager.make_offer(seller, {'red': 1}, {'green': 1})
+    trade_manager.accept_offer(offer['id'], buyer)
+    store.flush()
+
+    rows = store.conn.execute(
+        "SELECT run_id, step, offer_id, from_agent, to_agent, give_json, want_json, status "
+        "FROM trades ORDER BY trade_id"
+    ).fetchall()
+    store.close()
+    assert rows[0] == (run_id, 3, offer['id'], "Agent1", None, '{"red": 1}', '{"green": 1}', "open")
+    assert rows[1] == (run_id, 5, offer['id'], "Agent1", "Agent2", '{"red": 1}', '{"green": 1}', "accepted")
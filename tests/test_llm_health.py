@@ -0,0 +1,104 @@
+"""Circuit breaker states and adaptive timeouts of BackendHealth.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import llm_health
+from config import (CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, ADAPTIVE_TIMEOUT_MIN,
+                    ADAPTIVE_TIMEOUT_MULTIPLIER, ADAPTIVE_TIMEOUT_MIN_SAMPLES)
+from llm_health import BackendHealth, CLOSED, OPEN, HALF_OPEN
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_health.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _open(health):
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        assert health.allow_request()
+        health.record(False, None)
+
+
+def test_opens_after_consecutive_failures(clock):
+    health = BackendHealth("test", max_timeout=60)
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        health.record(False, None)
+    health.record(True, 0.5)  # a success resets the count
+    _open(health)
+    assert health.state == OPEN
+    assert not health.allow_request()
+    assert health.status()['skipped'] == 1
+
+
+def test_half_open_lets_one_probe_through(clock):
+    health = BackendHealth("test", max_timeout=60)
+    _open(health)
+    clock[0] += CIRCUIT_RESET_SECONDS
+    assert health.allow_request()
+    assert health.state == HALF_OPEN
+    assert not health.allow_request()  # the probe is still in flight
+    assert health.timeout() == 60
+
+
+def test_probe_success_closes_and_failure_reopens(clock):
+    health = BackendHealth("test", max_timeout=60)
+    _open(health)
+    clock[0] += CIRCUIT_RESET_SECONDS
+    assert health.allow_request()
+    health.record(False, None)
+    assert health.state == OPEN
+    assert not health.allow_request()
+
+    clock[0] += CIRCUIT_RESET_SECONDS
+    assert health.allow_request()
+    health.record(True, 0.5)
+    assert health.state == CLOSED
+    assert health.allow_request()
+
+
+def test_rate_limited_probe_frees_the_probe_without_reopening(clock):
+    health = BackendHealth("test", max_timeout=60)
+    _open(health)
+    clock[0] += CIRCUIT_RESET_SECONDS
+    assert health.allow_request()
+    health.record_rate_limited()
+    assert health.state == HALF_OPEN
+    assert health.allow_request()
+
+
+def test_adaptive_timeout_follows_p95():
+    health = BackendHealth("test", max_timeout=60)
+    for _ in range(ADAPTIVE_TIMEOUT_MIN_SAMPLES - 1):
+        health.record(True, 4.0)
+    assert health.timeout() == 60  # too few samples yet
+    health.record(True, 4.0)
+    assert health.timeout() == pytest.approx(4.0 * ADAPTIVE_TIMEOUT_MULTIPLIER)
+
+
+def test_adaptive_timeout_is_clamped():
+    fast = BackendHealth("fast", max_timeout=60)
+    slow = BackendHealth("slow", max_timeout=60)
+    for _ in range(ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+        fast.record(True, 0.01)
+        slow.record(True, 100.0)
+    assert fast.timeout() == ADAPTIVE_TIMEOUT_MIN
+    assert slow.timeout() == 60
+
+
+def test_timeouts_count_as_latency_samples():
+    health = BackendHealth("test", max_timeout=60)
+    for _ in range(ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+        health.record(True, 1.0)
+    timeout = health.timeout()
+    health.record(False, timeout)  # timed out: counted as a sample
+    health.record(False, 0.1)  # failed fast: not a latency sample
+    assert len(health.latencies) == ADAPTIVE_TIMEOUT_MIN_SAMPLES + 1
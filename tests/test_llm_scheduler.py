@@ -0,0 +1,125 @@
+"""Token buckets, AIMD concurrency and priority order of RequestScheduler.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import llm_scheduler
+from config import (LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY,
+                    LLM_LATENCY_TARGET, LLM_RATE_LIMIT_BACKOFF)
+from llm_scheduler import TokenBucket, RequestScheduler, PRIORITY_CRITICAL, PRIORITY_NORMAL
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_scheduler.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_refills_continuously(clock):
+    bucket = TokenBucket(60)  # one unit per second
+    assert bucket.wait_time(60, clock[0]) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1, clock[0]) == pytest.approx(1.0)
+    clock[0] += 10
+    assert bucket.wait_time(10, clock[0]) == 0.0
+    assert bucket.wait_time(15, clock[0]) == pytest.approx(5.0)
+
+
+def test_token_bucket_caps_level_and_oversized_requests(clock):
+    bucket = TokenBucket(60)
+    clock[0] += 3600
+    bucket.wait_time(1, clock[0])
+    assert bucket.level == 60
+    # A request larger than the bucket waits for a full bucket, not forever
+    assert bucket.wait_time(500, clock[0]) == 0.0
+    bucket.take(500)
+    assert bucket.level == 0
+
+
+def test_rate_limit_halves_concurrency_and_pauses(clock):
+    scheduler = RequestScheduler("test")
+    scheduler.acquire(10)
+    scheduler.release('rate_limited', retry_after=7)
+    assert scheduler.limit == LLM_INITIAL_CONCURRENCY / 2
+    assert scheduler.paused_until == clock[0] + 7
+    assert scheduler._admission_delay(10, clock[0]) == pytest.approx(7)
+    assert scheduler.status()['rate_limited'] == 1
+
+    for _ in range(10):
+        scheduler.in_flight += 1
+        scheduler.release('rate_limited', retry_after=0)
+    assert scheduler.limit == LLM_MIN_CONCURRENCY
+
+
+def test_rate_limit_without_retry_after_backs_off_exponentially(clock):
+    scheduler = RequestScheduler("test")
+    pauses = []
+    for _ in range(3):
+        scheduler.in_flight += 1
+        scheduler.paused_until = 0.0
+        scheduler.release('rate_limited')
+        pauses.append(scheduler.paused_until - clock[0])
+    assert 0.5 * LLM_RATE_LIMIT_BACKOFF <= pauses[0] <= LLM_RATE_LIMIT_BACKOFF
+    assert 2 * LLM_RATE_LIMIT_BACKOFF <= pauses[2] <= 4 * LLM_RATE_LIMIT_BACKOFF
+
+
+def test_fast_successes_grow_and_slow_ones_halve_concurrency(clock):
+    scheduler = RequestScheduler("test")
+    for _ in range(LLM_INITIAL_CONCURRENCY):
+        scheduler.in_flight += 1
+        scheduler.release('ok', latency=0.1)
+    assert LLM_INITIAL_CONCURRENCY + 0.5 < scheduler.limit <= LLM_INITIAL_CONCURRENCY + 1
+    limit = scheduler.limit
+    scheduler.in_flight += 1
+    scheduler.release('ok', latency=LLM_LATENCY_TARGET + 1)
+    assert scheduler.limit == limit / 2
+
+    for _ in range(10000):
+        scheduler.in_flight += 1
+        scheduler.release('ok', latency=0.1)
+    assert scheduler.limit == LLM_MAX_CONCURRENCY
+
+
+def test_requests_bucket_delays_admission(clock):
+    scheduler = RequestScheduler("test", requests_per_minute=2)
+    scheduler.acquire(1)
+    scheduler.acquire(1)
+    assert scheduler._admission_delay(1, clock[0]) == pytest.approx(30.0)
+
+
+def test_critical_requests_are_admitted_first():
+    scheduler = RequestScheduler("test")
+    scheduler.limit = 1.0
+    scheduler.acquire(1)  # hold the only slot
+    admitted = []
+
+    def request(name, priority):
+        scheduler.acquire(1, priority)
+        admitted.append(name)
+        scheduler.release('error')
+
+    def wait_for_waiters(count):
+        deadline = time.monotonic() + 5
+        while len(scheduler.waiters) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=request, args=("normal", PRIORITY_NORMAL))]
+    threads[0].start()
+    wait_for_waiters(1)
+    threads.append(threading.Thread(target=request, args=("critical", PRIORITY_CRITICAL)))
+    threads[1].start()
+    wait_for_waiters(2)
+
+    scheduler.release('error')  # 'error' leaves the limit at 1
+    for thread in threads:
+        thread.join(timeout=5)
+    assert admitted == ["critical", "normal"]
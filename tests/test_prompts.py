@@ -0,0 +1,45 @@
+"""Prompts describe the run's own world rules, not config.py's defaults.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import llm
+from prompts import build_prompt
+from simulation_config import SimulationConfig
+
+
+@pytest.mark.parametrize("mode", ["verbose", "compact"])
+def test_prompt_uses_grid_size_and_energy_loss(mode):
+    prompt = build_prompt(
+        mode, "Agent1", (11, 6), {'red': 0, 'green': 1}, None, 20, {'red': 5, 'green': 3},
+        grid_size=12, energy_loss=2
+    )
+    assert "12x12" in prompt
+    assert "9x9" not in prompt
+    assert "2 energy every step" in prompt or "-2/step" in prompt
+
+
+@pytest.mark.parametrize("mode", ["verbose", "compact"])
+def test_agent_prompt_follows_sim_config(mode, monkeypatch):
+    prompts = []
+
+    def no_backend(prompt, *args, **kwargs):
+        prompts.append(prompt)
+        return None, None, 0.0
+    monkeypatch.setattr(llm, "_query_backends", no_backend)
+
+    cfg = SimulationConfig.from_config(grid_size=12, energy_loss_per_turn=3, prompt_mode=mode,
+                                       use_multimodal=False)
+    action = llm.get_agent_action("Agent1", (11, 6), {'red': 0, 'green': 0}, None, 20,
+                                  cfg.agent_rates("Agent1"), sim_config=cfg, log_file=None)
+
+    assert action == "do nothing"
+    assert "12x12" in prompts[0]
+    assert "9x9" not in prompts[0]
+    assert "3 energy every step" in prompts[0] or "-3/step" in prompts[0]
@@ -0,0 +1,36 @@
+"""Validation of settings submitted to the simulation server.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from simulation_server import parse_config
+
+
+@pytest.mark.parametrize("raw", [
+    [1, 2],
+    "grid_size",
+    {"initial_inventory": 5},
+    {"agent_base_configs": [1]},
+    {"grid_size": "9"},
+    {"grid_size": True},
+    {"use_local_llm": 1},
+    {"seed": "x"},
+    {"no_such_setting": 1},
+    {"num_agents": 50, "grid_size": 3},
+])
+def test_bad_settings_raise_value_error(raw):
+    with pytest.raises(ValueError):
+        parse_config(raw)
+
+
+def test_good_settings():
+    sim_config, seed = parse_config({"grid_size": 12, "steps": 30, "consumption_rate": 1,
+                                     "initial_inventory": {"red": 1, "green": 0}, "seed": 7})
+    assert (sim_config.grid_size, sim_config.total_steps, seed) == (12, 30, 7)
+    assert sim_config.initial_inventory == {"red": 1, "green": 0}
@@ -1,7 +1,9 @@
 class TradeManager:
-    def __init__(self):
+    def __init__(self, trade_recorder=None):
         self.offers = []
         self.next_offer_id = 1
+        # Optional recorder(offer, step, to_agent=None), told of every new and accepted offer
+        self.trade_recorder = trade_recorder
 
     def make_offer(self, from_agent, give: dict, want: dict):
         offer = {
@@ -13,6 +15,8 @@ class TradeManager:
         }
         self.offers.append(offer)
         self.next_offer_id += 1
+        if self.trade_recorder:
+            self.trade_recorder(offer, from_agent.step_count)
         return offer
 
     def get_open_offers(self, excluding_agent=None):
@@ -27,6 +31,8 @@ class TradeManager:
             return "Offer not found or already accepted."
 
         offer['status'] = 'accepted'
+        if self.trade_recorder:
+            self.trade_recorder(offer, to_agent.step_count, to_agent.name)
         return offer
 
     def list_offers(self):
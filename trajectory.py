@@ -0,0 +1,115 @@
+import os
+import json
+import numpy as np
+
+FOOD_CODES = {None: 0, 'red': 1, 'green': 2}
+CODE_FOODS = {code: food for food, code in FOOD_CODES.items()}
+
+INDEX_FILE = "index.json"
+TRAJECTORY_FORMAT_VERSION = 1
+
+
+def _array_specs(steps, grid_size, num_agents):
+    """File name, dtype and shape of every array in a trajectory"""
+    return {
+        'grid':      {'file': 'grid.u8',       'dtype': 'uint8', 'shape': [steps, grid_size, grid_size]},
+        'position':  {'file': 'position.i16',  'dtype': 'int16', 'shape': [steps, num_agents, 2]},
+        'energy':    {'file': 'energy.i32',    'dtype': 'int32', 'shape': [steps, num_agents]},
+        'inventory': {'file': 'inventory.i32', 'dtype': 'int32', 'shape': [steps, num_agents, 2]},
+        'alive':     {'file': 'alive.u8',      'dtype': 'uint8', 'shape': [steps, num_agents]},
+    }
+
+
+class TrajectoryRecorder:
+    """Writes the full world state of every step into preallocated numpy.memmap files.
+
+    Row 0 holds the initial state, row N the state after step N. The layout is
+    described by index.json so readers can map the files without parsing them.
+    """
+
+    def __init__(self, directory, total_steps, grid_size, agent_names, metadata=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.agent_names = list(agent_names)
+        self.steps = total_steps + 1
+        self.steps_recorded = 0
+        self.specs = _array_specs(self.steps, grid_size, len(self.agent_names))
+        self.metadata = metadata or {}
+        self.arrays = {
+            name: np.memmap(os.path.join(directory, spec['file']), dtype=spec['dtype'],
+                            mode='w+', shape=tuple(spec['shape']))
+            for name, spec in self.specs.items()
+        }
+        self._write_index()
+
+    def _write_index(self):
+        header = {
+            'version': TRAJECTORY_FORMAT_VERSION,
+            'steps': self.steps,
+            'steps_recorded': self.steps_recorded,
+            'grid_size': self.specs['grid']['shape'][1],
+            'agent_names': self.agent_names,
+            'food_codes': {str(code): food for code, food in CODE_FOODS.items()},
+            'inventory_order': ['red', 'green'],
+            'arrays': self.specs,
+            'metadata': self.metadata,
+        }
+        with open(os.path.join(self.directory, INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=2, default=str)
+
+    def record(self, step, env, agents):
+        """Store the grid and every agent's state as row `step`"""
+        grid = self.arrays['grid'][step]
+        for i, row in enumerate(env.grid):
+            grid[i] = [FOOD_CODES[cell] for cell in row]
+        self.arrays['position'][step] = [agent.position for agent in agents]
+        self.arrays['energy'][step] = [agent.energy for agent in agents]
+        self.arrays['inventory'][step] = [
+            (agent.inventory['red'], agent.inventory['green']) for agent in agents
+        ]
+        self.arrays['alive'][step] = [agent.alive for agent in agents]
+        self.steps_recorded = max(self.steps_recorded, step + 1)
+
+    def close(self):
+        for array in self.arrays.values():
+            array.flush()
+        self._write_index()
+        self.arrays = {}
+
+
+class TrajectoryReader:
+    """Random access to a recorded trajectory through read-only memmaps"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE), encoding="utf-8") as f:
+            self.header = json.load(f)
+        self.agent_names = self.header['agent_names']
+        self.grid_size = self.header['grid_size']
+        self.steps = self.header['steps_recorded']
+        self.metadata = self.header.get('metadata', {})
+        for name, spec in self.header['arrays'].items():
+            setattr(self, name, np.memmap(os.path.join(directory, spec['file']),
+                                          dtype=spec['dtype'], mode='r',
+                                          shape=tuple(spec['shape'])))
+
+    def __len__(self):
+        return self.steps
+
+    def grid_at(self, step):
+        """Grid of `step` as nested lists of 'red'/'green'/None, like Environment.grid"""
+        return [[CODE_FOODS[int(code)] for code in row] for row in self.grid[step]]
+
+    def agents_at(self, step):
+        """List of per-agent state dicts for `step`"""
+        return [
+            {
+                'name': name,
+                'position': tuple(int(v) for v in self.position[step, i]),
+                'energy': int(self.energy[step, i]),
+                'inventory': {'red': int(self.inventory[step, i, 0]),
+                              'green': int(self.inventory[step, i, 1])},
+                'alive': bool(self.alive[step, i]),
+            }
+            for i, name in enumerate(self.agent_names)
+        ]